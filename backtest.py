@@ -0,0 +1,36 @@
+import argparse
+import json
+import logging
+import pandas as pd
+from menu.backtest import Backtester, default_points_dir
+
+'''
+回測：python backtest.py ticks.csv
+     python backtest.py HSI_2024.parquet --points points --code HK.MHI2506 --trades trades.csv
+行情檔需有時間欄（time / timestamp / datetime / time_key）及價格欄（price / last_price / close），
+或 open/high/low/close 的 K 線；無 code 欄時使用 --code 或 config.json 的 point_code。
+亦可直接回放實盤錄製的逐筆檔：python backtest.py ticks/HK.MHI2506/20250612.ticks
+     或整個錄製目錄的時間窗口：python backtest.py ticks --start 2025-06-12T09:15 --end 2025-06-12T12:00
+'''
+
+def main():
+    parser = argparse.ArgumentParser(description='以歷史行情回測點位策略')
+    parser.add_argument('ticks', help='逐筆或 K 線數據檔（.csv、.parquet 或錄製的 .ticks）或錄製目錄')
+    parser.add_argument('--points', default=default_points_dir(), help='點位 JSON 根目錄')
+    parser.add_argument('--code', default=None, help='行情檔與點位未指定合約時使用的合約代碼')
+    parser.add_argument('--start', default=None, help='錄製目錄的回放開始時間（ISO 格式，本地時間）')
+    parser.add_argument('--end', default=None, help='錄製目錄的回放結束時間（不含）')
+    parser.add_argument('--trades', default=None, help='輸出平倉明細 CSV')
+    parser.add_argument('--verbose', action='store_true', help='輸出交易日誌')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    result = Backtester(args.points, code=args.code).run_file(args.ticks, args.start, args.end)
+    print(json.dumps(result.summary(), ensure_ascii=False, indent=2))
+    if args.trades:
+        pd.DataFrame(result.trades).to_csv(args.trades, index=False)
+        print(f"平倉明細已寫入 {args.trades}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from futu import TrdEnv
+from menu.order_store import ORDER_STORE, VirtualOrder
+from menu.trigger_book import TRIGGER_BOOK
+from menu.order_ledger import OrderLedger
+from menu.latency import LATENCY
+from menu.order_gateway import get_order_gateway
+from menu.points.point import Point
+from menu.points.point_history import PointHistory
+from menu.points.point_manager import PointManager
+from menu.monitor_stop_loss_take_profit import MonitorStopLossTakeProfit
+from menu.simulation import SimClock, SimExchange, SimQuoteContext, SimTradeContext
+from menu.utils import save_virtual_orders_to_csv, load_virtual_orders_from_csv
+
+'''
+基準測試：python benchmarks/run_benchmarks.py
+         python benchmarks/run_benchmarks.py --quick --output before.json
+         python benchmarks/run_benchmarks.py --compare before.json
+以 menu/simulation.py 的模擬連線取代 OpenD，所有檔案寫入臨時目錄，不影響專案內的持倉與日誌。
+結果寫成 JSON（預設 benchmarks/results/<時間>.json）；--compare 與舊結果比較並標示變慢超過門檻的項目。
+'''
+
+CODE = 'HK.MHI2506'
+FULL_SIZES = {
+    'points': [12, 48, 192],
+    'depth': [5, 20, 50],
+    'orders': [10, 100, 1000, 10000],
+    'records': [100, 1000, 10000, 100000]
+}
+QUICK_SIZES = {
+    'points': [12, 48],
+    'depth': [5, 20],
+    'orders': [10, 1000],
+    'records': [100, 10000]
+}
+
+def measure(fn, min_time=0.2, repeat=5):
+    """重複執行 fn，返回每次調用的耗時統計（微秒）"""
+    fn()
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / repeat or number >= 1 << 20:
+            break
+        number *= 2
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - started) / number * 1e6)
+    return {'min_us': round(min(samples), 3), 'median_us': round(statistics.median(samples), 3), 'calls': number * repeat}
+
+def _sim_contexts():
+    exchange = SimExchange(SimClock())
+    quote_ctx = SimQuoteContext(exchange)
+    quote_ctx.exchange.last_prices[CODE] = 10000.0
+    trd_ctx = SimTradeContext(exchange)
+    get_order_gateway(trd_ctx, enabled=False)
+    return quote_ctx, trd_ctx
+
+def _reset_state():
+    ORDER_STORE.attach_journal(None)
+    ORDER_STORE.clear()
+    TRIGGER_BOOK.clear()
+
+def _make_point(index, depth):
+    hit_price = 20000.0 + index * 50
+    orders = [{
+        'order_index': j,
+        'entry_price': hit_price + 10 * 0.7 ** j,
+        'direction': 'long',
+        'quantity': 1,
+        'stop_loss': hit_price - 50,
+        'take_profit': hit_price + 50,
+        'strategy': 'trailing_stop'
+    } for j in range(depth)]
+    point_data = {'point_id': f'P{index}', 'hit_price': hit_price, 'qty_each_time': 1, 'quantity_limits': depth,
+                  'orders': orders, 'code': CODE}
+    return Point(point_data, logging.getLogger(f'trade_P{index}'), f'P{index}')
+
+def bench_point_monitor(sizes):
+    """PointManager.start_monitor 單次迭代：批量取價 + on_price，分別在無持倉與滿倉時測量"""
+    results = []
+    for points in sizes['points']:
+        for depth in sizes['depth']:
+            _reset_state()
+            quote_ctx, trd_ctx = _sim_contexts()
+            manager = PointManager(quote_ctx, trd_ctx, TrdEnv.SIMULATE, 1)
+            manager.quote_feed.max_age = float('inf')
+            manager.rebuild_index({f'P{i}': _make_point(i, depth) for i in range(points)})
+
+            def iteration():
+                for code, price in manager.quote_feed.get_prices(manager.codes()).items():
+                    manager.on_price(code, price)
+
+            idle = measure(iteration)
+            for point in manager.points.values():
+                for j, order in enumerate(point.orders):
+                    point.add_position(f'{point.id}-{j}', j, order['entry_price'], f'{point.id}-{j}')
+            loaded = measure(iteration)
+            results.append({'points': points, 'depth': depth, 'idle': idle, 'full_positions': loaded})
+    return results
+
+def bench_sl_tp_monitor(sizes):
+    """MonitorStopLossTakeProfit.monitor 單次迭代：批量取價 + check，10% 訂單使用移動止盈"""
+    results = []
+    for count in sizes['orders']:
+        _reset_state()
+        quote_ctx, trd_ctx = _sim_contexts()
+        for i in range(count):
+            ORDER_STORE.add_virtual(VirtualOrder(
+                id=f'HSI-{i:05d}', code=CODE, direction='long' if i % 2 else 'short', quantity=1,
+                entry_price=10000.0, stop_loss=9000.0 if i % 2 else 11000.0, take_profit=11000.0 if i % 2 else 9000.0,
+                use_trailing=(i % 10 == 0)))
+        monitor = MonitorStopLossTakeProfit(quote_ctx, trd_ctx, TrdEnv.SIMULATE)
+        monitor.quote_feed.max_age = float('inf')
+
+        def iteration():
+            for code, price in monitor.quote_feed.get_prices(monitor.codes()).items():
+                monitor.check(code, price)
+
+        results.append({'virtual_orders': count, 'iteration': measure(iteration)})
+    _reset_state()
+    return results
+
+def bench_order_ledger(sizes, work_dir):
+    """update_order_in_log 背後的開倉台帳：入隊成本與提交延遲隨台帳大小的變化"""
+    results = []
+    for count in sizes['records']:
+        ledger_dir = os.path.join(work_dir, f'ledger_{count}')
+        os.makedirs(ledger_dir)
+        ledger = OrderLedger(ledger_dir)
+        for i in range(count):
+            ledger.record_open(f'HSI-{i:06d}', CODE, 'long', 1_000_000, 20000.0)
+        ledger.flush()
+        counter = iter(range(10 ** 9))
+        enqueue = measure(lambda: ledger.record_close(f'HSI-{next(counter) % count:06d}', 999_999))
+
+        def committed():
+            ledger.record_close(f'HSI-{next(counter) % count:06d}', 999_999)
+            ledger.flush()
+
+        results.append({'records': count, 'enqueue': enqueue, 'commit': measure(committed)})
+        ledger.close()
+    return results
+
+def bench_point_history(sizes, work_dir):
+    """update_point_history 背後的點位交易歷史：追加成本與啟動重建成本隨檔案大小的變化"""
+    results = []
+    for count in sizes['records']:
+        point_dir = os.path.join(work_dir, f'history_{count}')
+        history = PointHistory(point_dir)
+        for i in range(count // 2):
+            history.record_open(f'O{i}', CODE, 'long', 1, 20000.0)
+            history.record_close(f'O{i}', 1, 20010.0)
+        counter = iter(range(10 ** 9))
+
+        def append_pair():
+            order_id = f'N{next(counter)}'
+            history.record_open(order_id, CODE, 'long', 1, 20000.0)
+            history.record_close(order_id, 1, 20010.0)
+
+        append = measure(append_pair)
+        history.close()
+        load = measure(lambda: PointHistory(point_dir).close(), min_time=0.5)
+        results.append({'records': count, 'append_open_close': append, 'load': load})
+    return results
+
+def bench_csv(sizes, work_dir):
+    """menu/utils.py 的 virtual_orders.csv 保存與載入"""
+    results = []
+    path = os.path.join(work_dir, 'virtual_orders.csv')
+    for count in sizes['orders']:
+        _reset_state()
+        ORDER_STORE.load([VirtualOrder(id=f'HSI-{i:05d}', code=CODE, direction='long', quantity=1, entry_price=20000.0,
+                                       stop_loss=19900.0, take_profit=20100.0) for i in range(count)])
+        save = measure(lambda: save_virtual_orders_to_csv(path))
+        load = measure(lambda: load_virtual_orders_from_csv(path))
+        results.append({'virtual_orders': count, 'save': save, 'load': load})
+    _reset_state()
+    return results
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+def _flatten(data, prefix=''):
+    """把結果展開為 {路徑: min_us}，供比較使用；最小值受機器負載干擾最少"""
+    flat = {}
+    if isinstance(data, dict):
+        if 'min_us' in data:
+            flat[prefix] = data['min_us']
+            return flat
+        for key, value in data.items():
+            if key in ('meta',):
+                continue
+            flat.update(_flatten(value, f'{prefix}/{key}' if prefix else key))
+    elif isinstance(data, list):
+        for item in data:
+            label = ','.join(f'{k}={v}' for k, v in item.items() if not isinstance(v, dict))
+            flat.update(_flatten({k: v for k, v in item.items() if isinstance(v, dict)}, f'{prefix}[{label}]'))
+    return flat
+
+def compare(current, baseline, threshold):
+    """逐項比較最小耗時，返回變慢超過 threshold 的項目數"""
+    now, before = _flatten(current), _flatten(baseline)
+    regressions = 0
+    for key in sorted(now):
+        if key not in before or not before[key]:
+            continue
+        ratio = now[key] / before[key]
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  <-- 變慢'
+            regressions += 1
+        print(f"{key:<70}{before[key]:>12.2f}{now[key]:>12.2f}{ratio:>8.2f}x{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='監控循環與持久化路徑的基準測試')
+    parser.add_argument('--quick', action='store_true', help='使用較小的規模')
+    parser.add_argument('--only', nargs='*', default=None, help='只執行指定項目')
+    parser.add_argument('--output', default=None, help='結果 JSON 路徑')
+    parser.add_argument('--compare', default=None, help='與指定的舊結果 JSON 比較')
+    parser.add_argument('--threshold', type=float, default=0.2, help='判定變慢的比例，預設 0.2')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    LATENCY.enabled = False
+    sizes = QUICK_SIZES if args.quick else FULL_SIZES
+    work_dir = tempfile.mkdtemp(prefix='futu_bench_')
+    suites = {
+        'point_monitor': lambda: bench_point_monitor(sizes),
+        'sl_tp_monitor': lambda: bench_sl_tp_monitor(sizes),
+        'order_ledger': lambda: bench_order_ledger(sizes, work_dir),
+        'point_history': lambda: bench_point_history(sizes, work_dir),
+        'virtual_orders_csv': lambda: bench_csv(sizes, work_dir)
+    }
+    results = {'meta': {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'quick': args.quick
+    }}
+    try:
+        for name, suite in suites.items():
+            if args.only and name not in args.only:
+                continue
+            started = time.perf_counter()
+            results[name] = suite()
+            print(f"{name} 完成，用時 {time.perf_counter() - started:.1f} 秒")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(BASE_DIR, 'benchmarks', 'results', time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"結果已寫入 {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"{'項目':<70}{'舊 (us)':>12}{'新 (us)':>12}{'比例':>9}")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{regressions} 項變慢超過 {args.threshold:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,9 @@ input_file = "HSI_json/HSI_Prediction_20250606.json"
 with open(input_file, 'r', encoding='utf-8') as f:
     data = json.load(f)
 
+# 點位交易合約，預測檔未指定時由 PointManager 使用 config.json 的 point_code
+contract_code = data.get("code")
+
 # 定義輸出根目錄
 output_dir = "points"
 os.makedirs(output_dir, exist_ok=True)
@@ -67,6 +70,8 @@ for point_type, point_ids in point_types.items():
             "quantity_limits": quantity_limits,
             "orders": orders
         }
+        if contract_code:
+            point_config["code"] = contract_code
 
         point_dir = os.path.join(output_dir, point_id)
         os.makedirs(point_dir, exist_ok=True)
@@ -1,6 +1,8 @@
 from futu import *
-from futu.common.constant import RET_OK
-from menu.utils import PENDING_ORDERS, load_config, setup_logging, save_virtual_orders_to_csv, load_virtual_orders_from_csv, append_open_order_to_log, update_order_in_log, VIRTUAL_ORDERS, CLOSING_ORDERS
+from menu.utils import load_config, setup_logging, shutdown_logging, save_virtual_orders_to_csv, load_virtual_orders_from_csv
+from menu.order_store import ORDER_STORE
+from menu.order_journal import OrderJournal
+from menu.order_ledger import ORDER_LEDGER
 from menu.open_order import OpenOrder
 from menu.close_order import CloseOrder
 from menu.get_positions import GetPositions
@@ -8,8 +10,19 @@ from menu.close_all_orders import CloseAllOrders
 from menu.cancel_order import CancelOrder
 from menu.monitor_stop_loss_take_profit import MonitorStopLossTakeProfit
 from menu.points.point_manager import PointManager  # 引入 PointManager
+from menu.points.point_state import PointStateStore
+from menu.points.point_logger import load_point_histories
+from menu.quote_feed import get_quote_feed
+from menu.order_tracker import OrderTracker
+from menu.async_core import AsyncTradingCore
+from menu.mock_opend import MockOpenD, random_walk
+from menu.latency import LATENCY, default_dump_path
+from menu.order_gateway import get_order_gateway
+from menu.tick_recorder import TickRecorder, default_tick_dir
+from menu.tick_replay import TickStore
 import os
-import time
+import sys
+import asyncio
 import threading
 import logging
 
@@ -20,145 +33,88 @@ import logging
      /open_order HK.MHI2505 long 1 23280 或 /open_order HK.MHI2505 long 1 market
 平倉：/force_order HSI-001 1 long market 或 /force_order HSI-001 1 long 23700.0
 查詢持倉：/status
-全部平倉：/close_all
+延遲統計：/latency（/latency reset 清空）
+全部平倉：/close_all（/close_all net 同合約多空內部對沖後再提交，/close_all nonet 逐筆提交，預設見 config.json 的 close_all_netting）
 取消交易：/cancel_order HSI-001
+重新加載點位：/reload_points（只重新解析有變更的點位 JSON，保留命中次數、已開索引與持倉；另每 points_reload_interval 秒自動檢查）
 退出：exit
+asyncio 模式：python main.py --async（或 config.json 設定 "run_mode": "async"）
+離線模擬：python main.py --mock（以本地模擬 OpenD 隨機遊走報價並撮合，參數見 config.json 的 mock_*）
+錄製回放：python main.py --replay ticks（以錄製的逐筆檔驅動模擬 OpenD，倍速見 config.json 的 replay_speed，回放時不錄製）
 '''
 
 class Main:
     """主交易系統，整合各功能類"""
 
-    def __init__(self):
-        # 載入配置
+    def __init__(self, quote_ctx=None, trd_ctx=None, record_ticks=None):
+        # 載入配置；可注入模擬連線（見 menu/mock_opend.py）
         config = load_config()
-        self.quote_ctx = OpenQuoteContext(host=config['host'], port=config['port'])
-        self.trd_ctx = OpenFutureTradeContext(host=config['host'], port=config['port'])
+        self.quote_ctx = quote_ctx or OpenQuoteContext(host=config['host'], port=config['port'])
+        self.trd_ctx = trd_ctx or OpenFutureTradeContext(host=config['host'], port=config['port'])
         self.trd_env = config['trd_env']
         setup_logging()
-        # 載入虛擬訂單
-        VIRTUAL_ORDERS[:] = load_virtual_orders_from_csv()
+        # 從預寫日誌恢復持倉；首次啟用日誌時沿用 virtual_orders.csv
+        self.journal = OrderJournal(
+            fsync_batch=int(config.get('journal_fsync_batch', 32)),
+            fsync_interval=float(config.get('journal_fsync_interval', 0.5)),
+            compact_every=int(config.get('journal_compact_every', 1000))
+        )
+        orders = self.journal.recover()
+        ORDER_STORE.load(orders if orders is not None else load_virtual_orders_from_csv())
+        self.journal.open()
+        self.journal.compact(ORDER_STORE.virtual_orders())
+        ORDER_STORE.attach_journal(self.journal)
+        # 在此完成開倉台帳的啟動與舊 open_orders.log 匯入，不留到首筆成交推送時同步執行
+        ORDER_LEDGER.start()
         # 初始化訂單計數器
         max_order_num = 0
-        for order in VIRTUAL_ORDERS:
+        for order in ORDER_STORE.virtual_orders():
             try:
-                order_num = int(order['id'].split('-')[1])
+                order_num = int(order.id.split('-')[1])
                 max_order_num = max(max_order_num, order_num)
             except (IndexError, ValueError):
                 continue
 
+        # 為已有持倉預先訂閱報價推送
+        get_quote_feed(self.quote_ctx).subscribe(ORDER_STORE.virtual_codes())
+        # 錄製報價源看到的每筆價格，供事後回放與分析
+        self.tick_recorder = None
+        if (config.get('tick_record_enabled', True) if record_ticks is None else record_ticks):
+            self.tick_recorder = TickRecorder()
+            get_quote_feed(self.quote_ctx).add_listener(self.tick_recorder.record)
+            self.tick_recorder.start()
+
         # 初始化各功能
         self.open_order = OpenOrder(self.quote_ctx, self.trd_ctx, self.trd_env, max_order_num + 1)
         self.force_order = CloseOrder(self.quote_ctx, self.trd_ctx, self.trd_env)
         self.status = GetPositions(self.quote_ctx)
-        self.close_all = CloseAllOrders(self.quote_ctx, self.trd_ctx, self.trd_env)
         self.cancel_order = CancelOrder(self.trd_ctx, self.trd_env)
         self.monitor_sl_tp = MonitorStopLossTakeProfit(self.quote_ctx, self.trd_ctx, self.trd_env)
         # 初始化點位管理
         self.point_manager = PointManager(self.quote_ctx, self.trd_ctx, self.trd_env, max_order_num + 1)
         base_dir = os.path.dirname(os.path.abspath(__file__))
-        self.point_manager.load_points(os.path.join(base_dir, 'points'))
+        points_dir = os.path.join(base_dir, 'points')
+        # 恢復點位的命中次數、已開索引、持倉與交易記錄，並與券商持倉對賬
+        self.point_state = None
+        if config.get('point_state_enabled', True):
+            self.point_state = PointStateStore(points_dir)
+            self.point_manager.attach_state(self.point_state)
+        self.point_manager.load_points(points_dir)
+        load_point_histories(points_dir, list(self.point_manager.points))
+        if self.point_state is not None:
+            self.point_manager.reconcile_positions()
+            self.point_state.start(lambda: self.point_manager.points)
+        self.point_manager.start_watcher()
+        # 初始化成交追蹤
+        self.order_tracker = OrderTracker(self.quote_ctx, self.trd_ctx, self.trd_env, self.point_manager)
+        self.order_tracker.start_push()
+        self.close_all = CloseAllOrders(self.quote_ctx, self.trd_ctx, self.trd_env, self.order_tracker)
+        # 定期輸出延遲統計
+        LATENCY.start_dumper(default_dump_path(), float(config.get('latency_dump_interval', 60)))
 
     def monitor_orders(self):
-        """監控訂單狀態並更新持倉"""
-        while True:
-            try:
-                for order_id in list(PENDING_ORDERS.keys()):
-                    ret, data = self.trd_ctx.order_list_query(order_id=order_id, trd_env=self.trd_env)
-                    if ret == RET_OK and not data.empty:
-                        status = data['order_status'][0]
-                        order_info = PENDING_ORDERS.get(order_id, {})
-                        custom_order_id = order_info.get('id', '未知')
-                        code = order_info.get('code', '未知')
-                        direction = order_info.get('direction', '未知')
-                        qty = order_info.get('qty', 0)
-                        price = order_info.get('price', 0)
-                        order_type = order_info.get('order_type', 'open')
-                        stop_loss = order_info.get('stop_loss')
-                        take_profit = order_info.get('take_profit')
-                        use_trailing = order_info.get('use_trailing', False)
-                        point_id = order_info.get('point_id')
-                        hit_price = order_info.get('hit_price')
-
-                        if status == OrderStatus.FILLED_ALL:
-                            if order_type == 'open':
-                                VIRTUAL_ORDERS.append({
-                                    'id': custom_order_id,
-                                    'code': code,
-                                    'direction': direction,
-                                    'quantity': qty,
-                                    'entry_price': price,
-                                    'is_open': True,
-                                    'stop_loss': stop_loss,
-                                    'take_profit': take_profit,
-                                    'highest_price': price,
-                                    'lowest_price': price,
-                                    'use_trailing': use_trailing,
-                                    'is_closing': False
-                                })
-                                logging.info(f"📥 開倉訂單成功成交：訂單ID={custom_order_id}, 合約={code}, 方向={direction}, 數量={qty}, 開倉價格={price}, 命中點位 ({[point_id]})={hit_price}, "
-                                                f"止損={stop_loss or '無'}, 止盈={take_profit or '無'}, 移動止盈={'啟用' if use_trailing else '未啟用'}\n")
-                                append_open_order_to_log(custom_order_id, code, direction, qty, price)
-                                # 檢查是否為自動開倉訂單，更新點位記錄
-                                if custom_order_id.startswith("AUTO-"):
-                                    point_id = custom_order_id.split('-')[1]
-                                    for point in self.point_manager.points.values():
-                                        if point.id == point_id:
-                                            point.add_position(order_id, int(custom_order_id.split('-')[2]), price, custom_order_id)
-                                            from menu.points.point_logger import update_point_history
-                                            update_point_history(point_id, order_id, f"合約={code}, 方向={direction}, 數量={qty}, 價格={price}", is_open=True)
-                            else:
-                                original_qty = qty
-                                remaining_qty = 0
-                                for order in VIRTUAL_ORDERS[:]:
-                                    if order['id'] == custom_order_id and order['direction'] == direction and order['is_open']:
-                                        if order['quantity'] <= qty:
-                                            order['is_open'] = False
-                                            order['is_closing'] = False
-                                            qty -= order['quantity']
-                                        else:
-                                            order['quantity'] -= qty
-                                            remaining_qty = order['quantity']
-                                            order['is_closing'] = False
-                                            qty = 0
-                                        break
-                                VIRTUAL_ORDERS[:] = [order for order in VIRTUAL_ORDERS if order['is_open'] and order['quantity'] > 0]
-                                entry_price = order_info.get('entry_price', 0)
-                                pnl = (price - entry_price) * original_qty * 10 if direction == 'long' else (entry_price - price) * original_qty * 10
-                                logging.info(f"📤 平倉訂單成功成交：訂單ID={custom_order_id}, 合約={code}, 方向={direction}, 數量={original_qty}, 平倉價格={price}, 盈虧={pnl}\n")
-                                update_order_in_log(custom_order_id, remaining_qty)
-                                if custom_order_id in CLOSING_ORDERS:
-                                    CLOSING_ORDERS.remove(custom_order_id)
-                                # 檢查是否為自動開倉訂單，更新點位記錄
-                                if custom_order_id.startswith("AUTO-"):
-                                    point_id = custom_order_id.split('-')[1]
-                                    for point in self.point_manager.points.values():
-                                        if point.id == point_id:
-                                            point.close_position(order_id, price)
-                                            from menu.points.point_logger import update_point_history
-                                            update_point_history(point_id, order_id, f"合約={code}, 方向={direction}, 數量={qty}, 價格={price}", is_open=False)
-                            del PENDING_ORDERS[order_id]
-                        elif status in [OrderStatus.CANCELLED_ALL, OrderStatus.FAILED]:
-                            logging.info(f"訂單 {custom_order_id} 已取消或失敗")
-                            del PENDING_ORDERS[order_id]
-                            if custom_order_id in CLOSING_ORDERS:
-                                CLOSING_ORDERS.remove(custom_order_id)
-                                for order in VIRTUAL_ORDERS:
-                                    if order['id'] == custom_order_id and not order['is_open']:
-                                        order['is_open'] = True
-                                        order['is_closing'] = False
-                                        if order['use_trailing']:
-                                            current_price = self.monitor_sl_tp.get_market_price(order['code'])
-                                            if current_price:
-                                                order['highest_price'] = current_price
-                                                order['lowest_price'] = current_price
-                                            else:
-                                                order['highest_price'] = order['entry_price']
-                                                order['lowest_price'] = order['entry_price']
-                                        logging.warning(f"恢復訂單 {custom_order_id} 為可監控狀態，因平倉取消或失敗")
-                time.sleep(1)
-            except Exception as e:
-                logging.error(f"訂單監控異常：{e}")
-                time.sleep(5)
+        """監控訂單狀態並更新持倉：成交推送即時處理，批量對賬作為後備"""
+        self.order_tracker.run()
 
     def parse_command(self, command):
         """解析終端命令並執行"""
@@ -219,7 +175,22 @@ class Main:
             success, msg = self.status.execute()
             return msg
         elif cmd == '/close_all':
-            success, msg = self.close_all.execute()
+            net = None
+            if len(parts) > 1 and parts[1].lower() in ('net', 'nonet'):
+                net = parts[1].lower() == 'net'
+            success, msg = self.close_all.execute(net=net)
+            return msg
+        elif cmd == '/reload_points':
+            success, msg = self.point_manager.reload_points()
+            logging.info(msg)
+            return msg
+        elif cmd == '/latency':
+            if len(parts) > 1 and parts[1].lower() == 'reset':
+                LATENCY.reset()
+                msg = "延遲統計已清空"
+            else:
+                msg = LATENCY.report()
+            logging.info(msg)
             return msg
         else:
             error_msg = "無效命令或參數不足"
@@ -236,18 +207,71 @@ class Main:
         point_thread = threading.Thread(target=self.point_manager.start_monitor, daemon=True)
         point_thread.start()
 
-        logging.info("期貨交易系統已啟動，輸入命令（/open_order, /force_order, /status, /close_all, /cancel_order），輸入 'exit' 退出")
+        logging.info("期貨交易系統已啟動，輸入命令（/open_order, /force_order, /status, /close_all, /cancel_order, /reload_points, /latency），輸入 'exit' 退出")
         while True:
             command = input("").strip()
             if command.lower() == 'exit':
-                logging.info("退出系統")
-                self.point_manager.running = False  # 停止點位監控
-                save_virtual_orders_to_csv()
-                self.quote_ctx.close()
-                self.trd_ctx.close()
+                self.shutdown()
                 break
             result = self.parse_command(command)
 
+    def run_async(self):
+        """以 asyncio 單一事件循環啟動，報價、成交與命令皆為協程任務"""
+        asyncio.run(AsyncTradingCore(self).run())
+        self.shutdown()
+
+    def shutdown(self):
+        """停止監控、保存持倉並關閉連線"""
+        logging.info("退出系統")
+        self.point_manager.running = False  # 停止點位監控
+        self.point_manager.stop_watcher()
+        if self.point_state is not None:
+            self.point_state.close(self.point_manager.points)
+        self.order_tracker.running = False
+        save_virtual_orders_to_csv()
+        self.journal.close(ORDER_STORE.virtual_orders())
+        ORDER_LEDGER.close()
+        LATENCY.stop_dumper(default_dump_path() if LATENCY.enabled else None)
+        get_order_gateway(self.trd_ctx).stop()
+        if self.tick_recorder is not None:
+            self.tick_recorder.stop()
+        self.quote_ctx.close()
+        self.trd_ctx.close()
+        shutdown_logging()
+
+def create_mock_opend(config, replay_dir=None):
+    """建立本地模擬 OpenD，點位合約以隨機遊走報價；指定 replay_dir 時改為回放錄製的逐筆檔"""
+    opend = MockOpenD(
+        tick_interval=float(config.get('mock_tick_interval', 0.5)),
+        fill_latency=float(config.get('mock_fill_latency', 0.05)),
+        reject_rate=float(config.get('mock_reject_rate', 0.0))
+    )
+    if replay_dir:
+        store = TickStore(replay_dir)
+        if not store.codes():
+            raise ValueError(f"{replay_dir} 沒有逐筆錄製檔")
+        codes = opend.replay(store, speed=float(config.get('replay_speed', 1.0)))
+        logging.info(f"回放 {replay_dir} 的 {len(store)} 筆錄製行情：{', '.join(codes)}")
+    else:
+        opend.set_path(config.get('point_code', 'HK.MHI2506'), random_walk(float(config.get('mock_start_price', 23000))))
+    opend.start()
+    return opend
+
 if __name__ == "__main__":
-    trading = Main()
-    trading.run()
\ No newline at end of file
+    config = load_config()
+    opend = None
+    if '--replay' in sys.argv:
+        index = sys.argv.index('--replay') + 1
+        opend = create_mock_opend(config, sys.argv[index] if index < len(sys.argv) else default_tick_dir())
+        trading = Main(opend.quote_context(), opend.trade_context(), record_ticks=False)
+    elif '--mock' in sys.argv:
+        opend = create_mock_opend(config)
+        trading = Main(opend.quote_context(), opend.trade_context())
+    else:
+        trading = Main()
+    if '--async' in sys.argv or config.get('run_mode') == 'async':
+        trading.run_async()
+    else:
+        trading.run()
+    if opend is not None:
+        opend.stop()
\ No newline at end of file
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from .utils import load_config
+from .quote_feed import get_quote_feed
+
+class _LoopQueue:
+    """提供 put() 介面的線程安全轉接，讓推送線程把事件送進 asyncio 隊列"""
+
+    def __init__(self, loop, queue):
+        self.loop = loop
+        self.queue = queue
+
+    def put(self, item):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+
+class AsyncTradingCore:
+    """單一事件循環的交易核心：報價、成交與命令均為同一 loop 上的任務
+
+    推送回調只負責喚醒 loop，價格按合約合併為最新值後立即處理，不再有 time.sleep 的輪詢間隔；
+    futu 的阻塞請求（下單、對賬、快照）交由有上限的線程池執行。
+    """
+
+    def __init__(self, main):
+        config = load_config()
+        self.main = main
+        self.quote_feed = get_quote_feed(main.quote_ctx)
+        self.executor = ThreadPoolExecutor(max_workers=int(config.get('async_workers', 4)), thread_name_prefix='futu-io')
+        self.input_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='stdin')
+        self.poll_interval = float(config.get('quote_max_age', 5))  # 推送缺失時的快照補償間隔
+        self.reconcile_interval = main.order_tracker.reconcile_interval
+        self.loop = None
+        self._pending_prices = {}  # {code: price} 尚未處理的最新價格
+        self._price_event = None
+        self._stopping = None
+
+    def _on_price(self, code, price):
+        """推送線程回調：記錄最新價格並喚醒 loop"""
+        self.loop.call_soon_threadsafe(self._queue_price, code, price)
+
+    def _queue_price(self, code, price):
+        self._pending_prices[code] = price
+        self._price_event.set()
+
+    async def _call(self, fn, *args):
+        """在有上限的線程池中執行阻塞調用"""
+        return await self.loop.run_in_executor(self.executor, fn, *args)
+
+    async def _quote_task(self):
+        """處理價格更新：止盈止損與點位開倉檢查並行執行"""
+        while True:
+            await self._price_event.wait()
+            self._price_event.clear()
+            prices, self._pending_prices = self._pending_prices, {}
+            for code, price in prices.items():
+                results = await asyncio.gather(
+                    self._call(self.main.monitor_sl_tp.check, code, price),
+                    self._call(self.main.point_manager.on_price, code, price),
+                    return_exceptions=True
+                )
+                for result in results:
+                    if isinstance(result, Exception):
+                        logging.error(f"價格處理異常（{code}）：{result}")
+
+    async def _poll_task(self):
+        """推送缺失時以批量快照補償，保證監控不會因訂閱失敗而停止"""
+        while True:
+            try:
+                codes = self.main.point_manager.codes() | self.main.monitor_sl_tp.codes()
+                if codes:
+                    # 快取過期的合約會以快照刷新，並經價格回調進入 _quote_task
+                    await self._call(self.quote_feed.get_prices, codes)
+            except Exception as e:
+                logging.error(f"報價補償異常：{e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _fill_task(self, events):
+        """處理訂單與成交推送"""
+        tracker = self.main.order_tracker
+        while True:
+            kind, order_id, status = await events.get()
+            try:
+                if kind == 'order':
+                    await self._call(tracker.process_order, order_id, status)
+                elif kind == 'deal':
+                    await self._call(tracker.reconcile, [order_id])
+            except Exception as e:
+                logging.error(f"訂單監控異常：{e}")
+
+    async def _reconcile_task(self):
+        """後備批量對賬"""
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self._call(self.main.order_tracker.reconcile)
+            except Exception as e:
+                logging.error(f"訂單對賬異常：{e}")
+
+    async def _command_task(self):
+        """讀取終端命令，input() 在獨立線程中阻塞，不佔用交易線程池"""
+        while True:
+            command = (await self.loop.run_in_executor(self.input_executor, input, "")).strip()
+            if command.lower() == 'exit':
+                self._stopping.set()
+                return
+            try:
+                await self._call(self.main.parse_command, command)
+            except Exception as e:
+                logging.error(f"命令執行異常：{e}")
+
+    async def run(self):
+        """啟動所有任務，直到輸入 exit"""
+        self.loop = asyncio.get_running_loop()
+        self._price_event = asyncio.Event()
+        self._stopping = asyncio.Event()
+        events = asyncio.Queue()
+        self.main.order_tracker.events = _LoopQueue(self.loop, events)
+        self.quote_feed.add_listener(self._on_price)
+
+        tasks = [
+            asyncio.create_task(self._quote_task()),
+            asyncio.create_task(self._poll_task()),
+            asyncio.create_task(self._fill_task(events)),
+            asyncio.create_task(self._reconcile_task()),
+            asyncio.create_task(self._command_task()),
+        ]
+        logging.info("期貨交易系統已啟動（asyncio 模式），輸入命令（/open_order, /force_order, /status, /close_all, /cancel_order, /reload_points, /latency），輸入 'exit' 退出")
+        stop_waiter = asyncio.create_task(self._stopping.wait())
+        done, _ = await asyncio.wait(tasks + [stop_waiter], return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task is not stop_waiter and task.exception() is not None:
+                logging.error(f"asyncio 任務異常：{task.exception()}")
+        for task in tasks + [stop_waiter]:
+            task.cancel()
+        await asyncio.gather(*tasks, stop_waiter, return_exceptions=True)
+        self.quote_feed.remove_listener(self._on_price)
+        self.executor.shutdown(wait=True)
+        self.input_executor.shutdown(wait=False)
@@ -0,0 +1,232 @@
+from futu import *
+import logging
+import os
+import time
+import numpy as np
+import pandas as pd
+from .order_store import ORDER_STORE
+from .trigger_book import TRIGGER_BOOK
+from .quote_feed import get_quote_feed
+from .order_gateway import get_order_gateway
+from .monitor_stop_loss_take_profit import MonitorStopLossTakeProfit
+from .order_tracker import OrderTracker
+from .points.point_manager import PointManager
+from .simulation import SimClock, SimExchange, SimQuoteContext, SimTradeContext
+from .utils import load_config
+from .latency import LATENCY
+from .tick_recorder import read_ticks
+from .tick_replay import TickStore
+
+_TIME_COLUMNS = ('time', 'timestamp', 'datetime', 'time_key')
+_PRICE_COLUMNS = ('price', 'last_price', 'close')
+
+def load_ticks(path, code=None, start=None, end=None):
+    """讀取逐筆或 K 線數據（CSV、Parquet 或 tick_recorder 錄製的 .ticks），返回 (時間戳秒數組, 合約列表, 價格數組)
+
+    逐筆數據需有時間與價格欄（price / last_price / close）；含 open/high/low/close 的 K 線
+    每根展開為四個價格：陽線 開-低-高-收，陰線 開-高-低-收。無 code 欄時所有行使用參數 code。
+    .ticks 檔未指定 code 時以所在目錄名為合約代碼。path 為錄製目錄時以 TickStore 讀取全部合約
+    時間窗口 [start, end) 內的記錄。
+    """
+    if os.path.isdir(path):
+        return TickStore(path).load(start=start, end=end)
+    if path.endswith('.ticks'):
+        ticks = read_ticks(path)
+        code = code or os.path.basename(os.path.dirname(os.path.abspath(path)))
+        return ticks['time'] / 1e9, np.full(len(ticks), code, dtype=object), np.array(ticks['price'])
+    if path.endswith('.parquet'):
+        try:
+            frame = pd.read_parquet(path)
+        except ImportError as e:
+            raise RuntimeError(f"讀取 Parquet 需要安裝 pyarrow 或 fastparquet：{e}")
+    else:
+        frame = pd.read_csv(path)
+    frame.columns = [str(column).lower() for column in frame.columns]
+
+    time_column = next((column for column in _TIME_COLUMNS if column in frame.columns), None)
+    if time_column is None:
+        raise ValueError(f"{path} 缺少時間欄，需為 {_TIME_COLUMNS} 之一")
+    times = frame[time_column]
+    if pd.api.types.is_numeric_dtype(times):
+        timestamps = times.to_numpy(dtype=np.float64)
+        if len(timestamps) and timestamps.max() > 1e12:
+            timestamps = timestamps / 1000.0  # 毫秒時間戳
+    else:
+        timestamps = pd.to_datetime(times).to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+
+    if 'code' in frame.columns:
+        codes = frame['code'].astype(str).to_numpy()
+    elif code:
+        codes = np.full(len(frame), code, dtype=object)
+    else:
+        raise ValueError(f"{path} 缺少 code 欄，需指定合約代碼")
+
+    if {'open', 'high', 'low', 'close'}.issubset(frame.columns):
+        bars = frame[['open', 'high', 'low', 'close']].to_numpy(dtype=np.float64)
+        up = bars[:, 3] >= bars[:, 0]
+        prices = np.where(up[:, None], bars[:, [0, 2, 1, 3]], bars[:, [0, 1, 2, 3]]).reshape(-1)
+        timestamps = np.repeat(timestamps, 4)
+        codes = np.repeat(codes, 4)
+    else:
+        price_column = next((column for column in _PRICE_COLUMNS if column in frame.columns), None)
+        if price_column is None:
+            raise ValueError(f"{path} 缺少價格欄，需為 {_PRICE_COLUMNS} 之一")
+        prices = frame[price_column].to_numpy(dtype=np.float64)
+
+    order = np.argsort(timestamps, kind='stable')
+    return timestamps[order], codes[order], prices[order]
+
+class BacktestResult:
+    """回測結果：成交明細、已實現盈虧、最大回撤與吞吐量"""
+
+    def __init__(self):
+        self.ticks = 0
+        self.processed = 0  # 價格有變動、實際進入策略邏輯的行情數
+        self.elapsed = 0.0
+        self.opens = 0
+        self.cancels = 0
+        self.trades = []  # 平倉明細
+        self.realized_pnl = 0.0
+        self.max_drawdown = 0.0
+        self.unrealized_pnl = 0.0
+        self.open_positions = 0
+        self.points = {}
+        self._peak = 0.0
+
+    def record_close(self, timestamp, order_info, pnl):
+        self.trades.append({
+            'time': timestamp,
+            'order_id': order_info.id,
+            'code': order_info.code,
+            'direction': order_info.direction,
+            'qty': order_info.qty,
+            'entry_price': order_info.entry_price,
+            'exit_price': order_info.price,
+            'pnl': pnl
+        })
+        self.realized_pnl += pnl
+        self._peak = max(self._peak, self.realized_pnl)
+        self.max_drawdown = max(self.max_drawdown, self._peak - self.realized_pnl)
+
+    @property
+    def ticks_per_second(self):
+        """每秒處理的行情數：只計價格有變動、實際進入策略邏輯的行情，耗時不含讀取行情檔"""
+        return self.processed / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        wins = sum(1 for trade in self.trades if trade['pnl'] > 0)
+        return {
+            'ticks': self.ticks,
+            'processed_ticks': self.processed,
+            'elapsed_sec': round(self.elapsed, 3),
+            'ticks_per_sec': round(self.ticks_per_second),
+            'opens': self.opens,
+            'closes': len(self.trades),
+            'cancels': self.cancels,
+            'win_rate': round(wins / len(self.trades), 4) if self.trades else 0.0,
+            'realized_pnl': self.realized_pnl,
+            'max_drawdown': self.max_drawdown,
+            'open_positions': self.open_positions,
+            'unrealized_pnl': self.unrealized_pnl
+        }
+
+class Backtester:
+    """確定性回測引擎
+
+    以 SimQuoteContext / SimTradeContext 取代 OpenD，逐筆回放歷史價格，直接驅動真實的
+    PointManager、Point、OpenOrder、CloseOrder、MonitorStopLossTakeProfit 與 OrderTracker 邏輯。
+    不啟動監控線程、不調用 time.sleep，時間由行情時間戳推進的虛擬時鐘提供；成交在撮合時同步回報，
+    相同輸入必得相同結果。價格未變動的行情不改變任何狀態，直接略過。
+
+    ORDER_STORE 與 TRIGGER_BOOK 為全局實例，每次 run() 前清空，同一進程內不可並行回測。
+    """
+
+    def __init__(self, points_dir, code=None, trd_env=TrdEnv.SIMULATE):
+        self.points_dir = points_dir
+        self.code = code or load_config().get('point_code', 'HK.MHI2506')  # 行情檔與點位 JSON 未指定合約時使用
+        self.trd_env = trd_env
+
+    def _setup(self):
+        ORDER_STORE.attach_journal(None)
+        ORDER_STORE.clear()
+        TRIGGER_BOOK.clear()
+        self.clock = SimClock()
+        self.exchange = SimExchange(self.clock)
+        self.quote_ctx = SimQuoteContext(self.exchange)
+        self.trd_ctx = SimTradeContext(self.exchange)
+        get_order_gateway(self.trd_ctx, enabled=False)  # 虛擬時鐘下不限流，直接同步下單
+        self.quote_feed = get_quote_feed(self.quote_ctx)
+        self.quote_feed.clock = self.clock.monotonic
+        self.point_manager = PointManager(self.quote_ctx, self.trd_ctx, self.trd_env, 1)
+        self.point_manager.default_code = self.code
+        self.point_manager.load_points(self.points_dir)
+        self.monitor = MonitorStopLossTakeProfit(self.quote_ctx, self.trd_ctx, self.trd_env)
+        self.tracker = OrderTracker(self.quote_ctx, self.trd_ctx, self.trd_env, self.point_manager, persist=False)
+        self.exchange.on_status = self.tracker.process_order
+        self.result = BacktestResult()
+        self.tracker.add_listener(self._on_fill)
+
+    def _on_fill(self, event, order_info, pnl):
+        if event == 'open':
+            self.result.opens += 1
+        elif event == 'close':
+            self.result.record_close(self.clock.now, order_info, pnl)
+        else:
+            self.result.cancels += 1
+
+    def run(self, timestamps, codes, prices):
+        """回放行情並返回 BacktestResult；回放期間停用全局延遲統計，結束後恢復原設定"""
+        latency_enabled = LATENCY.enabled
+        LATENCY.enabled = False  # 虛擬時鐘下牆鐘延遲無意義，亦避免熱路徑開銷
+        try:
+            return self._replay(timestamps, codes, prices)
+        finally:
+            LATENCY.enabled = latency_enabled
+
+    def _replay(self, timestamps, codes, prices):
+        self._setup()
+        clock = self.clock
+        match = self.exchange.match
+        update_price = self.quote_feed.update_price
+        check_exits = self.monitor.check
+        on_price = self.point_manager.on_price
+        last_prices = {}
+        processed = 0
+        started = time.perf_counter()
+        for timestamp, code, price in zip(timestamps.tolist(), codes.tolist(), prices.tolist()):
+            if last_prices.get(code) == price:
+                continue
+            last_prices[code] = price
+            processed += 1
+            clock.now = timestamp
+            match(code, price)  # 先撮合掛單，成交即時更新持倉
+            update_price(code, price, timestamp)
+            check_exits(code, price)
+            on_price(code, price)
+            match(code, price)  # 本筆行情新提交且可立即成交的訂單
+        result = self.result
+        result.elapsed = time.perf_counter() - started
+        result.ticks = len(prices)
+        result.processed = processed
+        for order in ORDER_STORE.virtual_orders():
+            last_price = last_prices.get(order.code)
+            if last_price is None:
+                continue
+            sign = 1 if order.direction == 'long' else -1
+            result.unrealized_pnl += sign * (last_price - order.entry_price) * order.quantity * 10
+            result.open_positions += 1
+        result.points = self.point_manager.get_status()
+        return result
+
+    def run_file(self, path, start=None, end=None):
+        """讀取行情檔並回測"""
+        timestamps, codes, prices = load_ticks(path, self.code, start, end)
+        logging.info(f"已載入 {len(prices)} 筆行情：{path}")
+        return self.run(timestamps, codes, prices)
+
+def default_points_dir():
+    """返回專案根目錄下的 points 資料夾"""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    while base_dir.endswith('menu'):
+        base_dir = os.path.dirname(base_dir)
+    return os.path.join(base_dir, 'points')
@@ -1,23 +1,26 @@
 from futu import *
 import logging
-from .utils import PENDING_ORDERS
+from .order_store import ORDER_STORE
+from .order_gateway import get_order_gateway, PRIORITY_CANCEL
 from futu.common.constant import RET_OK  # 添加這行
 
 class CancelOrder:
     def __init__(self, trd_ctx, trd_env):
         self.trd_ctx = trd_ctx
+        self.gateway = get_order_gateway(trd_ctx)
         self.trd_env = trd_env
 
     def execute(self, order_id):
         """取消指定訂單編號的待成交訂單"""
         try:
-            futu_order_id = next((fid for fid, order in PENDING_ORDERS.items() if order['id'] == order_id), None)
+            futu_order_id = ORDER_STORE.find_pending(order_id)
             if not futu_order_id:
                 error_msg = f"未找到訂單ID為 {order_id} 的待成交訂單"
                 logging.error(error_msg)
                 return False, error_msg
 
-            ret, data = self.trd_ctx.modify_order(
+            ret, data = self.gateway.modify_order(
+                priority=PRIORITY_CANCEL,
                 modify_order_op=ModifyOrderOp.CANCEL,
                 order_id=futu_order_id,
                 qty=0,
@@ -25,11 +28,13 @@ class CancelOrder:
                 trd_env=self.trd_env
             )
             if ret == RET_OK:
+                # 待成交記錄保留至取消推送，由 OrderTracker 經 split() 逐筆恢復合併平倉單的各成分
+                pending = ORDER_STORE.get_pending(futu_order_id)
+                others = [other for other in pending.ids() if other != order_id] if pending is not None else []
                 success_msg = f"訂單 {order_id} 取消提交成功"
+                if others:
+                    success_msg += f"（合併平倉單，一併取消 {', '.join(others)}）"
                 logging.info(success_msg)
-                if futu_order_id in PENDING_ORDERS:
-                    del PENDING_ORDERS[futu_order_id]
-                    # logging.info(f"移除監控訂單 {futu_order_id}，當前 PENDING_ORDERS: {PENDING_ORDERS}")
                 return True, success_msg
             else:
                 error_msg = f"訂單 {order_id} 取消失敗：{data}"
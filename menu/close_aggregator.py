@@ -0,0 +1,44 @@
+import logging
+from .utils import load_config
+from .order_gateway import PRIORITY_TAKE_PROFIT
+
+class CloseAggregator:
+    """平倉合併層：同一時刻觸發、合約與方向相同的平倉合併為一張交易所訂單
+
+    成交後由 OrderTracker 經 PendingOrder.split() 把成交按成分分配回各虛擬訂單，
+    以減少下單次數、手續費與需要追蹤的成交。
+    """
+
+    def __init__(self, close_order, enabled=None):
+        self.close_order = close_order
+        self.enabled = bool(load_config().get('aggregate_closes', True)) if enabled is None else enabled
+
+    def group(self, legs):
+        """把 [(虛擬訂單, 數量)] 按 (合約, 方向) 分組，未啟用合併時每筆單獨成組"""
+        if not self.enabled:
+            return [[leg] for leg in legs]
+        groups = {}
+        for order, qty in legs:
+            groups.setdefault((order.code, order.direction), []).append((order, qty))
+        return list(groups.values())
+
+    def submit_group(self, legs, price=None, priority=PRIORITY_TAKE_PROFIT):
+        """提交一組平倉，單筆時照常提交，返回 (成功, 訊息)"""
+        if len(legs) == 1:
+            order, qty = legs[0]
+            success, _, _, _, msg = self.close_order.execute(order.id, qty, order.direction, price, priority)
+        else:
+            logging.info(f"合併 {len(legs)} 筆平倉為一張訂單：{', '.join(order.id for order, _ in legs)}")
+            success, _, _, _, msg = self.close_order.execute_aggregate(
+                [(order.id, qty) for order, qty in legs], legs[0][0].direction, price, priority)
+        return success, msg
+
+    def submit(self, legs, price=None, priorities=None):
+        """分組後逐組提交，返回 [(組內 legs, 成功, 訊息)]；priorities 為 {訂單 ID: 優先級}，每組取最優先者"""
+        results = []
+        for group in self.group(legs):
+            priority = PRIORITY_TAKE_PROFIT
+            if priorities:
+                priority = min(priorities.get(order.id, PRIORITY_TAKE_PROFIT) for order, _ in group)
+            results.append((group, *self.submit_group(group, price, priority)))
+        return results
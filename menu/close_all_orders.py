@@ -1,34 +1,133 @@
+from futu import *
+import itertools
 import logging
-from .utils import VIRTUAL_ORDERS
+from concurrent.futures import ThreadPoolExecutor
+from .utils import load_config
+from .order_store import ORDER_STORE, PendingOrder
+from .trigger_book import TRIGGER_BOOK
 from .close_order import CloseOrder
+from .close_aggregator import CloseAggregator
+from .order_gateway import PRIORITY_STOP_LOSS
+
+_NET_IDS = itertools.count(1)
 
 class CloseAllOrders:
-    def __init__(self, quote_ctx, trd_ctx, trd_env):
+    """批量平倉：每個合約只取一次價格，可選同合約多空內部對沖，其餘按合約與方向合併後經有界線程池並行提交"""
+
+    def __init__(self, quote_ctx, trd_ctx, trd_env, order_tracker=None):
+        config = load_config()
         self.close_order = CloseOrder(quote_ctx, trd_ctx, trd_env)
+        self.quote_feed = self.close_order.quote_feed
+        self.aggregator = CloseAggregator(self.close_order)
+        self.order_tracker = order_tracker  # 內部對沖的成交經由 OrderTracker 記帳，未提供時不對沖
+        self.netting = bool(config.get('close_all_netting', False))
+        self.workers = int(config.get('close_all_workers', 4))
+        self.last_results = []  # 最近一次批量平倉的逐筆結果
 
-    def execute(self):
-        """平倉所有當前持倉的虛擬訂單"""
+    def execute(self, net=None):
+        """平倉所有當前持倉的虛擬訂單，net 為 None 時按 config 的 close_all_netting 決定是否對沖"""
         try:
-            if not any(order['is_open'] and order['quantity'] > 0 for order in VIRTUAL_ORDERS):
+            # 先標記為正在平倉，避免止盈止損監控同時平倉同一訂單
+            orders = [order for order in ORDER_STORE.virtual_orders() if ORDER_STORE.mark_closing(order)]
+            if not orders:
                 logging.info("無持倉可平倉")
                 return False, "無持倉可平倉"
 
+            codes = {order.code for order in orders}
+            prices = self.quote_feed.get_prices(codes)
             results = []
-            for order in VIRTUAL_ORDERS:
-                if order['is_open'] and order['quantity'] > 0:
-                    success, _, _, _, msg = self.close_order.execute(
-                        order_id=order['id'],
-                        qty=order['quantity'],
-                        direction=order['direction'],
-                        price=None
-                    )
-                    results.append(msg)
-
-            success = all("成功" in msg for msg in results)
-            final_msg = "全部平倉訂單提交完成"
+            remaining = []
+            for order in orders:
+                if prices.get(order.code) is None:
+                    self._release(order)
+                    results.append(self._result(order, order.quantity, None, False, f"無法獲取 {order.code} 市場價格"))
+                else:
+                    remaining.append((order, order.quantity))
+
+            if (self.netting if net is None else net) and self.order_tracker is not None:
+                remaining, netted = self._net(remaining, prices)
+                results.extend(netted)
+
+            groups = self.aggregator.group(remaining)
+            if groups:
+                with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(groups)))) as pool:
+                    futures = [pool.submit(self._close, group, prices[group[0][0].code]) for group in groups]
+                    for future in futures:
+                        results.extend(future.result())
+
+            self.last_results = results
+            for result in results:
+                log = logging.info if result['success'] else logging.error
+                log(f"平倉 {result['order_id']}（{result['code']} {result['direction']} {result['qty']} @ {result['price']}）：{result['msg']}")
+            submitted = sum(1 for result in results if result['success'] and not result.get('netted'))
+            netted = sum(1 for result in results if result.get('netted'))
+            failed = sum(1 for result in results if not result['success'])
+            final_msg = f"全部平倉訂單提交完成：提交 {submitted} 筆，內部對沖 {netted} 筆，失敗 {failed} 筆"
             logging.info(final_msg)
-            return success, final_msg
+            return failed == 0, final_msg
         except Exception as e:
             error_msg = f"全部平倉異常：{str(e)}"
             logging.error(error_msg)
-            return False, error_msg
\ No newline at end of file
+            return False, error_msg
+
+    @staticmethod
+    def _result(order, qty, price, success, msg, netted=False):
+        return {'order_id': order.id, 'code': order.code, 'direction': order.direction, 'qty': qty,
+                'price': price, 'success': success, 'msg': msg, 'netted': netted}
+
+    @staticmethod
+    def _release(order):
+        """提交失敗：清除平倉標記並恢復止盈止損監控"""
+        ORDER_STORE.clear_closing(order.id)
+        TRIGGER_BOOK.add(order)
+
+    def _net(self, orders, prices):
+        """同合約的多單與空單 [(訂單, 數量)] 以當前價格內部對沖，返回 (仍需提交的 [(訂單, 數量)], 對沖結果)"""
+        by_code = {}
+        for order, qty in orders:
+            by_code.setdefault(order.code, {'long': [], 'short': []})[order.direction].append([order, qty])
+        remaining = []
+        results = []
+        for code, sides in by_code.items():
+            longs, shorts = sides['long'], sides['short']
+            i = j = 0
+            while i < len(longs) and j < len(shorts):
+                qty = min(longs[i][1], shorts[j][1])
+                for entry in (longs[i], shorts[j]):
+                    results.append(self._fill_internally(entry[0], qty, prices[code]))
+                    entry[1] -= qty
+                    # 部分對沖後持倉會重新加入觸發簿，若已被止盈止損監控搶先平倉則不再提交剩餘數量
+                    if entry[1] > 0 and not ORDER_STORE.mark_closing(entry[0]):
+                        entry[1] = 0
+                if longs[i][1] == 0:
+                    i += 1
+                if shorts[j][1] == 0:
+                    j += 1
+            remaining.extend((order, qty) for order, qty in longs + shorts if qty > 0)
+        return remaining, results
+
+    def _fill_internally(self, order, qty, price):
+        """以模擬成交記錄內部對沖的平倉，持倉、台帳與盈虧經由 OrderTracker 的平倉流程處理"""
+        net_id = f"NET-{next(_NET_IDS)}"
+        ORDER_STORE.add_pending(PendingOrder(
+            futu_order_id=net_id,
+            id=order.id,
+            code=order.code,
+            direction=order.direction,
+            qty=qty,
+            price=price,
+            entry_price=order.entry_price,
+            order_type='close'
+        ))
+        self.order_tracker.process_order(net_id, OrderStatus.FILLED_ALL)
+        return self._result(order, qty, price, True, f"內部對沖平倉 {qty} 張", netted=True)
+
+    def _close(self, legs, price):
+        """提交一組（可能已合併的）平倉，返回組內每筆訂單的結果"""
+        success, msg = self.aggregator.submit_group(legs, price, PRIORITY_STOP_LOSS)  # 全部平倉屬保護性操作
+        results = []
+        for order, qty in legs:
+            if not success:
+                self._release(order)
+            results.append(self._result(order, qty, price, success, msg))
+        return results
@@ -1,44 +1,38 @@
 from futu import *
 from futu.common.constant import RET_OK  # 明確匯入 RET_OK
 import logging
-from .utils import VIRTUAL_ORDERS, PENDING_ORDERS
+from .order_store import ORDER_STORE, PendingOrder
+from .quote_feed import get_quote_feed
+from .latency import LATENCY
+from .order_gateway import get_order_gateway, PRIORITY_TAKE_PROFIT
 
 class CloseOrder:
     def __init__(self, quote_ctx, trd_ctx, trd_env):
         self.quote_ctx = quote_ctx
+        self.quote_feed = get_quote_feed(quote_ctx)
         self.trd_ctx = trd_ctx
+        self.gateway = get_order_gateway(trd_ctx)
         self.trd_env = trd_env
 
     def get_market_price(self, code):
-        """獲取合約最新市場價格"""
-        try:
-            ret, data = self.quote_ctx.get_market_snapshot([code])
-            if ret == RET_OK and not data.empty:
-                price = data['last_price'][0]
-                logging.debug(f"獲取 {code} 市場價格：{price}")
-                return price
-            else:
-                logging.error(f"無法獲取 {code} 價格：{data}")
-                return None
-        except Exception as e:
-            logging.error(f"獲取 {code} 價格異常：{e}")
-            return None
+        """獲取合約最新市場價格（讀取共享報價源快取）"""
+        return self.quote_feed.get_price(code)
 
-    def execute(self, order_id, qty, direction, price=None):
-        """提交平倉訂單，根據訂單 ID 平倉"""
+    def execute(self, order_id, qty, direction, price=None, priority=PRIORITY_TAKE_PROFIT):
+        """提交平倉訂單，根據訂單 ID 平倉；priority 為交易網關的優先級，止損平倉應使用 PRIORITY_STOP_LOSS"""
         try:
-            virtual_order = next((order for order in VIRTUAL_ORDERS if order['id'] == order_id and order['direction'] == direction.lower() and order['is_open']), None)
+            virtual_order = ORDER_STORE.get_virtual(order_id, direction.lower())
             if not virtual_order:
                 error_msg = f"未找到訂單ID為 {order_id} 方向為 {direction} 的開倉訂單"
                 logging.error(error_msg)
                 return False, 0, 0, 0, error_msg
 
-            if virtual_order['quantity'] < qty:
-                error_msg = f"訂單 {order_id} 數量不足：可用 {virtual_order['quantity']}, 要求 {qty}"
+            if virtual_order.quantity < qty:
+                error_msg = f"訂單 {order_id} 數量不足：可用 {virtual_order.quantity}, 要求 {qty}"
                 logging.error(error_msg)
                 return False, 0, 0, 0, error_msg
 
-            code = virtual_order['code']
+            code = virtual_order.code
             if price is None:
                 price = self.get_market_price(code)
                 if price is None:
@@ -47,30 +41,23 @@ class CloseOrder:
                     return False, 0, 0, 0, error_msg
 
             custom_order_id = order_id
-            trd_side = TrdSide.SELL if direction.lower() == 'long' else TrdSide.BUY
-            entry_price = virtual_order['entry_price']
+            entry_price = virtual_order.entry_price
 
-            ret, data = self.trd_ctx.place_order(
-                price=price,
-                qty=qty,
-                code=code,
-                trd_side=trd_side,
-                trd_env=self.trd_env,
-                order_type=OrderType.NORMAL
-            )
+            ret, data = self._place(code, direction, qty, price, priority)
             if ret == RET_OK:
-                futu_order_id = data['order_id'][0]
-                PENDING_ORDERS[futu_order_id] = {
-                    'id': custom_order_id,
-                    'code': code,
-                    'direction': direction.lower(),
-                    'qty': qty,
-                    'price': price,
-                    'entry_price': entry_price,
-                    'order_type': 'close'
-                }
+                futu_order_id = data
+                ORDER_STORE.add_pending(PendingOrder(
+                    futu_order_id=futu_order_id,
+                    id=custom_order_id,
+                    code=code,
+                    direction=direction.lower(),
+                    qty=qty,
+                    price=price,
+                    entry_price=entry_price,
+                    order_type='close'
+                ))
                 success_msg = f"平倉訂單提交成功：訂單ID={custom_order_id}"
-                logging.info(f"⭕ 平倉訂單提交：訂單ID={custom_order_id}, 合約={code}, 方向={direction}, 數量={qty}, 平倉價格={price}")
+                logging.info("⭕ 平倉訂單提交：訂單ID=%s, 合約=%s, 方向=%s, 數量=%s, 平倉價格=%s", custom_order_id, code, direction, qty, price)
                 return True, 0, 0, 0, success_msg
             else:
                 error_msg = f"平倉訂單提交失敗：{data}"
@@ -79,4 +66,85 @@ class CloseOrder:
         except Exception as e:
             error_msg = f"平倉訂單提交異常：{e}"
             logging.error(error_msg)
-            return False, 0, 0, 0, error_msg
\ No newline at end of file
+            return False, 0, 0, 0, error_msg
+
+    def execute_aggregate(self, legs, direction, price=None, priority=PRIORITY_TAKE_PROFIT):
+        """把同合約同方向的多筆平倉 [(訂單 ID, 數量)] 合併為一張訂單提交，成交後按成分分配"""
+        try:
+            direction = direction.lower()
+            constituents = []
+            code = None
+            for order_id, qty in legs:
+                virtual_order = ORDER_STORE.get_virtual(order_id, direction)
+                if not virtual_order:
+                    error_msg = f"未找到訂單ID為 {order_id} 方向為 {direction} 的開倉訂單"
+                    logging.error(error_msg)
+                    return False, 0, 0, 0, error_msg
+                if virtual_order.quantity < qty:
+                    error_msg = f"訂單 {order_id} 數量不足：可用 {virtual_order.quantity}, 要求 {qty}"
+                    logging.error(error_msg)
+                    return False, 0, 0, 0, error_msg
+                if code is not None and virtual_order.code != code:
+                    error_msg = f"合併平倉的訂單合約不一致：{code} 與 {virtual_order.code}"
+                    logging.error(error_msg)
+                    return False, 0, 0, 0, error_msg
+                code = virtual_order.code
+                constituents.append((order_id, qty, virtual_order.entry_price))
+
+            if price is None:
+                price = self.get_market_price(code)
+                if price is None:
+                    error_msg = "無法獲取市場價格"
+                    logging.error(error_msg)
+                    return False, 0, 0, 0, error_msg
+
+            total_qty = sum(qty for _, qty, _ in constituents)
+            custom_order_id = '+'.join(order_id for order_id, _, _ in constituents)
+            ret, data = self._place(code, direction, total_qty, price, priority)
+            if ret == RET_OK:
+                ORDER_STORE.add_pending(PendingOrder(
+                    futu_order_id=data,
+                    id=custom_order_id,
+                    code=code,
+                    direction=direction,
+                    qty=total_qty,
+                    price=price,
+                    entry_price=sum(qty * entry_price for _, qty, entry_price in constituents) / total_qty,
+                    order_type='close',
+                    constituents=constituents
+                ))
+                success_msg = f"合併平倉訂單提交成功：訂單ID={custom_order_id}"
+                logging.info("⭕ 合併平倉訂單提交：訂單ID=%s, 合約=%s, 方向=%s, 數量=%s, 平倉價格=%s", custom_order_id, code, direction, total_qty, price)
+                return True, 0, 0, 0, success_msg
+            else:
+                error_msg = f"合併平倉訂單提交失敗：{data}"
+                logging.error(error_msg)
+                return False, 0, 0, 0, error_msg
+        except Exception as e:
+            error_msg = f"合併平倉訂單提交異常：{e}"
+            logging.error(error_msg)
+            return False, 0, 0, 0, error_msg
+
+    def _place(self, code, direction, qty, price, priority):
+        """經交易網關提交平倉方向的限價單，成功返回 (RET_OK, 富途訂單 ID)，否則返回 (ret, 錯誤)"""
+        trd_side = TrdSide.SELL if direction.lower() == 'long' else TrdSide.BUY
+        submitted = LATENCY.now()
+        try:
+            ret, data = self.gateway.place_order(
+                priority=priority,
+                price=price,
+                qty=qty,
+                code=code,
+                trd_side=trd_side,
+                trd_env=self.trd_env,
+                order_type=OrderType.NORMAL
+            )
+        except Exception:
+            LATENCY.discard()
+            raise
+        if ret != RET_OK:
+            LATENCY.discard()
+            return ret, data
+        futu_order_id = data['order_id'][0]
+        LATENCY.acked(futu_order_id, submitted)
+        return RET_OK, futu_order_id
\ No newline at end of file
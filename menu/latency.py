@@ -0,0 +1,211 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from .utils import load_config
+
+STAGES = (
+    ('quote_to_trigger', '報價→觸發判斷'),
+    ('trigger_to_submit', '觸發→提交'),
+    ('submit_to_ack', '提交→受理'),
+    ('ack_to_fill', '受理→成交確認'),
+    ('fill_to_state', '成交→狀態更新'),
+    ('quote_to_submit', '報價→提交（合計）'),
+    ('quote_to_state', '報價→狀態更新（合計）')
+)
+_SUB_BUCKETS = 8  # 每個 2 的冪區間細分的桶數，百分位相對誤差約 9%
+
+class LatencyHistogram:
+    """對數分桶的延遲直方圖（納秒），記錄 O(1)，最大值與平均值精確"""
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns):
+        ns = max(int(ns), 1)
+        index = int(math.log2(ns) * _SUB_BUCKETS)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, q):
+        """返回第 q 百分位所在桶的上界（納秒）"""
+        if not self.count:
+            return 0
+        target = max(1, math.ceil(self.count * q / 100))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= target:
+                return min(int(2 ** ((index + 1) / _SUB_BUCKETS)), self.max)
+        return self.max
+
+    def summary(self):
+        """返回毫秒為單位的統計"""
+        return {
+            'count': self.count,
+            'p50_ms': round(self.percentile(50) / 1e6, 3),
+            'p99_ms': round(self.percentile(99) / 1e6, 3),
+            'max_ms': round(self.max / 1e6, 3),
+            'mean_ms': round(self.total / self.count / 1e6, 3) if self.count else 0.0
+        }
+
+class LatencyRecorder:
+    """熱路徑延遲追蹤：報價接收 → 觸發判斷 → 提交 → 受理 → 成交確認 → 狀態更新
+
+    報價時間按合約記錄；觸發判斷時把該合約的報價時間放入線程本地的追蹤，同一線程隨後的
+    place_order 取用並以富途訂單 ID 保存，直到成交推送或對賬確認成交。所有時間均取自
+    time.perf_counter_ns()。手動下單沒有報價與觸發階段，只記錄提交之後的各段。
+    """
+
+    def __init__(self, enabled=True, max_pending=10000):
+        self.enabled = enabled
+        self.max_pending = max_pending
+        self.histograms = {name: LatencyHistogram() for name, _ in STAGES}
+        self._lock = threading.Lock()
+        self._quotes = {}  # {code: 報價接收時間}
+        self._orders = {}  # {futu_order_id: 追蹤}
+        self._local = threading.local()
+        self._dumper = None
+        self._dump_stop = threading.Event()
+
+    now = staticmethod(time.perf_counter_ns)
+
+    def _record(self, stage, ns):
+        with self._lock:
+            self.histograms[stage].record(ns)
+
+    def quote(self, code):
+        """報價寫入快取時調用"""
+        if self.enabled:
+            self._quotes[code] = time.perf_counter_ns()
+
+    def trigger(self, code):
+        """止盈止損或開倉條件成立、即將提交訂單時調用"""
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        quoted = self._quotes.get(code)
+        self._local.trace = {'quote': quoted, 'trigger': now}
+        if quoted is not None:
+            self._record('quote_to_trigger', now - quoted)
+
+    def acked(self, futu_order_id, submitted):
+        """place_order 成功返回後調用，submitted 為調用前的 now()"""
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        trace = getattr(self._local, 'trace', None) or {}
+        self._local.trace = None
+        trace['submit'] = submitted
+        trace['ack'] = now
+        self._record('submit_to_ack', now - submitted)
+        if trace.get('trigger') is not None:
+            self._record('trigger_to_submit', submitted - trace['trigger'])
+        if trace.get('quote') is not None:
+            self._record('quote_to_submit', submitted - trace['quote'])
+        with self._lock:
+            if len(self._orders) >= self.max_pending:
+                self._orders.pop(next(iter(self._orders)))
+            self._orders[futu_order_id] = trace
+
+    def discard(self):
+        """提交失敗時丟棄線程本地的追蹤"""
+        self._local.trace = None
+
+    def fill_detected(self, futu_order_id):
+        """確認訂單全部成交時調用"""
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        with self._lock:
+            trace = self._orders.get(futu_order_id)
+            if trace is None:
+                return
+            trace['fill'] = now
+            self.histograms['ack_to_fill'].record(now - trace['ack'])
+
+    def state_updated(self, futu_order_id):
+        """成交後持倉與觸發簿更新完成時調用"""
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        with self._lock:
+            trace = self._orders.pop(futu_order_id, None)
+            if trace is None or 'fill' not in trace:
+                return
+            self.histograms['fill_to_state'].record(now - trace['fill'])
+            if trace.get('quote') is not None:
+                self.histograms['quote_to_state'].record(now - trace['quote'])
+
+    def forget(self, futu_order_id):
+        """訂單取消或失敗時丟棄追蹤"""
+        with self._lock:
+            self._orders.pop(futu_order_id, None)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: self.histograms[name].summary() for name, _ in STAGES}
+
+    def report(self):
+        """返回 /latency 命令輸出的文字表格"""
+        lines = ["=== 延遲統計（毫秒）===", f"{'階段':<16}{'次數':>8}{'p50':>10}{'p99':>10}{'max':>10}"]
+        for (name, label), stats in zip(STAGES, self.snapshot().values()):
+            lines.append(f"{label:<16}{stats['count']:>8}{stats['p50_ms']:>10}{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+        return "\n".join(lines)
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {name: LatencyHistogram() for name, _ in STAGES}
+            self._orders.clear()
+
+    def dump(self, path):
+        """以 JSON 寫入統計，先寫暫存檔再替換"""
+        data = {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'stages': self.snapshot()}
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+
+    def start_dumper(self, path, interval):
+        """每 interval 秒把統計寫入 path"""
+        if interval <= 0 or self._dumper is not None:
+            return
+        self._dump_stop.clear()
+
+        def run():
+            while not self._dump_stop.wait(interval):
+                try:
+                    self.dump(path)
+                except Exception as e:
+                    logging.error(f"寫入延遲統計失敗：{e}")
+
+        self._dumper = threading.Thread(target=run, daemon=True)
+        self._dumper.start()
+
+    def stop_dumper(self, path=None):
+        """停止定期輸出；提供 path 時寫入最後一次統計"""
+        self._dump_stop.set()
+        if self._dumper is not None:
+            self._dumper.join(timeout=5)
+            self._dumper = None
+        if path:
+            try:
+                self.dump(path)
+            except Exception as e:
+                logging.error(f"寫入延遲統計失敗：{e}")
+
+def default_dump_path():
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    while base_dir.endswith('menu'):
+        base_dir = os.path.dirname(base_dir)
+    return os.path.join(base_dir, 'latency.json')
+
+LATENCY = LatencyRecorder(enabled=bool(load_config().get('latency_enabled', True)))  # 全局延遲統計
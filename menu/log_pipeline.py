@@ -0,0 +1,126 @@
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+POINT_LOGGER_PREFIX = 'point_log.'  # append_to_point_log 使用的 logger 名稱前綴
+
+class BatchingFileHandler(logging.FileHandler):
+    """批量 flush 的檔案日誌：累積 batch_size 筆、超過 flush_interval 秒或遇到 WARNING 以上才落盤"""
+
+    def __init__(self, filename, batch_size=64, flush_interval=1.0, encoding='utf-8'):
+        super().__init__(filename, encoding=encoding)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+            self._pending += 1
+            if (self._pending >= self.batch_size or record.levelno >= logging.WARNING
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        super().flush()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+class PointLogRouter(logging.Handler):
+    """把 point_log.<point_id> 的記錄寫入 points/<point_id>/trade.log，每個點位的檔案保持開啟"""
+
+    def __init__(self, points_dir, batch_size=64, flush_interval=1.0):
+        super().__init__()
+        self.points_dir = points_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._handlers = {}
+        self.addFilter(_NameFilter(POINT_LOGGER_PREFIX, include=True))
+
+    def emit(self, record):
+        point_id = record.name[len(POINT_LOGGER_PREFIX):]
+        handler = self._handlers.get(point_id)
+        if handler is None:
+            point_dir = os.path.join(self.points_dir, point_id)
+            os.makedirs(point_dir, exist_ok=True)
+            handler = BatchingFileHandler(os.path.join(point_dir, 'trade.log'), self.batch_size, self.flush_interval)
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
+            self._handlers[point_id] = handler
+        handler.handle(record)
+
+    def flush(self):
+        for handler in list(self._handlers.values()):
+            handler.flush()
+
+    def close(self):
+        for handler in list(self._handlers.values()):
+            handler.close()
+        self._handlers.clear()
+        super().close()
+
+class _NameFilter(logging.Filter):
+    """按 logger 名稱前綴保留或排除記錄"""
+
+    def __init__(self, prefix, include):
+        super().__init__()
+        self.prefix = prefix
+        self.include = include
+
+    def filter(self, record):
+        return record.name.startswith(self.prefix) == self.include
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """只把記錄放入隊列，訊息格式化延後到寫入線程；日誌參數須為不可變值"""
+
+    def prepare(self, record):
+        return record
+
+class LogPipeline:
+    """隊列式日誌管線：交易線程只入隊，由背景線程格式化並寫入檔案、控制台與點位日誌"""
+
+    def __init__(self, handlers, flush_interval=1.0):
+        self.queue = queue.SimpleQueue()
+        self.handlers = handlers
+        self.flush_interval = flush_interval
+        self.queue_handler = _DeferredQueueHandler(self.queue)
+        self.listener = logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self._running = False
+        self._flusher = None
+
+    def start(self):
+        self.listener.start()
+        self._running = True
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        """閒置時也定期落盤，避免最後一批日誌長時間停留在緩衝區"""
+        while self._running:
+            time.sleep(self.flush_interval)
+            for handler in self.handlers:
+                handler.acquire()
+                try:
+                    handler.flush()
+                except Exception:
+                    pass
+                finally:
+                    handler.release()
+
+    def stop(self):
+        """寫完隊列中剩餘的記錄並關閉所有輸出"""
+        self._running = False
+        self.listener.stop()
+        for handler in self.handlers:
+            handler.flush()
+            handler.close()
+
+def exclude_point_logs(handler):
+    """讓一般輸出忽略點位專屬日誌"""
+    handler.addFilter(_NameFilter(POINT_LOGGER_PREFIX, include=False))
+    return handler
@@ -0,0 +1,352 @@
+from futu import *
+from futu.common.constant import RET_OK, RET_ERROR
+from futu.common.utils import split_stock_str
+from futu.common.pb import Qot_Common_pb2, Qot_UpdateBasicQot_pb2, Qot_UpdateTicker_pb2
+from futu.common.pb import Trd_Common_pb2, Trd_UpdateOrder_pb2, Trd_UpdateOrderFill_pb2
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+import pandas as pd
+from datetime import datetime
+from .simulation import SimExchange, SimQuoteContext, SimTradeContext
+
+def random_walk(start, step=1.0, seed=None):
+    """無限隨機遊走價格路徑，每步 -step / 0 / +step"""
+    rng = random.Random(seed)
+    price = float(start)
+    while True:
+        yield price
+        price += rng.choice((-step, 0.0, step))
+
+def _split_code(code):
+    ret, content = split_stock_str(code)
+    if ret != RET_OK:
+        return Qot_Common_pb2.QotMarket_HK_Security, code
+    return content
+
+def _now_text():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+class MockOpenD:
+    """本地模擬 OpenD，供整合測試與壓力測試使用
+
+    報價按腳本化的價格路徑每 tick_interval 秒推進一步，撮合沿用 SimExchange 的限價規則。
+    所有推送（報價、逐筆、訂單狀態、成交）在單一推送線程中組裝成與 OpenD 相同的 protobuf，
+    經由富途 SDK 的 Handler 基類解析，因此 QuoteFeed 與 OrderTracker 走的是真實的推送路徑。
+    fill_latency 為撮合到推送的延遲，ack_latency 為 place_order 調用本身的耗時，
+    reject_rate 為訂單受理後被交易所拒絕（推送 FAILED）的機率。
+    """
+
+    def __init__(self, tick_interval=0.5, fill_latency=0.05, ack_latency=0.0, reject_rate=0.0, seed=None):
+        self.tick_interval = tick_interval
+        self.fill_latency = fill_latency
+        self.ack_latency = ack_latency
+        self.reject_rate = reject_rate
+        self.exchange = SimExchange(time)
+        self.exchange.on_status = self._on_status
+        self._snapshots = SimQuoteContext(self.exchange)
+        self._queries = SimTradeContext(self.exchange)
+        self._rng = random.Random(seed)
+        self._lock = threading.RLock()  # 保護撮合狀態
+        self._cond = threading.Condition()  # 保護推送排程
+        self._events = []  # [(到期時間, 序號, fn, args)]
+        self._seq = itertools.count()
+        self._paths = {}  # {code: 價格迭代器}
+        self._order_env = {}  # {order_id: trd_env}
+        self._quote_ctxs = []
+        self._trade_ctxs = []
+        self._running = False
+        self._thread = None
+        self.stats = {'ticks': 0, 'orders': 0, 'fills': 0, 'rejects': 0, 'cancels': 0, 'pushes': 0}
+
+    # ---- 連線 ----
+    def quote_context(self):
+        ctx = MockQuoteContext(self)
+        self._quote_ctxs.append(ctx)
+        return ctx
+
+    def trade_context(self):
+        ctx = MockTradeContext(self)
+        self._trade_ctxs.append(ctx)
+        return ctx
+
+    # ---- 價格腳本 ----
+    def set_path(self, code, prices):
+        """設定合約的價格路徑（任意可迭代物件），路徑結束後價格保持不變"""
+        path = iter(prices)
+        with self._lock:
+            self._paths[code] = path
+            if code not in self.exchange.last_prices:
+                first = next(path, None)
+                if first is not None:
+                    self.exchange.match(code, float(first))
+
+    def replay(self, store, codes=None, start=None, end=None, speed=1.0):
+        """以錄製檔（TickStore）作為價格路徑，按錄製時間以 speed 倍速回放；各合約自同一時間起取樣"""
+        codes = codes or store.codes()
+        if start is None:
+            start = min(store.span(code)[0] for code in codes)
+        for code in codes:
+            self.set_path(code, store.path(code, start, end, step=self.tick_interval * speed))
+        return codes
+
+    def set_price(self, code, price):
+        """立即設定價格並推送"""
+        self._schedule(0, self._apply_price, code, float(price))
+
+    # ---- 推送線程 ----
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._schedule(self.tick_interval, self._tick)
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _schedule(self, delay, fn, *args):
+        with self._cond:
+            heapq.heappush(self._events, (time.monotonic() + delay, next(self._seq), fn, args))
+            self._cond.notify()
+
+    def _run(self):
+        while self._running:
+            with self._cond:
+                while self._running and (not self._events or self._events[0][0] > time.monotonic()):
+                    timeout = self._events[0][0] - time.monotonic() if self._events else None
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+                _, _, fn, args = heapq.heappop(self._events)
+            try:
+                fn(*args)
+            except Exception as e:
+                logging.error(f"模擬 OpenD 推送異常：{e}")
+
+    def _tick(self):
+        """所有腳本化合約推進一步"""
+        with self._lock:
+            paths = list(self._paths.items())
+        for code, path in paths:
+            price = next(path, None)
+            if price is not None:
+                self._apply_price(code, float(price))
+        self.stats['ticks'] += 1
+        if self._running:
+            self._schedule(self.tick_interval, self._tick)
+
+    def _apply_price(self, code, price):
+        with self._lock:
+            self.exchange.match(code, price)
+        for ctx in list(self._quote_ctxs):
+            ctx._push_price(code, price)
+
+    def _on_status(self, order_id, status):
+        """撮合狀態變更（在 _lock 內調用），延遲 fill_latency 後推送"""
+        order = dict(self.exchange.orders[order_id])
+        if status == OrderStatus.FILLED_ALL:
+            self.stats['fills'] += 1
+        elif status == OrderStatus.CANCELLED_ALL:
+            self.stats['cancels'] += 1
+        elif status == OrderStatus.FAILED:
+            self.stats['rejects'] += 1
+        delay = 0 if status == OrderStatus.CANCELLED_ALL else self.fill_latency
+        self._schedule(delay, self._push_order, order, self._order_env.get(order_id, TrdEnv.SIMULATE))
+
+    def _push_order(self, order, trd_env):
+        for ctx in list(self._trade_ctxs):
+            ctx._push_order(order, trd_env)
+
+    def _reject(self, order_id):
+        with self._lock:
+            self.exchange.reject(order_id)
+
+    # ---- 交易 ----
+    def place_order(self, price, qty, code, trd_side, trd_env):
+        if self.ack_latency:
+            time.sleep(self.ack_latency)
+        with self._lock:
+            order_id = self.exchange.place(code, trd_side, qty, price)
+            self._order_env[order_id] = trd_env
+            self.stats['orders'] += 1
+            rejected = self._rng.random() < self.reject_rate
+        # 拒單與可立即成交的撮合都在推送線程中進行，保證調用方先登記待成交訂單；推送再延遲 fill_latency
+        self._schedule(0, self._reject if rejected else self._match_now, order_id if rejected else code)
+        return order_id
+
+    def _match_now(self, code):
+        with self._lock:
+            price = self.exchange.last_prices.get(code)
+            if price is not None:
+                self.exchange.match(code, price)
+
+    def cancel_order(self, order_id):
+        with self._lock:
+            return self.exchange.cancel(order_id)
+
+    def snapshot(self, codes):
+        with self._lock:
+            return self._snapshots.get_market_snapshot(codes)
+
+    def order_list(self, order_id, trd_env):
+        with self._lock:
+            if order_id and order_id not in self.exchange.orders:
+                return RET_ERROR, f"訂單 {order_id} 不存在"
+            return self._queries.order_list_query(order_id=order_id, trd_env=trd_env)
+
+    def position_list(self, trd_env):
+        with self._lock:
+            return self._queries.position_list_query(trd_env=trd_env)
+
+class MockQuoteContext:
+    """模擬 OpenQuoteContext：快照、訂閱與報價 / 逐筆推送"""
+
+    def __init__(self, opend):
+        self.opend = opend
+        self._handlers = []
+        self._subscribed = {}  # {code: {SubType}}
+
+    def set_handler(self, handler):
+        self._handlers.append(handler)
+        return RET_OK
+
+    def subscribe(self, code_list, subtype_list, **kwargs):
+        for code in code_list:
+            self._subscribed.setdefault(code, set()).update(subtype_list)
+        return RET_OK, None
+
+    def get_market_snapshot(self, code_list):
+        return self.opend.snapshot(code_list)
+
+    def close(self):
+        if self in self.opend._quote_ctxs:
+            self.opend._quote_ctxs.remove(self)
+
+    def _push_price(self, code, price):
+        subtypes = self._subscribed.get(code)
+        if not subtypes:
+            return
+        market, symbol = _split_code(code)
+        now = _now_text()
+        for handler in self._handlers:
+            if isinstance(handler, StockQuoteHandlerBase) and SubType.QUOTE in subtypes:
+                rsp = Qot_UpdateBasicQot_pb2.Response()
+                rsp.retType = RET_OK
+                qot = rsp.s2c.basicQotList.add()
+                qot.security.market = market
+                qot.security.code = symbol
+                qot.isSuspended = False
+                qot.listTime = ''
+                qot.priceSpread = 1.0
+                qot.updateTime = now
+                qot.curPrice = qot.highPrice = qot.openPrice = qot.lowPrice = qot.lastClosePrice = price
+                qot.volume = 1
+                qot.turnover = price
+                qot.turnoverRate = qot.amplitude = 0.0
+            elif isinstance(handler, TickerHandlerBase) and SubType.TICKER in subtypes:
+                rsp = Qot_UpdateTicker_pb2.Response()
+                rsp.retType = RET_OK
+                rsp.s2c.security.market = market
+                rsp.s2c.security.code = symbol
+                ticker = rsp.s2c.tickerList.add()
+                ticker.time = now
+                ticker.sequence = self.opend.stats['ticks']
+                ticker.dir = 1
+                ticker.price = price
+                ticker.volume = 1
+                ticker.turnover = price
+            else:
+                continue
+            self.opend.stats['pushes'] += 1
+            handler.on_recv_rsp(rsp)
+
+class MockTradeContext:
+    """模擬 OpenFutureTradeContext：下單、撤單、查詢與訂單 / 成交推送"""
+
+    def __init__(self, opend):
+        self.opend = opend
+        self._handlers = []
+
+    def set_handler(self, handler):
+        self._handlers.append(handler)
+        return RET_OK
+
+    def place_order(self, price, qty, code, trd_side, trd_env=TrdEnv.SIMULATE, order_type=OrderType.NORMAL, **kwargs):
+        order_id = self.opend.place_order(price, qty, code, trd_side, trd_env)
+        return RET_OK, pd.DataFrame({'order_id': [order_id], 'code': [code], 'qty': [qty], 'price': [price]})
+
+    def modify_order(self, modify_order_op, order_id, qty, price, trd_env=TrdEnv.SIMULATE, **kwargs):
+        if modify_order_op == ModifyOrderOp.CANCEL and self.opend.cancel_order(order_id):
+            return RET_OK, pd.DataFrame({'order_id': [order_id]})
+        return RET_ERROR, f"無法修改訂單 {order_id}"
+
+    def order_list_query(self, order_id='', trd_env=TrdEnv.SIMULATE, **kwargs):
+        return self.opend.order_list(order_id, trd_env)
+
+    def position_list_query(self, trd_env=TrdEnv.SIMULATE, **kwargs):
+        return self.opend.position_list(trd_env)
+
+    def close(self):
+        if self in self.opend._trade_ctxs:
+            self.opend._trade_ctxs.remove(self)
+
+    @staticmethod
+    def _fill_header(header, trd_env_number):
+        header.trdEnv = trd_env_number
+        header.accID = 0
+        header.trdMarket = Trd_Common_pb2.TrdMarket_HK
+
+    def _push_order(self, order, trd_env):
+        _, symbol = _split_code(order['code'])
+        trd_env_number = TrdEnv.to_number(trd_env)[1]
+        trd_side = TrdSide.to_number(order['trd_side'])[1]
+        now = _now_text()
+        for handler in self._handlers:
+            if isinstance(handler, TradeOrderHandlerBase):
+                rsp = Trd_UpdateOrder_pb2.Response()
+                rsp.retType = RET_OK
+                self._fill_header(rsp.s2c.header, trd_env_number)
+                pb = rsp.s2c.order
+                pb.trdSide = trd_side
+                pb.orderType = Trd_Common_pb2.OrderType_Normal
+                pb.orderStatus = OrderStatus.to_number(order['order_status'])[1]
+                pb.orderID = int(order['order_id'])
+                pb.orderIDEx = order['order_id']
+                pb.code = symbol
+                pb.name = ''
+                pb.qty = order['qty']
+                pb.price = order['price']
+                pb.createTime = pb.updateTime = now
+                pb.secMarket = Trd_Common_pb2.TrdSecMarket_HK
+                pb.fillQty = order['dealt_qty']
+                pb.fillAvgPrice = order['dealt_avg_price']
+            elif isinstance(handler, TradeDealHandlerBase) and order['order_status'] == OrderStatus.FILLED_ALL:
+                rsp = Trd_UpdateOrderFill_pb2.Response()
+                rsp.retType = RET_OK
+                self._fill_header(rsp.s2c.header, trd_env_number)
+                pb = rsp.s2c.orderFill
+                pb.trdSide = trd_side
+                pb.fillID = int(order['order_id'])
+                pb.fillIDEx = order['order_id']
+                pb.orderID = int(order['order_id'])
+                pb.orderIDEx = order['order_id']
+                pb.code = symbol
+                pb.name = ''
+                pb.qty = order['qty']
+                pb.price = order['price']
+                pb.createTime = now
+                pb.secMarket = Trd_Common_pb2.TrdSecMarket_HK
+            else:
+                continue
+            self.opend.stats['pushes'] += 1
+            handler.on_recv_rsp(rsp)
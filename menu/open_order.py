@@ -1,31 +1,26 @@
 from futu import *
 from futu.common.constant import RET_OK
 import logging
-from .utils import load_config, PENDING_ORDERS
+from .utils import load_config
+from .order_store import ORDER_STORE, PendingOrder
+from .quote_feed import get_quote_feed
+from .latency import LATENCY
+from .order_gateway import get_order_gateway, PRIORITY_ENTRY
 
 class OpenOrder:
     def __init__(self, quote_ctx, trd_ctx, trd_env, order_counter):
         config = load_config()
         self.FIXED_THRESHOLD = config['fixed_threshold']
         self.quote_ctx = quote_ctx
+        self.quote_feed = get_quote_feed(quote_ctx)
         self.trd_ctx = trd_ctx
+        self.gateway = get_order_gateway(trd_ctx)
         self.trd_env = trd_env
         self.order_counter = order_counter
 
     def get_market_price(self, code):
-        """獲取合約最新市場價格"""
-        try:
-            ret, data = self.quote_ctx.get_market_snapshot([code])
-            if ret == RET_OK and not data.empty:
-                price = data['last_price'][0]
-                logging.debug(f"獲取 {code} 市場價格：{price}")
-                return price
-            else:
-                logging.error(f"無法獲取 {code} 價格：{data}")
-                return None
-        except Exception as e:
-            logging.error(f"獲取 {code} 價格異常：{e}")
-            return None
+        """獲取合約最新市場價格（讀取共享報價源快取）"""
+        return self.quote_feed.get_price(code)
 
     def validate_stop_loss_take_profit(self, direction, entry_price, stop_loss, take_profit):
         """驗證止盈止損價格是否符合條件"""
@@ -70,7 +65,9 @@ class OpenOrder:
             custom_order_id = f"HSI-{self.order_counter:03d}"
             trd_side = TrdSide.BUY if direction.lower() == 'long' else TrdSide.SELL
 
-            ret, data = self.trd_ctx.place_order(
+            submitted = LATENCY.now()
+            ret, data = self.gateway.place_order(
+                priority=PRIORITY_ENTRY,
                 price=price,
                 qty=qty,
                 code=code,
@@ -80,28 +77,33 @@ class OpenOrder:
             )
             if ret == RET_OK:
                 futu_order_id = data['order_id'][0]
-                PENDING_ORDERS[futu_order_id] = {
-                    'id': custom_order_id,
-                    'code': code,
-                    'direction': direction.lower(),
-                    'qty': qty,
-                    'price': price,
-                    'order_type': 'open',
-                    'stop_loss': stop_loss,
-                    'take_profit': take_profit,
-                    'use_trailing': use_trailing,
-                    'point_id': point_id,
-                    'hit_price': hit_price
-                }
+                LATENCY.acked(futu_order_id, submitted)
+                ORDER_STORE.add_pending(PendingOrder(
+                    futu_order_id=futu_order_id,
+                    id=custom_order_id,
+                    code=code,
+                    direction=direction.lower(),
+                    qty=qty,
+                    price=price,
+                    order_type='open',
+                    stop_loss=stop_loss,
+                    take_profit=take_profit,
+                    use_trailing=use_trailing,
+                    point_id=point_id,
+                    hit_price=hit_price
+                ))
                 self.order_counter += 1
                 success_msg = f"開倉訂單提交成功：訂單ID={custom_order_id}"
-                logging.info(f"⭕ 開倉訂單提交：訂單ID={custom_order_id}, 合約={code}, 方向={direction}, 數量={qty}, 開倉價格={price}, 命中點位 ({[point_id]})={hit_price}")
+                logging.info("⭕ 開倉訂單提交：訂單ID=%s, 合約=%s, 方向=%s, 數量=%s, 開倉價格=%s, 命中點位 (%s)=%s",
+                             custom_order_id, code, direction, qty, price, [point_id], hit_price)
                 return True, success_msg
             else:
+                LATENCY.discard()
                 error_msg = f"開倉訂單提交失敗：{data}"
                 logging.error(error_msg)
                 return False, error_msg
         except Exception as e:
+            LATENCY.discard()
             error_msg = f"開倉訂單提交異常：{e}"
             logging.error(error_msg)
             return False, error_msg
\ No newline at end of file
@@ -0,0 +1,227 @@
+from futu import *
+from futu.common.constant import RET_OK, RET_ERROR
+import collections
+import itertools
+import logging
+import threading
+import time
+from .utils import load_config
+
+# 數字越小越優先：保護性平倉永遠先於撤單與新開倉
+PRIORITY_STOP_LOSS = 0
+PRIORITY_TAKE_PROFIT = 1
+PRIORITY_CANCEL = 2
+PRIORITY_ENTRY = 3
+
+# 可重試的錯誤，保證金不足等業務錯誤直接返回。下單超時可能已送達交易所，重試會重複下單，
+# 故下單只重試頻率限制與未連線；撤單重複提交無害，另可重試超時與網絡錯誤
+_RETRYABLE = {
+    'place': ('頻率', '频率', 'frequen', 'disconnect', '斷開', '断开', '未連接', '未连接'),
+    'modify': ('頻率', '频率', 'frequen', 'disconnect', '斷開', '断开', '未連接', '未连接', 'timeout', '超時', '超时',
+               'network', '網絡', '网络')
+}
+
+class RateLimiter:
+    """滑動窗口限流：任意 window 秒內最多 limit 次，且相鄰兩次間隔不少於 min_interval 秒
+
+    富途按滾動窗口計算下單與改單頻率，按速率補充的令牌桶在突發後仍可能超限，故記錄最近的請求時間。
+    """
+
+    def __init__(self, limit, window, min_interval=0.0, clock=time.monotonic):
+        self.limit = limit
+        self.window = window
+        self.min_interval = min_interval
+        self.clock = clock
+        self.sent = collections.deque()
+
+    def wait_time(self):
+        """返回距離下一次可發送還需等待的秒數"""
+        now = self.clock()
+        while self.sent and now - self.sent[0] >= self.window:
+            self.sent.popleft()
+        wait = 0.0
+        if len(self.sent) >= self.limit:
+            wait = self.sent[0] + self.window - now
+        if self.sent:
+            wait = max(wait, self.sent[-1] + self.min_interval - now)
+        return max(wait, 0.0)
+
+    def consume(self):
+        self.sent.append(self.clock())
+
+class _Request:
+    __slots__ = ('op', 'kwargs', 'priority', 'seq', 'not_before', 'attempt', 'state', 'result', 'done', 'enqueued')
+
+    def __init__(self, op, kwargs, priority, seq):
+        self.op = op
+        self.kwargs = kwargs
+        self.priority = priority
+        self.seq = seq
+        self.not_before = 0.0  # 重試退避期間不發送
+        self.attempt = 0
+        self.state = 'queued'  # queued / sending / done / abandoned
+        self.result = None
+        self.done = threading.Event()
+        self.enqueued = time.monotonic()
+
+class OrderGateway:
+    """交易請求網關：所有 place_order / modify_order 經單一線程按優先級、限流發送，並對暫時性錯誤退避重試
+
+    開倉請求受 entry_limiter 的較低上限約束，窗口內始終留有額度給止損止盈。
+
+    調用方接口與 trd_ctx 相同，額外以 priority 指定優先級，阻塞至請求完成並返回 (ret, data)。
+    停用時直接調用 trd_ctx（回測與基準測試的虛擬時鐘下使用）。
+    """
+
+    def __init__(self, trd_ctx, enabled=None):
+        config = load_config()
+        self.trd_ctx = trd_ctx
+        self.enabled = bool(config.get('gateway_enabled', True)) if enabled is None else enabled
+        window = float(config.get('gateway_window', 30))
+        min_interval = float(config.get('gateway_min_interval', 0.02))
+        place_limit = int(config.get('gateway_place_limit', 15))
+        reserve = min(int(config.get('gateway_entry_reserve', 5)), place_limit - 1)
+        self.limiters = {
+            'place': RateLimiter(place_limit, window, min_interval),
+            'modify': RateLimiter(int(config.get('gateway_modify_limit', 20)), window, min_interval)
+        }
+        # 開倉另有較低的上限，窗口內保留 reserve 次下單額度給止損止盈，開倉爆發不會擠佔保護性平倉
+        self.entry_limiter = RateLimiter(place_limit - reserve, window)
+        self.max_retries = int(config.get('gateway_max_retries', 3))
+        self.retry_backoff = float(config.get('gateway_retry_backoff', 0.5))
+        self.timeout = float(config.get('gateway_timeout', 60))
+        self.stats = {'sent': 0, 'retried': 0, 'failed': 0, 'abandoned': 0, 'max_wait': 0.0}
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def place_order(self, priority=PRIORITY_ENTRY, **kwargs):
+        return self._call('place', priority, kwargs)
+
+    def modify_order(self, priority=PRIORITY_CANCEL, **kwargs):
+        return self._call('modify', priority, kwargs)
+
+    def _invoke(self, op, kwargs):
+        if op == 'place':
+            return self.trd_ctx.place_order(**kwargs)
+        return self.trd_ctx.modify_order(**kwargs)
+
+    def _call(self, op, priority, kwargs):
+        if not self.enabled:
+            return self._invoke(op, kwargs)
+        request = _Request(op, kwargs, priority, next(self._seq))
+        with self._cond:
+            if not self._running:
+                self._start()
+            self._queue.append(request)
+            self._cond.notify()
+        if not request.done.wait(self.timeout):
+            with self._cond:
+                # 尚未發送則放棄，已在發送中則必須等待結果，避免交易所有單而本地沒有記錄
+                if request.state == 'queued':
+                    request.state = 'abandoned'
+                    self._queue.remove(request)
+                    self.stats['abandoned'] += 1
+                    return RET_ERROR, f"訂單網關排隊超過 {self.timeout} 秒，請求已放棄"
+            request.done.wait()
+        return request.result
+
+    def _start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止發送線程，仍在隊列中的請求返回錯誤"""
+        with self._cond:
+            self._running = False
+            pending, self._queue = self._queue, []
+            self._cond.notify_all()
+        for request in pending:
+            request.state = 'done'
+            request.result = (RET_ERROR, "訂單網關已停止")
+            request.done.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _limiters(self, request):
+        if request.op == 'place' and request.priority >= PRIORITY_ENTRY:
+            return (self.limiters['place'], self.entry_limiter)
+        return (self.limiters[request.op],)
+
+    def _next(self):
+        """在鎖內選出下一個可發送的請求；每種操作只考慮其最高優先級的請求，返回 (請求, 需等待秒數)"""
+        now = time.monotonic()
+        best = {}
+        wait = None
+        for request in self._queue:
+            if request.not_before > now:
+                delay = request.not_before - now
+                wait = delay if wait is None else min(wait, delay)
+                continue
+            current = best.get(request.op)
+            if current is None or (request.priority, request.seq) < (current.priority, current.seq):
+                best[request.op] = request
+        chosen = None
+        for request in sorted(best.values(), key=lambda r: (r.priority, r.seq)):
+            delay = max(limiter.wait_time() for limiter in self._limiters(request))
+            if delay <= 0:
+                chosen = request
+                break
+            wait = delay if wait is None else min(wait, delay)
+        return chosen, wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._running:
+                        return
+                    request, wait = self._next()
+                    if request is not None:
+                        break
+                    self._cond.wait(wait)
+                self._queue.remove(request)
+                request.state = 'sending'
+                for limiter in self._limiters(request):
+                    limiter.consume()
+                self.stats['max_wait'] = max(self.stats['max_wait'], time.monotonic() - request.enqueued)
+            self._send(request)
+
+    def _send(self, request):
+        request.attempt += 1
+        try:
+            ret, data = self._invoke(request.op, request.kwargs)
+        except Exception as e:
+            ret, data = RET_ERROR, f"{e}"
+        self.stats['sent'] += 1
+        if ret != RET_OK and request.attempt <= self.max_retries and any(key in str(data).lower() for key in _RETRYABLE[request.op]):
+            delay = self.retry_backoff * 2 ** (request.attempt - 1)
+            logging.warning(f"交易請求失敗，{delay:.2f} 秒後第 {request.attempt} 次重試：{data}")
+            self.stats['retried'] += 1
+            with self._cond:
+                request.state = 'queued'
+                request.not_before = time.monotonic() + delay
+                self._queue.append(request)
+                self._cond.notify()
+            return
+        if ret != RET_OK:
+            self.stats['failed'] += 1
+        request.result = (ret, data)
+        request.state = 'done'
+        request.done.set()
+
+_GATEWAYS = {}
+_GATEWAYS_LOCK = threading.Lock()
+
+def get_order_gateway(trd_ctx, enabled=None):
+    """返回與 trd_ctx 綁定的共享交易網關；首次建立時可指定是否啟用"""
+    with _GATEWAYS_LOCK:
+        gateway = _GATEWAYS.get(id(trd_ctx))
+        if gateway is None or gateway.trd_ctx is not trd_ctx:
+            gateway = OrderGateway(trd_ctx, enabled)
+            _GATEWAYS[id(trd_ctx)] = gateway
+        return gateway
@@ -0,0 +1,157 @@
+import json
+import logging
+import os
+import threading
+import time
+from .order_store import VirtualOrder
+
+class OrderJournal:
+    """虛擬持倉的預寫日誌
+
+    每個狀態變更（open / partial_close / close / cancel）以一行 JSON 追加到 order_journal.jsonl，
+    寫入後立即 flush，fsync 按筆數或時間批量進行；累積一定筆數後壓縮為 order_snapshot.json
+    並清空日誌。啟動時載入快照再重放其後的日誌記錄即可恢復崩潰前的持倉。
+    """
+
+    def __init__(self, base_dir=None, fsync_batch=32, fsync_interval=0.5, compact_every=1000):
+        if base_dir is None:
+            base_dir = os.path.dirname(os.path.abspath(__file__))
+            while base_dir.endswith('menu'):
+                base_dir = os.path.dirname(base_dir)
+        self.journal_path = os.path.join(base_dir, 'order_journal.jsonl')
+        self.snapshot_path = os.path.join(base_dir, 'order_snapshot.json')
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self.seq = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._since_snapshot = 0
+        self._flusher = None
+        self._running = False
+
+    def recover(self):
+        """載入快照並重放日誌，返回 VirtualOrder 列表；快照與日誌均不存在時返回 None"""
+        if not os.path.exists(self.snapshot_path) and not os.path.exists(self.journal_path):
+            return None
+        orders = {}
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+                snapshot_seq = snapshot.get('seq', 0)
+                for data in snapshot.get('orders', []):
+                    orders[data['id']] = data
+            except (OSError, ValueError, KeyError) as e:
+                logging.error(f"讀取 order_snapshot.json 失敗：{e}")
+        self.seq = snapshot_seq
+        replayed = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        logging.warning("order_journal.jsonl 末尾記錄不完整，停止重放")
+                        break
+                    if record.get('seq', 0) <= snapshot_seq:
+                        continue
+                    self._apply(orders, record)
+                    self.seq = record['seq']
+                    replayed += 1
+        result = []
+        for data in orders.values():
+            data = dict(data)
+            data['is_closing'] = False  # 重啟後不存在待成交的平倉單
+            result.append(VirtualOrder(**data))
+        logging.info(f"從快照（seq={snapshot_seq}）及 {replayed} 筆日誌恢復 {len(result)} 筆虛擬訂單")
+        return result
+
+    @staticmethod
+    def _apply(orders, record):
+        """將一筆日誌記錄套用到持倉字典"""
+        event = record['event']
+        order_id = record['id']
+        if event == 'open':
+            orders[order_id] = record['order']
+        elif event == 'partial_close':
+            if order_id in orders:
+                orders[order_id]['quantity'] = record['remaining']
+        elif event == 'close':
+            orders.pop(order_id, None)
+        elif event == 'cancel':
+            if order_id in orders:
+                orders[order_id]['is_open'] = True
+                orders[order_id]['highest_price'] = record.get('highest_price')
+                orders[order_id]['lowest_price'] = record.get('lowest_price')
+
+    def open(self):
+        """開啟日誌檔並啟動定時 fsync 線程"""
+        self._file = open(self.journal_path, 'a', encoding='utf-8')
+        self._running = True
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+    def append(self, event, order_id, **fields):
+        """追加一筆事件記錄，返回是否達到壓縮條件"""
+        with self._lock:
+            if self._file is None:
+                return False
+            self.seq += 1
+            record = {'seq': self.seq, 'ts': time.time(), 'event': event, 'id': order_id}
+            record.update(fields)
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+            self._unsynced += 1
+            self._since_snapshot += 1
+            if self._unsynced >= self.fsync_batch or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+            return self._since_snapshot >= self.compact_every
+
+    def _sync(self):
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _flush_loop(self):
+        """確保閒置時最後一批記錄也會在 fsync_interval 內落盤"""
+        while self._running:
+            time.sleep(self.fsync_interval)
+            try:
+                with self._lock:
+                    if self._file is not None:
+                        self._sync()
+            except Exception as e:
+                logging.error(f"order_journal.jsonl fsync 失敗：{e}")
+
+    def compact(self, orders):
+        """以當前持倉寫入快照並清空日誌"""
+        with self._lock:
+            snapshot = {'seq': self.seq, 'orders': [order.to_dict() for order in orders]}
+            temp_path = self.snapshot_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.snapshot_path)
+            if self._file is not None:
+                self._file.close()
+                self._file = open(self.journal_path, 'w', encoding='utf-8')
+            self._unsynced = 0
+            self._since_snapshot = 0
+        logging.info(f"訂單日誌已壓縮為快照：{len(snapshot['orders'])} 筆持倉，seq={snapshot['seq']}")
+
+    def close(self, orders=None):
+        """停止 fsync 線程；提供 orders 時先寫入最終快照"""
+        self._running = False
+        if orders is not None:
+            self.compact(orders)
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
@@ -0,0 +1,155 @@
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+_LOG_LINE = re.compile(r'^(?P<ts>\S+ \S+) ID: (?P<id>\S+) 提交訂單：合約=(?P<code>[^,]+), 方向=(?P<dir>[多空]), 數量=(?P<qty>\d+), 價格=(?P<price>[^\s]+)')
+
+class OrderLedger:
+    """開倉訂單台帳
+
+    以訂單 ID 為主鍵存放在 SQLite（open_orders.db），開倉為一次插入、部分或全部平倉為一次按主鍵
+    更新或刪除，成本與歷史長度無關。寫入由背景線程批量提交，調用方只入隊，不會阻塞監控線程。
+    退出時將當前持倉匯出為原格式的 open_orders.log 供人工查看。
+    """
+
+    def __init__(self, base_dir=None):
+        if base_dir is None:
+            base_dir = os.path.dirname(os.path.abspath(__file__))
+            while base_dir.endswith('menu'):
+                base_dir = os.path.dirname(base_dir)
+        self.db_path = os.path.join(base_dir, 'open_orders.db')
+        self.log_path = os.path.join(base_dir, 'open_orders.log')
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('''CREATE TABLE IF NOT EXISTS open_orders (
+                            order_id TEXT PRIMARY KEY,
+                            created_at TEXT NOT NULL,
+                            code TEXT NOT NULL,
+                            direction TEXT NOT NULL,
+                            qty INTEGER NOT NULL,
+                            price REAL NOT NULL)''')
+        return conn
+
+    def start(self):
+        """啟動寫入線程，首次使用時自動從舊的 open_orders.log 匯入；Main 啟動時調用，記錄方法只在未啟動時補調用"""
+        with self._start_lock:
+            if self._worker is not None:
+                return
+            conn = self._connect()
+            self._import_log(conn)
+            self._worker = threading.Thread(target=self._run, args=(conn,), daemon=True)
+            self._worker.start()
+
+    def _import_log(self, conn):
+        if conn.execute('SELECT COUNT(*) FROM open_orders').fetchone()[0] or not os.path.exists(self.log_path):
+            return
+        rows = []
+        with open(self.log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                match = _LOG_LINE.match(line)
+                if match:
+                    direction = 'long' if match['dir'] == '多' else 'short'
+                    rows.append((match['id'], match['ts'], match['code'], direction, int(match['qty']), float(match['price'])))
+        conn.executemany('INSERT OR REPLACE INTO open_orders VALUES (?, ?, ?, ?, ?, ?)', rows)
+        conn.commit()
+        logging.info(f"已從 open_orders.log 匯入 {len(rows)} 筆開倉記錄到 open_orders.db")
+
+    def _run(self, conn):
+        """批量處理寫入請求，每批一次提交"""
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            done = []
+            try:
+                for op, args in batch:
+                    if op == 'open':
+                        conn.execute('INSERT OR REPLACE INTO open_orders VALUES (?, ?, ?, ?, ?, ?)', args)
+                    elif op == 'update':
+                        conn.execute('UPDATE open_orders SET qty = ? WHERE order_id = ?', args)
+                    elif op == 'delete':
+                        conn.execute('DELETE FROM open_orders WHERE order_id = ?', args)
+                    elif op == 'flush':
+                        done.append(args)
+                    elif op == 'stop':
+                        stop = True
+                conn.commit()
+            except Exception as e:
+                logging.error(f"寫入 open_orders.db 失敗：{e}")
+            for event in done:
+                event.set()
+            if stop:
+                conn.close()
+                return
+
+    def record_open(self, order_id, code, direction, qty, price):
+        """記錄開倉成交"""
+        if self._worker is None:
+            self.start()
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]
+        self._queue.put(('open', (order_id, timestamp, code, direction.lower(), int(qty), float(price))))
+
+    def record_close(self, order_id, remaining_qty):
+        """記錄平倉成交：剩餘數量為 0 時刪除，否則更新數量"""
+        if self._worker is None:
+            self.start()
+        if remaining_qty > 0:
+            self._queue.put(('update', (int(remaining_qty), order_id)))
+        else:
+            self._queue.put(('delete', (order_id,)))
+
+    def flush(self, timeout=None):
+        """等待已入隊的寫入全部提交"""
+        if self._worker is None:
+            return True
+        event = threading.Event()
+        self._queue.put(('flush', event))
+        return event.wait(timeout)
+
+    def open_orders(self):
+        """返回當前台帳中的開倉記錄"""
+        self.flush()
+        conn = self._connect()
+        try:
+            return conn.execute('SELECT order_id, created_at, code, direction, qty, price FROM open_orders ORDER BY created_at').fetchall()
+        finally:
+            conn.close()
+
+    def export_log(self):
+        """將當前持倉匯出為 open_orders.log"""
+        try:
+            lines = []
+            for order_id, created_at, code, direction, qty, price in self.open_orders():
+                direction_text = '多' if direction == 'long' else '空'
+                lines.append(f"{created_at} ID: {order_id} 提交訂單：合約={code}, 方向={direction_text}, 數量={qty}, 價格={price}\n")
+            temp_path = self.log_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+            os.replace(temp_path, self.log_path)
+        except Exception as e:
+            logging.error(f"匯出 open_orders.log 失敗：{e}")
+
+    def close(self):
+        """提交剩餘寫入、匯出 open_orders.log 並停止寫入線程"""
+        if self._worker is None:
+            return
+        self.export_log()
+        self._queue.put(('stop', None))
+        self._worker.join(timeout=5)
+        self._worker = None
+
+ORDER_LEDGER = OrderLedger()  # 全局開倉台帳
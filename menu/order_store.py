@@ -0,0 +1,283 @@
+import threading
+import time
+from .trigger_book import TRIGGER_BOOK
+
+class VirtualOrder:
+    """已成交的虛擬持倉記錄"""
+
+    __slots__ = ('id', 'code', 'direction', 'quantity', 'entry_price', 'is_open', 'stop_loss', 'take_profit',
+                 'highest_price', 'lowest_price', 'use_trailing', 'is_closing')
+
+    def __init__(self, id, code, direction, quantity, entry_price, stop_loss=None, take_profit=None,
+                 highest_price=None, lowest_price=None, use_trailing=False, is_open=True, is_closing=False):
+        self.id = id
+        self.code = code
+        self.direction = direction
+        self.quantity = quantity
+        self.entry_price = entry_price
+        self.is_open = is_open
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+        self.highest_price = highest_price if highest_price is not None else entry_price
+        self.lowest_price = lowest_price if lowest_price is not None else entry_price
+        self.use_trailing = use_trailing
+        self.is_closing = is_closing
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+class PendingOrder:
+    """已提交、等待成交的訂單記錄
+
+    合併平倉單（見 close_aggregator.CloseAggregator）以 constituents 記錄各成分
+    [(自訂訂單 ID, 數量, 開倉價格)]，成交或取消時經 split() 拆回各虛擬訂單。
+    """
+
+    __slots__ = ('futu_order_id', 'id', 'code', 'direction', 'qty', 'price', 'order_type', 'stop_loss',
+                 'take_profit', 'use_trailing', 'point_id', 'hit_price', 'entry_price', 'constituents')
+
+    def __init__(self, futu_order_id, id, code, direction, qty, price, order_type='open', stop_loss=None,
+                 take_profit=None, use_trailing=False, point_id=None, hit_price=None, entry_price=None,
+                 constituents=None):
+        self.futu_order_id = futu_order_id
+        self.id = id
+        self.code = code
+        self.direction = direction
+        self.qty = qty
+        self.price = price
+        self.order_type = order_type
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+        self.use_trailing = use_trailing
+        self.point_id = point_id
+        self.hit_price = hit_price
+        self.entry_price = entry_price
+        self.constituents = constituents
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def ids(self):
+        """返回此訂單涵蓋的自訂訂單 ID"""
+        if self.constituents:
+            return [order_id for order_id, _, _ in self.constituents]
+        return [self.id]
+
+    def split(self, filled_qty=None):
+        """把合併平倉單拆為各成分的記錄，filled_qty 指定時按成分順序分配成交數量；非合併單返回 [self]"""
+        if not self.constituents:
+            return [self]
+        remaining = self.qty if filled_qty is None else filled_qty
+        parts = []
+        for order_id, qty, entry_price in self.constituents:
+            allocated = min(qty, remaining)
+            if allocated <= 0:
+                break
+            remaining -= allocated
+            parts.append(PendingOrder(self.futu_order_id, order_id, self.code, self.direction, allocated, self.price,
+                                      self.order_type, entry_price=entry_price))
+        return parts
+
+class OrderStore:
+    """線程安全的訂單狀態存儲，取代 PENDING_ORDERS / VIRTUAL_ORDERS / CLOSING_ORDERS 全局變數
+
+    虛擬持倉以自訂訂單 ID 索引，並按合約建立二級索引；待成交訂單以富途訂單 ID 索引，
+    並按自訂訂單 ID 反查。所有讀取返回快照列表，調用方無需自行複製。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._virtual = {}  # {custom_order_id: VirtualOrder}
+        self._by_code = {}  # {code: {custom_order_id}}
+        self._pending = {}  # {futu_order_id: PendingOrder}
+        self._pending_by_id = {}  # {custom_order_id: {futu_order_id}}
+        self._closing = set()  # 正在平倉的自訂訂單 ID
+        self._early = {}  # {futu_order_id: (接收時間, 狀態)}，早於 add_pending 到達的終態推送
+        self.early_ttl = 30.0
+        self.on_early_status = None  # fn(futu_order_id, status)，add_pending 時重放早到的終態
+        self.journal = None  # 預寫日誌，見 order_journal.OrderJournal
+
+    def attach_journal(self, journal):
+        """掛接預寫日誌，之後的持倉變更都會追加記錄"""
+        with self._lock:
+            self.journal = journal
+
+    def _log(self, event, order_id, **fields):
+        """寫入日誌，達到壓縮條件時以當前持倉生成快照"""
+        if self.journal is not None and self.journal.append(event, order_id, **fields):
+            TRIGGER_BOOK.sync_extremes()  # 快照需包含移動止盈的最新極值
+            self.journal.compact(self.virtual_orders())
+
+    def clear(self):
+        """清空全部持倉、待成交訂單與平倉標記（回測每次運行前使用）"""
+        with self._lock:
+            self._virtual.clear()
+            self._by_code.clear()
+            self._pending.clear()
+            self._pending_by_id.clear()
+            self._closing.clear()
+            self._early.clear()
+
+    # ---- 虛擬持倉 ----
+    def load(self, orders):
+        """以載入的持倉替換全部虛擬持倉"""
+        with self._lock:
+            self._virtual.clear()
+            self._by_code.clear()
+            for order in orders:
+                self._insert(order)
+
+    def _insert(self, order):
+        self._virtual[order.id] = order
+        self._by_code.setdefault(order.code, set()).add(order.id)
+
+    def add_virtual(self, order):
+        with self._lock:
+            self._insert(order)
+            self._log('open', order.id, order=order.to_dict())
+
+    def get_virtual(self, order_id, direction=None, open_only=True):
+        """按自訂訂單 ID 查詢虛擬持倉，可同時校驗方向與是否持倉中"""
+        with self._lock:
+            order = self._virtual.get(order_id)
+        if order is None:
+            return None
+        if direction is not None and order.direction != direction:
+            return None
+        if open_only and not order.is_open:
+            return None
+        return order
+
+    def remove_virtual(self, order_id):
+        with self._lock:
+            order = self._virtual.pop(order_id, None)
+            if order is not None:
+                ids = self._by_code.get(order.code)
+                if ids is not None:
+                    ids.discard(order_id)
+                    if not ids:
+                        del self._by_code[order.code]
+            return order
+
+    def reduce_virtual(self, order_id, direction, qty):
+        """平倉成交後扣減數量，全部平倉則移除；返回 (訂單, 剩餘數量)，未找到返回 (None, 0)"""
+        with self._lock:
+            order = self.get_virtual(order_id, direction)
+            if order is None:
+                return None, 0
+            order.is_closing = False
+            if order.quantity <= qty:
+                order.is_open = False
+                self.remove_virtual(order_id)
+                self._log('close', order_id)
+                return order, 0
+            order.quantity -= qty
+            self._log('partial_close', order_id, remaining=order.quantity)
+            return order, order.quantity
+
+    def restore_virtual(self, order_id, highest_price=None, lowest_price=None):
+        """平倉單取消或失敗後恢復持倉監控，可同時重設移動止盈的價格極值"""
+        with self._lock:
+            order = self._virtual.get(order_id)
+            if order is None:
+                return None
+            order.is_open = True
+            order.is_closing = False
+            if highest_price is not None:
+                order.highest_price = highest_price
+            if lowest_price is not None:
+                order.lowest_price = lowest_price
+            self._log('cancel', order_id, highest_price=order.highest_price, lowest_price=order.lowest_price)
+            return order
+
+    def virtual_orders(self, code=None):
+        """返回持倉中的虛擬訂單快照，可按合約過濾"""
+        with self._lock:
+            if code is None:
+                orders = list(self._virtual.values())
+            else:
+                orders = [self._virtual[order_id] for order_id in self._by_code.get(code, ())]
+        return [order for order in orders if order.is_open and order.quantity > 0]
+
+    def virtual_codes(self):
+        with self._lock:
+            return set(self._by_code)
+
+    def has_open(self):
+        with self._lock:
+            return any(order.is_open and order.quantity > 0 for order in self._virtual.values())
+
+    # ---- 待成交訂單 ----
+    def add_pending(self, pending):
+        with self._lock:
+            self._pending[pending.futu_order_id] = pending
+            for order_id in pending.ids():
+                self._pending_by_id.setdefault(order_id, set()).add(pending.futu_order_id)
+            early = self._early.pop(pending.futu_order_id, None)
+        # 成交推送可能先於 place_order 返回到達，登記後立即重放
+        if early is not None and time.monotonic() - early[0] <= self.early_ttl and self.on_early_status is not None:
+            self.on_early_status(pending.futu_order_id, early[1])
+
+    def defer_status(self, futu_order_id, status):
+        """暫存找不到待成交訂單的終態推送，early_ttl 秒內登記的訂單會重放"""
+        now = time.monotonic()
+        with self._lock:
+            for key in [key for key, (received, _) in self._early.items() if now - received > self.early_ttl]:
+                del self._early[key]
+            self._early[futu_order_id] = (now, status)
+
+    def get_pending(self, futu_order_id):
+        with self._lock:
+            return self._pending.get(futu_order_id)
+
+    def pop_pending(self, futu_order_id):
+        with self._lock:
+            pending = self._pending.pop(futu_order_id, None)
+            if pending is not None:
+                for order_id in pending.ids():
+                    ids = self._pending_by_id.get(order_id)
+                    if ids is not None:
+                        ids.discard(futu_order_id)
+                        if not ids:
+                            del self._pending_by_id[order_id]
+            return pending
+
+    def find_pending(self, order_id):
+        """按自訂訂單 ID 返回一筆待成交訂單的富途訂單 ID"""
+        with self._lock:
+            ids = self._pending_by_id.get(order_id)
+            return next(iter(ids)) if ids else None
+
+    def pending_ids(self):
+        with self._lock:
+            return set(self._pending)
+
+    def pending_orders(self):
+        with self._lock:
+            return list(self._pending.values())
+
+    # ---- 平倉標記 ----
+    def mark_closing(self, order):
+        """標記訂單為正在平倉，已在平倉中則返回 False"""
+        with self._lock:
+            if order.id in self._closing or order.is_closing:
+                return False
+            self._closing.add(order.id)
+            order.is_closing = True
+            return True
+
+    def clear_closing(self, order_id):
+        """清除平倉標記，返回先前是否處於平倉中"""
+        with self._lock:
+            was_closing = order_id in self._closing
+            self._closing.discard(order_id)
+            order = self._virtual.get(order_id)
+            if order is not None:
+                order.is_closing = False
+            return was_closing
+
+    def is_closing(self, order_id):
+        with self._lock:
+            return order_id in self._closing
+
+ORDER_STORE = OrderStore()  # 全局訂單狀態
@@ -0,0 +1,237 @@
+from futu import *
+from futu.common.constant import RET_OK
+import logging
+import queue
+import time
+from .utils import load_config, append_open_order_to_log, update_order_in_log
+from .order_store import ORDER_STORE, VirtualOrder
+from .quote_feed import get_quote_feed
+from .trigger_book import TRIGGER_BOOK
+from .latency import LATENCY
+from .points.point_logger import find_history_point, update_point_history
+
+class _OrderPushHandler(TradeOrderHandlerBase):
+    """接收訂單狀態推送，僅入隊，不在推送線程中處理"""
+
+    def __init__(self, tracker):
+        super().__init__()
+        self.tracker = tracker
+
+    def on_recv_rsp(self, rsp_pb):
+        ret, data = super().on_recv_rsp(rsp_pb)
+        if ret != RET_OK:
+            logging.error(f"訂單推送異常：{data}")
+            return ret, data
+        for order_id, status, trd_env in zip(data['order_id'], data['order_status'], data['trd_env']):
+            if trd_env == self.tracker.trd_env:
+                self.tracker.events.put(('order', order_id, status))
+        return RET_OK, data
+
+class _DealPushHandler(TradeDealHandlerBase):
+    """接收成交推送，觸發對應訂單的即時查詢"""
+
+    def __init__(self, tracker):
+        super().__init__()
+        self.tracker = tracker
+
+    def on_recv_rsp(self, rsp_pb):
+        ret, data = super().on_recv_rsp(rsp_pb)
+        if ret != RET_OK:
+            logging.error(f"成交推送異常：{data}")
+            return ret, data
+        for order_id, trd_env in zip(data['order_id'], data['trd_env']):
+            if trd_env == self.tracker.trd_env:
+                self.tracker.events.put(('deal', order_id, None))
+        return RET_OK, data
+
+class OrderTracker:
+    """事件驅動的訂單成交追蹤：推送即時更新持倉，批量對賬作為後備"""
+
+    def __init__(self, quote_ctx, trd_ctx, trd_env, point_manager, persist=True):
+        config = load_config()
+        self.trd_ctx = trd_ctx
+        self.trd_env = trd_env
+        self.quote_feed = get_quote_feed(quote_ctx)
+        self.point_manager = point_manager
+        self.reconcile_interval = float(config.get('reconcile_interval', 5))  # 後備對賬間隔（秒）
+        self.persist = persist  # 是否寫入開倉台帳與點位交易歷史，回測時關閉
+        self.events = queue.Queue()
+        self.running = False
+        self._listeners = []  # 成交回調 fn(event, order_info, pnl)
+
+    def add_listener(self, callback):
+        """註冊成交回調 callback(event, order_info, pnl)，event 為 'open'、'close' 或 'cancel'，pnl 僅平倉時提供"""
+        self._listeners.append(callback)
+
+    def _notify(self, event, order_info, pnl=None):
+        for callback in self._listeners:
+            try:
+                callback(event, order_info, pnl)
+            except Exception as e:
+                logging.error(f"成交回調異常：{e}")
+
+    def start_push(self):
+        """註冊交易推送回調"""
+        self.trd_ctx.set_handler(_OrderPushHandler(self))
+        self.trd_ctx.set_handler(_DealPushHandler(self))
+        ORDER_STORE.on_early_status = lambda order_id, status: self.events.put(('order', order_id, status))
+
+    def run(self):
+        """處理推送事件，並定期以單次 order_list_query 批量對賬"""
+        self.running = True
+        next_reconcile = time.monotonic() + self.reconcile_interval
+        while self.running:
+            try:
+                timeout = max(0.0, next_reconcile - time.monotonic())
+                try:
+                    kind, order_id, status = self.events.get(timeout=timeout)
+                except queue.Empty:
+                    kind = None
+                if kind == 'order':
+                    self.process_order(order_id, status)
+                elif kind == 'deal':
+                    # 成交推送只有成交明細，需確認訂單最終狀態
+                    self.reconcile([order_id])
+                if time.monotonic() >= next_reconcile:
+                    self.reconcile()
+                    next_reconcile = time.monotonic() + self.reconcile_interval
+            except Exception as e:
+                logging.error(f"訂單監控異常：{e}")
+                time.sleep(5)
+
+    def reconcile(self, order_ids=None):
+        """批量查詢當日訂單並處理仍在待成交中的訂單"""
+        pending_ids = ORDER_STORE.pending_ids()
+        targets = set(order_ids) & pending_ids if order_ids is not None else pending_ids
+        if not targets:
+            return
+        if len(targets) == 1:
+            ret, data = self.trd_ctx.order_list_query(order_id=next(iter(targets)), trd_env=self.trd_env)
+        else:
+            ret, data = self.trd_ctx.order_list_query(trd_env=self.trd_env)
+        if ret != RET_OK:
+            logging.error(f"訂單對賬查詢失敗：{data}")
+            return
+        if data.empty:
+            return
+        for order_id, status in zip(data['order_id'], data['order_status']):
+            if order_id in targets:
+                self.process_order(order_id, status)
+
+    def process_order(self, order_id, status):
+        """根據訂單最新狀態更新訂單存儲及點位記錄"""
+        if status == OrderStatus.FILLED_ALL:
+            order_info = ORDER_STORE.pop_pending(order_id)
+            if order_info is None:
+                ORDER_STORE.defer_status(order_id, status)  # 可能早於 add_pending 到達
+                return
+            LATENCY.fill_detected(order_id)
+            if order_info.order_type == 'open':
+                self._on_open_filled(order_id, order_info)
+            else:
+                # 合併平倉單按成分分配成交，逐筆更新虛擬持倉
+                for part in order_info.split():
+                    self._on_close_filled(order_id, part)
+            LATENCY.state_updated(order_id)
+        elif status in [OrderStatus.CANCELLED_ALL, OrderStatus.FAILED, OrderStatus.SUBMIT_FAILED, OrderStatus.DELETED]:
+            order_info = ORDER_STORE.pop_pending(order_id)
+            if order_info is None:
+                ORDER_STORE.defer_status(order_id, status)
+                return
+            LATENCY.forget(order_id)
+            for part in order_info.split():
+                self._on_cancelled(part)
+
+    def _on_open_filled(self, order_id, order_info):
+        """開倉成交：新增虛擬持倉並加入觸發簿"""
+        custom_order_id = order_info.id
+        code = order_info.code
+        direction = order_info.direction
+        qty = order_info.qty
+        price = order_info.price
+        stop_loss = order_info.stop_loss
+        take_profit = order_info.take_profit
+        use_trailing = order_info.use_trailing
+        virtual_order = VirtualOrder(
+            id=custom_order_id,
+            code=code,
+            direction=direction,
+            quantity=qty,
+            entry_price=price,
+            stop_loss=stop_loss,
+            take_profit=take_profit,
+            use_trailing=use_trailing
+        )
+        ORDER_STORE.add_virtual(virtual_order)
+        TRIGGER_BOOK.add(virtual_order)
+        logging.info("📥 開倉訂單成功成交：訂單ID=%s, 合約=%s, 方向=%s, 數量=%s, 開倉價格=%s, 命中點位 (%s)=%s, "
+                     "止損=%s, 止盈=%s, 移動止盈=%s\n", custom_order_id, code, direction, qty, price, [order_info.point_id],
+                     order_info.hit_price, stop_loss or '無', take_profit or '無', '啟用' if use_trailing else '未啟用')
+        self._notify('open', order_info)
+        if self.persist:
+            append_open_order_to_log(custom_order_id, code, direction, qty, price)
+        # 點位開倉單：持倉已於提交時記入點位，此處只追加交易歷史
+        if order_info.point_id and self.persist:
+            update_point_history(order_info.point_id, custom_order_id, code, direction, qty, price, is_open=True,
+                                 points_dir=self._points_dir())
+
+    def _on_close_filled(self, order_id, order_info):
+        """平倉成交：扣減或移除虛擬持倉"""
+        custom_order_id = order_info.id
+        code = order_info.code
+        direction = order_info.direction
+        qty = order_info.qty
+        price = order_info.price
+        order, remaining_qty = ORDER_STORE.reduce_virtual(custom_order_id, direction, qty)
+        if order is not None:
+            if remaining_qty > 0:
+                TRIGGER_BOOK.add(order)  # 部分平倉，剩餘數量重新監控
+            else:
+                TRIGGER_BOOK.remove(order)
+        ORDER_STORE.clear_closing(custom_order_id)
+        entry_price = order_info.entry_price or 0
+        pnl = (price - entry_price) * qty * 10 if direction == 'long' else (entry_price - price) * qty * 10
+        logging.info("📤 平倉訂單成功成交：訂單ID=%s, 合約=%s, 方向=%s, 數量=%s, 平倉價格=%s, 盈虧=%s\n",
+                     custom_order_id, code, direction, qty, price, pnl)
+        self._notify('close', order_info, pnl)
+        if self.persist:
+            update_order_in_log(custom_order_id, remaining_qty)
+        # 點位持倉：全部平倉後移出點位，並追加交易歷史
+        point = self._point_of(custom_order_id)
+        if point is not None and remaining_qty == 0:
+            point.close_position(custom_order_id, price)
+        point_id = point.id if point is not None else (find_history_point(custom_order_id) if self.persist else None)
+        if point_id and self.persist:
+            update_point_history(point_id, custom_order_id, code, direction, qty, price, is_open=False, pnl=pnl,
+                                 points_dir=self._points_dir())
+
+    def _points_dir(self):
+        """點位 JSON 根目錄，交易歷史寫在各點位 JSON 旁"""
+        return self.point_manager.points_dir if self.point_manager is not None else None
+
+    def _point_of(self, custom_order_id):
+        """返回持有該自訂訂單 ID 的點位"""
+        if self.point_manager is None:
+            return None
+        for point in self.point_manager.points.values():
+            for pos in point.open_positions:
+                if pos.get('order_id') == custom_order_id:
+                    return point
+        return None
+
+    def _on_cancelled(self, order_info):
+        """訂單取消或失敗：若為平倉單則恢復持倉監控"""
+        custom_order_id = order_info.id
+        logging.info("訂單 %s 已取消或失敗", custom_order_id)
+        self._notify('cancel', order_info)
+        if not ORDER_STORE.clear_closing(custom_order_id):
+            return
+        order = ORDER_STORE.get_virtual(custom_order_id, open_only=False)
+        if order is None:
+            return
+        reset_price = None
+        if order.use_trailing:
+            reset_price = self.quote_feed.get_price(order.code) or order.entry_price
+        ORDER_STORE.restore_virtual(custom_order_id, reset_price, reset_price)
+        TRIGGER_BOOK.add(order)
+        logging.warning("恢復訂單 %s 為可監控狀態，因平倉取消或失敗", custom_order_id)
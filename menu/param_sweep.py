@@ -0,0 +1,252 @@
+import itertools
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+PARAM_NAMES = ('tolerance', 'decay', 'tp_fixed', 'qty', 'limits')
+ENTRY_TOLERANCE = 2.0  # 與 EntryIndex 相同的開倉價格誤差範圍
+CONTRACT_MULTIPLIER = 10  # 與 OrderTracker 盈虧計算一致
+_POINT_TYPES = {
+    'intraday_support': -1,
+    'intraday_resistance': 1,
+    'longterm_support': -1,
+    'longterm_resistance': 1
+}
+_BLOCK = 256
+_CHUNK = 8192
+
+def load_levels(prediction_path):
+    """讀取 generate_point_jsons.py 使用的預測檔，返回 (命中價數組, 方向數組)，方向 1 為多、-1 為空"""
+    with open(prediction_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    hits, sides = [], []
+    for point_type, side in _POINT_TYPES.items():
+        for level in data.get(point_type, {}).get('levels', [])[:3]:
+            hits.append(float(level))
+            sides.append(side)
+    return np.array(hits, dtype=np.float64), np.array(sides, dtype=np.int8)
+
+def make_grid(**params):
+    """以 PARAM_NAMES 各參數的候選值列表生成 (組合數, 5) 參數矩陣"""
+    missing = [name for name in PARAM_NAMES if name not in params]
+    if missing:
+        raise ValueError(f"缺少參數候選值：{missing}")
+    return np.array(list(itertools.product(*(params[name] for name in PARAM_NAMES))), dtype=np.float64)
+
+def _sparse_table(values, reduce):
+    """values 的倍增表：table[k][i] = reduce(values[i:i + 2**k])，越界部分以首層值填充"""
+    table = [values]
+    span = 1
+    while span * 2 <= len(values):
+        prev = table[-1]
+        level = prev.copy()
+        level[:len(values) - span] = reduce(prev[:len(values) - span], prev[span:])
+        table.append(level)
+        span *= 2
+    return table
+
+class _FirstPassage:
+    """批量查詢「從 start 起第一個 values <= threshold 的位置」
+
+    values 按 _BLOCK 分塊，塊最小值建倍增表：先掃描起始塊，再以倍增跳過整塊大於門檻的區段，
+    最後在命中的塊內定位，每筆查詢 O(_BLOCK + log n)，全部以 NumPy 向量化批量計算。
+    """
+
+    def __init__(self, values):
+        self.n = len(values)
+        blocks = max(1, -(-self.n // _BLOCK))
+        self.padded = np.full(blocks * _BLOCK, np.inf)
+        self.padded[:self.n] = values
+        self.blocks = blocks
+        self.table = _sparse_table(self.padded.reshape(blocks, _BLOCK).min(axis=1), np.minimum)
+        self.offsets = np.arange(_BLOCK)
+
+    def _scan(self, blocks, starts, thresholds):
+        """在指定塊內找 >= starts 的第一個命中位置，未命中返回 -1"""
+        index = blocks[:, None] * _BLOCK + self.offsets
+        hit = (self.padded[index] <= thresholds[:, None]) & (index >= starts[:, None])
+        first = hit.argmax(axis=1)
+        return np.where(hit.any(axis=1), index[np.arange(len(index)), first], -1)
+
+    def query(self, starts, thresholds):
+        """返回每筆查詢的命中位置，不存在時為 n"""
+        result = np.full(len(starts), self.n, dtype=np.int64)
+        for begin in range(0, len(starts), _CHUNK):
+            s = starts[begin:begin + _CHUNK].astype(np.int64)
+            x = thresholds[begin:begin + _CHUNK]
+            valid = s < self.n
+            out = np.full(len(s), self.n, dtype=np.int64)
+            if valid.any():
+                idx = np.flatnonzero(valid)
+                found = self._scan(s[idx] // _BLOCK, s[idx], x[idx])
+                out[idx[found >= 0]] = found[found >= 0]
+                rest = idx[found < 0]
+                if len(rest):
+                    pos = s[rest] // _BLOCK + 1
+                    xr = x[rest]
+                    for k in range(len(self.table) - 1, -1, -1):
+                        span = 1 << k
+                        can = pos + span <= self.blocks
+                        skip = can & (self.table[k][np.minimum(pos, self.blocks - 1)] > xr)
+                        pos = np.where(skip, pos + span, pos)
+                    inside = pos < self.blocks
+                    if inside.any():
+                        found = self._scan(pos[inside], np.zeros(inside.sum(), dtype=np.int64), xr[inside])
+                        out[rest[inside]] = np.where(found >= 0, found, self.n)
+            result[begin:begin + _CHUNK] = out
+        return result
+
+class PricePath:
+    """價格路徑的批量查詢索引：首次進入價格區間、之後首次跌破或升破門檻"""
+
+    def __init__(self, prices):
+        prices = np.asarray(prices, dtype=np.float64)
+        if len(prices) > 1:
+            keep = np.empty(len(prices), dtype=bool)
+            keep[0] = True
+            np.not_equal(prices[1:], prices[:-1], out=keep[1:])
+            prices = prices[keep]  # 連續相同價格不影響任何穿越結果
+        self.prices = prices
+        self.n = len(prices)
+        self._below = _FirstPassage(prices)
+        self._above = _FirstPassage(-prices)
+        # 各價格首次出現位置，按價格排序後以倍增表做區間最小值查詢
+        self._values, first = np.unique(prices, return_index=True)
+        self._first = np.stack(_sparse_table(first.astype(np.int64), np.minimum))
+
+    def first_touch(self, low, high):
+        """價格首次落在 [low, high] 的位置，不存在時為 n"""
+        left = np.searchsorted(self._values, low, side='left')
+        right = np.searchsorted(self._values, high, side='right')
+        length = right - left
+        result = np.full(len(low), self.n, dtype=np.int64)
+        ok = length > 0
+        if ok.any():
+            k = np.floor(np.log2(length[ok])).astype(np.int64)
+            a = left[ok]
+            b = right[ok] - (1 << k)
+            result[ok] = np.minimum(self._first[k, a], self._first[k, b])
+        return result
+
+    def first_at_or_below(self, starts, thresholds):
+        return self._below.query(starts, thresholds)
+
+    def first_at_or_above(self, starts, thresholds):
+        return self._above.query(starts, -thresholds)
+
+def _ladder(grid, hits, sides):
+    """按 generate_point_jsons.py 的規則展開每個參數組合、每個點位的開倉階梯
+
+    返回 (組合序號, 方向, 數量, 開倉價, 止損, 止盈) 的扁平數組，已剔除止盈止損驗證不通過的訂單。
+    """
+    tolerance, decay, tp_fixed, qty, limits = (grid[:, i][:, None, None] for i in range(5))
+    trades = np.floor(grid[:, 4] / grid[:, 3]).astype(np.int64)
+    steps = np.arange(max(int(trades.max()), 1))
+    offset = tolerance * decay ** steps[None, None, :]
+    hit = hits[None, :, None]
+    side = sides[None, :, None].astype(np.float64)
+    entry = np.round(hit + side * offset)
+    stop_loss = np.round(hit - side * tp_fixed)
+    take_profit = np.round(hit + side * tp_fixed)
+    shape = (len(grid), len(hits), len(steps))
+    # OpenOrder.validate_stop_loss_take_profit：多單 止損 < 開倉 < 止盈，空單相反
+    valid = (steps[None, None, :] < trades[:, None, None]) & ((take_profit - entry) * side > 0) & ((entry - stop_loss) * side > 0)
+    combo = np.broadcast_to(np.arange(len(grid))[:, None, None], shape)[valid]
+    return (combo, np.broadcast_to(side, shape)[valid], np.broadcast_to(qty, shape)[valid],
+            entry[valid], np.broadcast_to(stop_loss, shape)[valid], np.broadcast_to(take_profit, shape)[valid])
+
+def _unique_rows(*columns):
+    keys = np.stack(columns, axis=1)
+    unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+    return unique, inverse.reshape(-1)
+
+def evaluate(path, grid, hits, sides):
+    """以向量化方式評估參數矩陣，返回每個組合的統計 DataFrame
+
+    模型與回測引擎的固定止盈止損路徑一致：開倉價 ±ENTRY_TOLERANCE 內首次命中時提交限價單，
+    價格觸及限價成交；成交後首次穿越止損或止盈即以當筆價格平倉，每個階梯索引只開一次，
+    期末未平倉按最後價格計算浮動盈虧。未模擬移動止盈交替，入選參數應再以 Backtester 確認。
+    """
+    combo, side, qty, entry, stop_loss, take_profit = _ladder(grid, hits, sides)
+    n = path.n
+    prices = path.prices
+
+    # 命中：同一開倉價只查詢一次
+    entries, inverse = np.unique(entry, return_inverse=True)
+    touched = path.first_touch(entries - ENTRY_TOLERANCE, entries + ENTRY_TOLERANCE)[inverse.reshape(-1)]
+
+    # 成交：多單買入限價需價格 <= 開倉價，空單相反
+    fills = np.full(len(entry), n, dtype=np.int64)
+    keys, inverse = _unique_rows(touched.astype(np.float64), entry, side)
+    start, price, key_side = keys[:, 0].astype(np.int64), keys[:, 1], keys[:, 2]
+    unique_fills = np.where(key_side > 0, path.first_at_or_below(start, price), path.first_at_or_above(start, price))
+    fills[:] = unique_fills[inverse]
+    filled = fills < n
+
+    # 平倉：成交後首次觸及止損或止盈
+    exits = np.full(len(entry), n, dtype=np.int64)
+    if filled.any():
+        keys, inverse = _unique_rows((fills[filled] + 1).astype(np.float64), stop_loss[filled], take_profit[filled], side[filled])
+        start, sl, tp, key_side = keys[:, 0].astype(np.int64), keys[:, 1], keys[:, 2], keys[:, 3]
+        long_exit = np.minimum(path.first_at_or_below(start, sl), path.first_at_or_above(start, tp))
+        short_exit = np.minimum(path.first_at_or_above(start, sl), path.first_at_or_below(start, tp))
+        exits[filled] = np.where(key_side > 0, long_exit, short_exit)[inverse]
+    closed = exits < n
+
+    exit_price = np.where(closed, prices[np.minimum(exits, n - 1)], prices[-1])
+    pnl = (exit_price - entry) * side * qty * CONTRACT_MULTIPLIER
+    m = len(grid)
+    realized = np.bincount(combo[closed], weights=pnl[closed], minlength=m)
+    unrealized = np.bincount(combo[filled & ~closed], weights=pnl[filled & ~closed], minlength=m)
+    wins = np.bincount(combo[closed & (pnl > 0)], minlength=m)
+    closes = np.bincount(combo[closed], minlength=m)
+
+    # 已實現權益曲線的最大回撤：按 (組合, 平倉位置) 排序後分組累計
+    drawdown = np.zeros(m)
+    if closed.any():
+        c, t, p = combo[closed], exits[closed], pnl[closed]
+        order = np.lexsort((t, c))
+        c, p = c[order], p[order]
+        equity = np.cumsum(p)
+        starts = np.flatnonzero(np.r_[True, c[1:] != c[:-1]])
+        base = np.repeat(equity[starts] - p[starts], np.diff(np.r_[starts, len(c)]))
+        equity = equity - base
+        span = 2 * np.abs(p).sum() + 1
+        shifted = np.maximum(equity, 0) + c * span  # 曲線起點 0 也計入峰值；分組平移避免跨組取最大值
+        peak = np.maximum.accumulate(shifted) - c * span
+        drawdown[np.unique(c)] = np.maximum.reduceat(peak - equity, starts)
+
+    frame = pd.DataFrame(grid, columns=PARAM_NAMES)
+    frame['hits'] = np.bincount(combo[touched < n], minlength=m)
+    frame['fills'] = np.bincount(combo[filled], minlength=m)
+    frame['closes'] = closes
+    frame['win_rate'] = np.divide(wins, closes, out=np.zeros(m), where=closes > 0)
+    frame['realized_pnl'] = realized
+    frame['unrealized_pnl'] = unrealized
+    frame['pnl'] = realized + unrealized
+    frame['max_drawdown'] = drawdown
+    return frame
+
+_WORKER = {}
+
+def _init_worker(prices, hits, sides):
+    _WORKER['path'] = PricePath(prices)
+    _WORKER['hits'] = hits
+    _WORKER['sides'] = sides
+
+def _evaluate_chunk(grid):
+    return evaluate(_WORKER['path'], grid, _WORKER['hits'], _WORKER['sides'])
+
+def sweep(prices, grid, hits, sides, workers=1, chunk_size=2000):
+    """評估整個參數矩陣；workers > 1 時按 chunk_size 分塊交由進程池並行計算"""
+    grid = np.asarray(grid, dtype=np.float64)
+    if workers <= 1 or len(grid) <= chunk_size:
+        frame = evaluate(PricePath(prices), grid, hits, sides)
+    else:
+        chunks = [grid[i:i + chunk_size] for i in range(0, len(grid), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(prices, hits, sides)) as pool:
+            frame = pd.concat(list(pool.map(_evaluate_chunk, chunks)), ignore_index=True)
+    logging.info(f"參數掃描完成：{len(grid)} 組參數，{len(hits)} 個點位，{len(prices)} 筆價格")
+    return frame.sort_values('pnl', ascending=False, ignore_index=True)
@@ -0,0 +1,39 @@
+from bisect import bisect_left, bisect_right
+
+class EntryIndex:
+    """按合約分組的點位開倉價格排序索引，以區間查詢取代逐點位逐訂單掃描"""
+
+    def __init__(self, tolerance=2.0):
+        """初始化索引，tolerance 為開倉價格允許誤差"""
+        self.tolerance = tolerance
+        self._index = {}  # {code: (已排序開倉價格, 對應的 (point_id, order_index, entry_price))}
+
+    def rebuild(self, points):
+        """依據當前點位重建索引，建好後整體替換，監控線程不會讀到半成品"""
+        grouped = {}
+        for point_id, point in points.items():
+            entries = grouped.setdefault(point.code, [])
+            for order in point.orders:
+                entry_price = float(order.get('entry_price', 0.0))
+                entries.append((entry_price, point_id, order.get('order_index', 0)))
+        index = {}
+        for code, entries in grouped.items():
+            entries.sort(key=lambda entry: entry[0])
+            prices = [entry[0] for entry in entries]
+            refs = [(point_id, order_index, entry_price) for entry_price, point_id, order_index in entries]
+            index[code] = (prices, refs)
+        self._index = index
+
+    def codes(self):
+        """返回索引中的所有合約"""
+        return set(self._index)
+
+    def query(self, code, current_price):
+        """返回 code 合約中開倉價格落在 current_price ± tolerance 內的 (point_id, order_index, entry_price)"""
+        prices, refs = self._index.get(code, ([], []))
+        lo = bisect_left(prices, current_price - self.tolerance)
+        hi = bisect_right(prices, current_price + self.tolerance)
+        return refs[lo:hi]
+
+    def __len__(self):
+        return sum(len(prices) for prices, _ in self._index.values())
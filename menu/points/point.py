@@ -1,5 +1,8 @@
 from datetime import datetime
 import logging
+from ..position_book import PositionBook
+
+TRAILING_STRATEGIES = ('trailing_stop', 'daily_trailing_stop', 'midlong_trailing_stop')  # 使用移動止盈的點位策略
 
 class Point:
     """管理單個點位的交易邏輯"""
@@ -8,6 +11,7 @@ class Point:
         """初始化點位數據"""
         self.id = point_data.get('point_id', point_id)
         self.type = point_data.get('type', '')
+        self.code = point_data.get('code', '')  # 點位交易的合約代碼
         self.hit_price = float(point_data.get('hit_price', 0.0))
         self.allow_hit = point_data.get('allow_hit', True)
         self.allow_entry = point_data.get('allow_entry', True)
@@ -19,6 +23,7 @@ class Point:
         self.trade_count = 0
         self.total_quantity = 0
         self.open_positions = []  # 儲存當前持倉
+        self.book = PositionBook()  # open_positions 的列式副本，供每筆行情的盈虧與移動止盈計算
         self.total_pnl = 0.0
         self.trade_history = []  # 記錄歷史交易
         self.logger = logger
@@ -29,48 +34,54 @@ class Point:
     def can_open_position(self, order_index):
         """檢查是否可以開倉"""
         if not self.allow_entry:
-            self.logger.info(f"點位 {self.id} 不允許開倉")
+            self.logger.info("點位 %s 不允許開倉", self.id)
             return False
         if order_index >= len(self.orders):
-            self.logger.error(f"點位 {self.id} 無效訂單索引 {order_index}")
+            self.logger.error("點位 %s 無效訂單索引 %s", self.id, order_index)
             return False
         if order_index in self.opened_indices:  # 檢查是否已開過該索引
             # self.logger.info(f"點位 {self.id} 索引 {order_index} 已開過倉，跳過")
             return False
         if self.hit_count >= self.hit_limit:
-            self.logger.info(f"點位 {self.id} 已達最大命中次數 {self.hit_limit}")
+            self.logger.info("點位 %s 已達最大命中次數 %s", self.id, self.hit_limit)
             return False
         if self.total_quantity + self.qty_each_time > self.quantity_limits:
             if not self.quantity_limit_notified:  # 僅在第一次觸發時通知
-                self.logger.info(f"點位 {self.id} 已達總數量限制 {self.quantity_limits}")
+                self.logger.info("點位 %s 已達總數量限制 %s", self.id, self.quantity_limits)
                 self.quantity_limit_notified = True  # 設置標誌，避免重複通知
             return False
         order = self.orders[order_index]
         if order.get('quantity', 0) != self.qty_each_time:
-            self.logger.warning(f"點位 {self.id} 訂單 {order_index} 數量 {order.get('quantity')} 與每次開倉數量 {self.qty_each_time} 不一致")
+            self.logger.warning("點位 %s 訂單 %s 數量 %s 與每次開倉數量 %s 不一致", self.id, order_index, order.get('quantity'), self.qty_each_time)
         return True
 
     def add_position(self, order_id, order_index, entry_price, custom_order_id):
         """記錄新開倉訂單"""
         order = self.orders[order_index].copy()
         if self.total_quantity + order.get('quantity', 0) > self.quantity_limits:
-            self.logger.info(f"點位 {self.id} 已達總數量限制 {self.quantity_limits}，無法添加訂單 {order_id}")
+            self.logger.info("點位 %s 已達總數量限制 %s，無法添加訂單 %s", self.id, self.quantity_limits, order_id)
             return False
         for pos in self.open_positions:
             if pos.get('order_id') == order_id:
-                self.logger.info(f"訂單 {order_id} 已存在於點位 {self.id}，忽略重複添加")
+                self.logger.info("訂單 %s 已存在於點位 %s，忽略重複添加", order_id, self.id)
                 return False
         order['order_id'] = order_id
         order['custom_order_id'] = custom_order_id
         order['order_index'] = order_index
         order['entry_price'] = float(entry_price)
         self.open_positions.append(order)
+        self._book_add(order)
         self.trade_count += 1
         self.total_quantity += order.get('quantity', 0)
         self.opened_indices.add(order_index)  # 記錄已開過的索引
-        self.logger.info(f"點位 {self.id} 新增開倉訂單 {order_id}，索引 {order_index}，總數量 {self.total_quantity}/{self.quantity_limits} 次數")
+        self.logger.info("點位 %s 新增開倉訂單 %s，索引 %s，總數量 %s/%s 次數", self.id, order_id, order_index, self.total_quantity, self.quantity_limits)
         return True
 
+    def _book_add(self, pos):
+        self.book.add(pos['order_id'], pos.get('direction', 'long'), pos.get('quantity', 0), pos['entry_price'],
+                      target=pos.get('take_profit', 0.0), trailing=pos.get('strategy', '') in TRAILING_STRATEGIES,
+                      offset=pos.get('trail_offset', 50.0), obj=pos)
+
     def close_position(self, order_id, exit_price):
         """關閉指定訂單並計算盈虧"""
         for pos in self.open_positions[:]:
@@ -90,56 +101,116 @@ class Point:
                     'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 })
                 self.open_positions.remove(pos)
+                self.book.remove(order_id)
                 self.total_quantity -= quantity
-                self.logger.info(f"點位 {self.id} 關閉訂單 {order_id}，盈虧 {pnl}，剩餘總數量 {self.total_quantity}")
+                self.logger.info("點位 %s 關閉訂單 %s，盈虧 %s，剩餘總數量 %s", self.id, order_id, pnl, self.total_quantity)
                 return True
-        self.logger.error(f"點位 {self.id} 未找到訂單 {order_id}")
+        self.logger.error("點位 %s 未找到訂單 %s", self.id, order_id)
         return False
 
     def update_pnl(self, current_price):
         """更新浮動盈虧"""
-        self.total_pnl = 0.0
-        for pos in self.open_positions:
-            quantity = pos.get('quantity', 0)
-            entry_price = pos.get('entry_price', 0.0)
-            direction = pos.get('direction', 'long')
-            pnl = (current_price - entry_price) * quantity if direction == 'long' else (entry_price - current_price) * quantity
-            self.total_pnl += pnl
-        self.logger.debug(f"點位 {self.id} 更新浮動盈虧：{self.total_pnl}")
+        self.total_pnl = self.book.total_pnl(current_price)
+        self.logger.debug("點位 %s 更新浮動盈虧：%s", self.id, self.total_pnl)
 
     def check_hit(self, current_price):
         """檢查是否命中點位，誤差範圍 ±2"""
         if not self.allow_hit:
-            self.logger.info(f"點位 {self.id} 不允許命中")
+            self.logger.info("點位 %s 不允許命中", self.id)
             return False
         tolerance = 2.0
         if self.hit_price - tolerance <= current_price <= self.hit_price + tolerance:
             self.hit_count += 1
-            self.logger.info(f"點位 {self.id} 命中，當前命中次數 {self.hit_count}")
+            self.logger.info("點位 %s 命中，當前命中次數 %s", self.id, self.hit_count)
             return self.hit_count <= self.hit_limit
         return False
 
     def update_trailing_take_profit(self, order_id, current_price):
         """更新移動止盈，僅適用於 trailing_stop 策略"""
         for pos in self.open_positions:
-            if pos.get('order_id') == order_id and pos.get('strategy', '') in ['trailing_stop', 'daily_trailing_stop', 'midlong_trailing_stop']:
-                trail_offset = pos.get('trail_offset', 50.0)
-                if pos.get('direction') == 'long':
-                    new_take_profit = current_price - trail_offset
-                    if new_take_profit > pos.get('take_profit', 0.0):
-                        pos['take_profit'] = new_take_profit
-                        self.logger.info(f"點位 {self.id} 訂單 {order_id} 更新移動止盈至 {new_take_profit}")
-                else:
-                    new_take_profit = current_price + trail_offset
-                    if new_take_profit < pos.get('take_profit', 0.0):
-                        pos['take_profit'] = new_take_profit
-                        self.logger.info(f"點位 {self.id} 訂單 {order_id} 更新移動止盈至 {new_take_profit}")
+            if pos.get('order_id') == order_id:
+                self._trail(pos, current_price)
+
+    def update_trailing_take_profits(self, current_price):
+        """以陣列運算更新所有持倉的移動止盈，只回寫有變化的持倉"""
+        rows = self.book.trail_targets(current_price)
+        if not rows:
+            return
+        target = self.book.column('target')
+        for row in rows:
+            pos = self.book.objects[row]
+            pos['take_profit'] = float(target[row])
+            self.logger.info("點位 %s 訂單 %s 更新移動止盈至 %s", self.id, pos.get('order_id'), pos['take_profit'])
+
+    def _trail(self, pos, current_price):
+        if pos.get('strategy', '') not in TRAILING_STRATEGIES:
+            return
+        order_id = pos.get('order_id')
+        trail_offset = pos.get('trail_offset', 50.0)
+        if pos.get('direction') == 'long':
+            new_take_profit = current_price - trail_offset
+            if new_take_profit > pos.get('take_profit', 0.0):
+                pos['take_profit'] = new_take_profit
+                self.book.set(order_id, target=new_take_profit)
+                self.logger.info("點位 %s 訂單 %s 更新移動止盈至 %s", self.id, order_id, new_take_profit)
+        else:
+            new_take_profit = current_price + trail_offset
+            if new_take_profit < pos.get('take_profit', 0.0):
+                pos['take_profit'] = new_take_profit
+                self.book.set(order_id, target=new_take_profit)
+                self.logger.info("點位 %s 訂單 %s 更新移動止盈至 %s", self.id, order_id, new_take_profit)
+
+    def state_signature(self):
+        """運行狀態的輕量簽名，簽名不變即無需重新保存"""
+        return (self.hit_count, self.trade_count, len(self.opened_indices), len(self.trade_history),
+                tuple((pos.get('order_id'), pos.get('take_profit')) for pos in self.open_positions))
+
+    def state(self):
+        """返回需跨重啟保存的運行狀態（不含交易記錄，交易記錄由 PointStateStore 增量追加）
+
+        已開索引連同當時的訂單定義一併保存，恢復時只保留定義未變的索引。
+        """
+        return {
+            'hit_count': self.hit_count,
+            'trade_count': self.trade_count,
+            'opened_orders': {str(index): self.orders[index] for index in sorted(self.opened_indices) if index < len(self.orders)},
+            'open_positions': [dict(pos) for pos in self.open_positions]
+        }
+
+    def restore_state(self, state, trade_history=()):
+        """以保存的運行狀態恢復點位，持倉重新寫入 PositionBook"""
+        self.hit_count = int(state.get('hit_count', 0))
+        self.trade_count = int(state.get('trade_count', 0))
+        self.opened_indices = set()
+        for index, order in state.get('opened_orders', {}).items():
+            index = int(index)
+            if index < len(self.orders) and self.orders[index] == order:
+                self.opened_indices.add(index)
+        self.open_positions = []
+        self.book.clear()
+        for pos in state.get('open_positions', []):
+            pos = dict(pos)
+            self.open_positions.append(pos)
+            self._book_add(pos)
+        self.total_quantity = sum(pos.get('quantity', 0) for pos in self.open_positions)
+        self.trade_history = list(trade_history)
+
+    def drop_position(self, order_id):
+        """移除對賬時確認已不存在的持倉，不記錄交易"""
+        for pos in self.open_positions:
+            if pos.get('order_id') == order_id:
+                self.open_positions.remove(pos)
+                self.book.remove(order_id)
+                self.total_quantity -= pos.get('quantity', 0)
+                return pos
+        return None
 
     def get_status(self):
         """返回點位當前狀態"""
         return {
             'point_id': self.id,
             'type': self.type,
+            'code': self.code,
             'hit_price': self.hit_price,
             'hit_count': self.hit_count,
             'hit_limit': self.hit_limit,
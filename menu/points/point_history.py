@@ -0,0 +1,89 @@
+import json
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime
+
+class PointHistory:
+    """單個點位的交易歷史
+
+    開倉與平倉事件以 JSON 行追加到 trade_history.jsonl，檔案保持開啟、從不重寫；
+    內存中維護未平倉索引（自訂訂單 ID → 開倉記錄）與已平倉交易列表，啟動時掃描一次重建。
+    部分平倉扣減開倉記錄的剩餘數量，數量歸零才移出未平倉索引。已平倉交易只在內存保留最近
+    closed_limit 筆，完整記錄以檔案為準。
+    """
+
+    def __init__(self, point_dir, closed_limit=1000):
+        self.path = os.path.join(point_dir, 'trade_history.jsonl')
+        self._lock = threading.Lock()
+        self.open_entries = {}  # {custom_order_id: 開倉記錄}
+        self.closed = deque(maxlen=closed_limit)  # 最近的已平倉交易：entry_price, exit_price, quantity, direction, pnl, open_time, close_time
+        os.makedirs(point_dir, exist_ok=True)
+        self._load()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    self._apply(json.loads(line))
+                except ValueError:
+                    logging.warning(f"{self.path} 存在不完整記錄，已跳過")
+
+    def _apply(self, record):
+        if record['event'] == 'open':
+            self.open_entries[record['order_id']] = record
+        else:
+            entry = self.open_entries.get(record['order_id'], {})
+            quantity = record.get('quantity', entry.get('quantity'))
+            if entry:
+                remaining = entry.get('quantity', 0) - (quantity or 0)
+                if remaining > 0:
+                    entry['quantity'] = remaining
+                else:
+                    del self.open_entries[record['order_id']]
+            self.closed.append({
+                'order_id': record['order_id'],
+                'code': entry.get('code'),
+                'direction': entry.get('direction'),
+                'quantity': quantity,
+                'entry_price': entry.get('price'),
+                'exit_price': record['price'],
+                'pnl': record.get('pnl'),
+                'open_time': entry.get('time'),
+                'close_time': record['time']
+            })
+
+    def _append(self, record):
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+            self._apply(record)
+
+    def record_open(self, order_id, code, direction, qty, price):
+        """記錄開倉"""
+        self._append({'event': 'open', 'order_id': order_id, 'code': code, 'direction': direction,
+                      'quantity': qty, 'price': price, 'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
+
+    def record_close(self, order_id, qty, price, pnl=None):
+        """記錄平倉（可為部分平倉），pnl 由調用方按合約乘數計算"""
+        self._append({'event': 'close', 'order_id': order_id, 'quantity': qty, 'price': price, 'pnl': pnl,
+                      'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
+
+    def open_trades(self):
+        """返回未平倉記錄"""
+        with self._lock:
+            return list(self.open_entries.values())
+
+    def closed_trades(self, start=None, end=None):
+        """返回內存中平倉時間落在 [start, end] 的已平倉交易，時間格式 '%Y-%m-%d %H:%M:%S'"""
+        with self._lock:
+            return [trade for trade in self.closed
+                    if (start is None or trade['close_time'] >= start) and (end is None or trade['close_time'] <= end)]
+
+    def close(self):
+        with self._lock:
+            self._file.close()
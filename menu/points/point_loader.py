@@ -0,0 +1,139 @@
+import glob
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+try:
+    import orjson  # 可選，解析速度約為標準庫的數倍
+except ImportError:
+    orjson = None
+
+_DIRECTIONS = ('long', 'short')
+
+def _is_number(value):
+    return type(value) in (int, float)  # 排除 bool
+
+def _is_count(value, minimum=0):
+    return type(value) is int and value >= minimum
+
+def discover_point_files(base_dir, patterns=('*/*.json',), bundle=None):
+    """按 glob 模式列出點位檔（相對 base_dir），存在合併檔 bundle 時一併返回；結果排序、去重"""
+    paths = set()
+    for pattern in patterns:
+        paths.update(path for path in glob.glob(os.path.join(base_dir, pattern), recursive=True) if os.path.isfile(path))
+    if bundle:
+        bundle_path = os.path.join(base_dir, bundle)
+        if os.path.isfile(bundle_path):
+            paths.add(bundle_path)
+    return sorted(paths)
+
+def _decode(path, raw):
+    if path.endswith('.msgpack'):
+        try:
+            import msgpack
+        except ImportError as e:
+            raise RuntimeError(f"讀取 msgpack 點位檔需要安裝 msgpack：{e}")
+        return msgpack.unpackb(raw, raw=False)
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode('utf-8'))
+
+def validate_point(data, where):
+    """檢查單個點位定義，返回錯誤訊息列表"""
+    if not isinstance(data, dict):
+        return [f"{where} 不是物件"]
+    errors = []
+    point_id = data.get('point_id')
+    if not isinstance(point_id, str) or not point_id:
+        errors.append(f"{where} 缺少 point_id")
+    if 'hit_price' in data and not _is_number(data['hit_price']):
+        errors.append(f"{where} hit_price 應為數字")
+    for key in ('qty_each_time', 'quantity_limits', 'hit_limit'):
+        if key in data and not _is_count(data[key]):
+            errors.append(f"{where} {key} 應為非負整數")
+    for key in ('allow_hit', 'allow_entry'):
+        if key in data and not isinstance(data[key], bool):
+            errors.append(f"{where} {key} 應為布林值")
+    if 'code' in data and not isinstance(data['code'], str):
+        errors.append(f"{where} code 應為字串")
+    orders = data.get('orders')
+    if not isinstance(orders, list):
+        return errors + [f"{where} orders 應為列表"]
+    for i, order in enumerate(orders):
+        at = f"{where} orders[{i}]"
+        if not isinstance(order, dict):
+            errors.append(f"{at} 不是物件")
+            continue
+        if order.get('order_index') != i:
+            errors.append(f"{at} order_index 應為 {i}")  # 已開索引按列表位置記錄
+        if not _is_number(order.get('entry_price')):
+            errors.append(f"{at} entry_price 應為數字")
+        if order.get('direction') not in _DIRECTIONS:
+            errors.append(f"{at} direction 應為 long 或 short")
+        if not _is_count(order.get('quantity'), 1):
+            errors.append(f"{at} quantity 應為正整數")
+        for key in ('stop_loss', 'take_profit', 'trail_offset'):
+            value = order.get(key)
+            if value is not None and not _is_number(value):
+                errors.append(f"{at} {key} 應為數字")
+    return errors
+
+def read_point_source(path, default_code, bundle=None):
+    """讀取並驗證一個點位檔，返回 ((mtime_ns, 大小), 內容雜湊, 點位列表)；格式錯誤時拋出 ValueError
+
+    檔案內容為點位列表，或含 points 列表的物件。單點位檔的點位未指定 point_id 時以所在資料夾名稱補上，
+    合併檔中的點位必須指定；未指定合約的點位使用 default_code，訂單未指定 order_index 時按列表位置補上。
+    """
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        raw = f.read()
+    try:
+        content = _decode(path, raw)
+    except ValueError as e:
+        raise ValueError(f"{path} 解析失敗：{e}")
+    if isinstance(content, dict):
+        content = content.get('points')
+    if not isinstance(content, list):
+        raise ValueError(f"{path} 應為點位列表或含 points 列表的物件")
+    is_bundle = bundle is not None and os.path.basename(path) == bundle
+    folder = os.path.basename(os.path.dirname(path))
+    errors = []
+    for i, point_data in enumerate(content):
+        if isinstance(point_data, dict):
+            if not is_bundle:
+                point_data.setdefault('point_id', folder)
+            point_data.setdefault('code', default_code)
+            for index, order in enumerate(point_data.get('orders') or ()):
+                if isinstance(order, dict):
+                    order.setdefault('order_index', index)
+        errors.extend(validate_point(point_data, f"{path} [{i}]"))
+    if errors:
+        raise ValueError('；'.join(errors))
+    return (stat.st_mtime_ns, stat.st_size), hashlib.sha1(raw).hexdigest(), content
+
+def _read_or_error(path, default_code, bundle):
+    try:
+        return read_point_source(path, default_code, bundle)
+    except Exception as e:
+        return e
+
+def read_point_sources(paths, default_code, bundle=None, workers=8, process_min=1000):
+    """讀取多個點位檔，返回 {路徑: read_point_source 的結果或異常}
+
+    解析受 GIL 限制，線程池無法加速。檔案數達 process_min 且有多個 CPU 時以進程池分批解析
+    （spawn 啟動，避免在多線程進程中 fork）；檔案較少時進程啟動與結果序列化的開銷大於解析本身，
+    直接依次讀取。
+    """
+    workers = min(workers, os.cpu_count() or 1)
+    if workers > 1 and len(paths) >= process_min:
+        chunksize = max(1, len(paths) // (workers * 4))
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                return dict(zip(paths, pool.map(_read_or_error, paths, repeat(default_code), repeat(bundle), chunksize=chunksize)))
+        except Exception as e:
+            logging.warning(f"進程池解析點位檔失敗，改為依次讀取：{e}")
+    return {path: _read_or_error(path, default_code, bundle) for path in paths}
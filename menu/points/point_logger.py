@@ -1,45 +1,71 @@
+import logging
 import os
+import threading
 from datetime import datetime
+from .point_history import PointHistory
+from ..utils import load_config
+
+def default_points_dir():
+    """返回專案根目錄下的 points 資料夾（與點位 JSON、PointLogRouter 的 trade.log 同一目錄）"""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    while base_dir.endswith('points'):
+        base_dir = os.path.dirname(base_dir)
+    while base_dir.endswith('menu'):
+        base_dir = os.path.dirname(base_dir)
+    return os.path.join(base_dir, 'points')
 
 def append_to_point_log(point_id, message):
-    """將訊息寫入點位專屬的 trade.log"""
+    """將訊息寫入點位專屬的 trade.log，已設置日誌管線時經隊列寫入且檔案保持開啟"""
+    logger = logging.getLogger(f'point_log.{point_id}')
+    if logger.parent.handlers:
+        logger.info(message)
+        return
     try:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        while base_dir.endswith('points'):
-            base_dir = os.path.dirname(base_dir)
-        log_path = os.path.join(base_dir, 'points', point_id, 'trade.log')
+        log_path = os.path.join(default_points_dir(), point_id, 'trade.log')
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         log_line = f"{timestamp} - {message}\n"
         with open(log_path, 'a', encoding='utf-8') as f:
             f.write(log_line)
     except Exception as e:
-        print(f"寫入 {point_id}/trade.log 失敗：{e}")
+        logging.error(f"寫入 {point_id}/trade.log 失敗：{e}")
 
-def update_point_history(point_id, order_id, message, is_open=True):
-    """更新點位專屬的 trade_history.log"""
-    try:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        while base_dir.endswith('points'):
-            base_dir = os.path.dirname(base_dir)
-        log_path = os.path.join(base_dir, 'points', point_id, 'trade_history.log')
-        temp_file = os.path.join(base_dir, 'points', point_id, 'trade_history_temp.log')
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+_HISTORIES = {}  # {點位資料夾: PointHistory}
+_HISTORIES_LOCK = threading.Lock()
 
-        if not os.path.exists(log_path):
-            with open(log_path, 'w', encoding='utf-8') as f:
-                pass
+def get_point_history(point_id, points_dir=None):
+    """返回點位的交易歷史存儲（points_dir/<point_id>/trade_history.jsonl），首次使用時重建索引"""
+    point_dir = os.path.join(points_dir or default_points_dir(), point_id)
+    with _HISTORIES_LOCK:
+        history = _HISTORIES.get(point_dir)
+        if history is None:
+            history = PointHistory(point_dir, int(load_config().get('point_history_closed_limit', 1000)))
+            _HISTORIES[point_dir] = history
+        return history
 
+def load_point_histories(points_dir, point_ids):
+    """啟動時預先載入各點位的交易歷史，避免首筆成交時在推送線程中解析整個檔案"""
+    for point_id in point_ids:
+        try:
+            get_point_history(point_id, points_dir)
+        except Exception as e:
+            logging.error(f"載入 {point_id}/trade_history.jsonl 失敗：{e}")
+
+def find_history_point(order_id):
+    """在已載入的點位交易歷史中查找持有該未平倉自訂訂單 ID 的點位"""
+    with _HISTORIES_LOCK:
+        histories = list(_HISTORIES.items())
+    for point_dir, history in histories:
+        if order_id in history.open_entries:
+            return os.path.basename(point_dir)
+    return None
+
+def update_point_history(point_id, order_id, code, direction, qty, price, is_open=True, pnl=None, points_dir=None):
+    """追加點位的開倉或平倉記錄到 trade_history.jsonl，order_id 為自訂訂單 ID；points_dir 為點位 JSON 根目錄"""
+    try:
+        history = get_point_history(point_id, points_dir)
         if is_open:
-            log_line = f"{timestamp} - 開倉訂單：{message}\n"
-            with open(log_path, 'a', encoding='utf-8') as f:
-                f.write(log_line)
+            history.record_open(order_id, code, direction, qty, price)
         else:
-            with open(log_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                for line in lines:
-                    if order_id not in line:
-                        f.write(line)
-            os.replace(temp_file, log_path)
+            history.record_close(order_id, qty, price, pnl)
     except Exception as e:
-        print(f"更新 {point_id}/trade_history.log 失敗：{e}")
\ No newline at end of file
+        logging.error(f"更新 {point_id}/trade_history.jsonl 失敗：{e}")
@@ -1,97 +1,402 @@
 import os
-import json
 import logging
+import threading
 import time
+from futu import PositionSide
 from futu.common.constant import RET_OK
 from .point import Point
+from .entry_index import EntryIndex
+from .point_loader import discover_point_files, read_point_sources
 from ..open_order import OpenOrder
 from ..close_order import CloseOrder
+from ..quote_feed import get_quote_feed
+from ..utils import load_config, update_order_in_log
+from ..latency import LATENCY
+from ..order_store import ORDER_STORE
+from ..trigger_book import TRIGGER_BOOK
+
+class PointSet:
+    """點位表、開倉價格索引與按合約分組的不可變快照，載入或重新加載時整體替換"""
+
+    __slots__ = ('points', 'entry_index', 'by_code')
+
+    def __init__(self, points, entry_index, by_code):
+        self.points = points  # {point_id: Point}
+        self.entry_index = entry_index
+        self.by_code = by_code  # {code: [Point]}
 
 class PointManager:
-    """管理所有點位並執行自動交易"""
+    """管理所有點位並執行自動交易
+
+    監控線程每筆行情只讀取一次 PointSet 快照。開倉檢查與重新加載的狀態移交、快照替換共用 _trade_lock，
+    重新加載不會在開倉途中複製舊點位的已開索引。
+    """
 
     def __init__(self, quote_ctx, trd_ctx, trd_env, order_counter):
         """初始化點位管理器"""
-        self.points = {}
+        config = load_config()
+        self._snapshot = PointSet({}, EntryIndex(), {})
+        self._trade_lock = threading.RLock()  # 開倉檢查與點位替換互斥
+        self.default_code = config.get('point_code', 'HK.MHI2506')  # 點位 JSON 未指定合約時使用
+        self.point_patterns = config.get('point_patterns', ['*/*.json'])  # 相對點位根目錄的 glob 模式
+        self.points_bundle = config.get('points_bundle', 'points_bundle.json')  # 全部點位的合併檔，存在時一併加載
+        self.load_workers = int(config.get('points_load_workers', 8))  # 解析點位檔的進程數上限
+        self.process_min = int(config.get('points_process_min_files', 1000))  # 檔案數達此值才用進程池
         self.quote_ctx = quote_ctx
+        self.trd_ctx = trd_ctx
+        self.trd_env = trd_env
+        self.quote_feed = get_quote_feed(quote_ctx)
         self.open_order = OpenOrder(quote_ctx, trd_ctx, trd_env, order_counter)
         self.close_order = CloseOrder(quote_ctx, trd_ctx, trd_env)
         self.running = False
+        self.points_dir = None
+        self._sources = {}  # {json 路徑: ((mtime_ns, 大小), 內容雜湊, [point_id])}
+        self._definitions = {}  # {point_id: 點位定義}，重新加載時比對
+        self._retired = set()  # 已從點位檔移除、保留至平倉的點位
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._watching = False
+        self.state_store = None  # PointStateStore，設定後 load_points 恢復點位運行狀態
+
+    @property
+    def points(self):
+        return self._snapshot.points
+
+    @property
+    def entry_index(self):
+        return self._snapshot.entry_index
 
     def get_market_price(self, code):
-        """獲取合約最新市場價格"""
-        try:
-            ret, data = self.quote_ctx.get_market_snapshot([code])
-            if ret == RET_OK and not data.empty:
-                price = data['last_price'][0]
-                logging.debug(f"獲取 {code} 市場價格：{price}")
-                return price
-            else:
-                logging.error(f"無法獲取 {code} 價格：{data}")
-                return None
-        except Exception as e:
-            logging.error(f"獲取 {code} 價格異常：{e}")
-            return None
+        """獲取合約最新市場價格（讀取共享報價源快取）"""
+        return self.quote_feed.get_price(code)
 
     def load_points(self, base_dir):
-        """從指定資料夾加載所有點位 JSON 文件"""
-        point_folders = ['DP1', 'DP2', 'DP3', 'DS1', 'DS2', 'DS3', 'MLP1', 'MLP2', 'MLP3', 'MLS1', 'MLS2', 'MLS3']
-        for folder in point_folders:
-            json_path = os.path.join(base_dir, folder, f"{folder}.json")
-            if os.path.exists(json_path):
+        """從指定資料夾加載所有點位檔：按 glob 模式發現點位資料夾與合併檔，解析並驗證（檔案多時以進程池）
+
+        任一點位檔格式錯誤或 point_id 重複時拋出 ValueError，不帶著不完整的點位啟動。
+        """
+        self.points_dir = base_dir
+        paths = discover_point_files(base_dir, self.point_patterns, self.points_bundle)
+        if not paths:
+            logging.warning(f"{base_dir} 沒有符合 {list(self.point_patterns)} 的點位檔")
+        started = time.perf_counter()
+        results = read_point_sources(paths, self.default_code, self.points_bundle, self.load_workers, self.process_min)
+        errors = [f"{e}" for e in results.values() if isinstance(e, Exception)]
+        owners = {}
+        for json_path, result in results.items():
+            if isinstance(result, Exception):
+                continue
+            for point_data in result[2]:
+                point_id = point_data['point_id']
+                if point_id in owners:
+                    errors.append(f"點位 {point_id} 重複定義：{owners[point_id]}、{json_path}")
+                owners[point_id] = json_path
+        if errors:
+            raise ValueError("點位檔驗證失敗：\n" + "\n".join(errors))
+        points = dict(self.points)
+        for json_path, (stat, digest, points_data) in results.items():
+            ids = []
+            for point_data in points_data:
+                point_id = point_data['point_id']
+                point = self._create_point(point_id, point_data)
+                points[point_id] = point
+                self._definitions[point_id] = point_data
+                ids.append(point_id)
+                point.logger.info(f"加載點位 {point_id} 從 {json_path}")
+                if self.state_store is not None and self.state_store.restore(point):
+                    point.logger.info(f"恢復點位 {point_id} 運行狀態：開倉 {point.trade_count} 次，已開索引 {sorted(point.opened_indices)}，持倉 {len(point.open_positions)} 筆")
+            self._sources[json_path] = (stat, digest, ids)
+        self.rebuild_index(points)
+        logging.info(f"從 {len(paths)} 個點位檔加載 {len(self.points)} 個點位，耗時 {time.perf_counter() - started:.3f} 秒")
+
+    def attach_state(self, store):
+        """設定點位運行狀態存儲並載入已保存的狀態，須在 load_points 之前調用"""
+        self.state_store = store
+        store.load()
+
+    def reconcile_positions(self):
+        """啟動對賬：恢復的點位持倉須對應仍存在的虛擬持倉，且各合約的虛擬淨持倉不超出券商淨持倉
+
+        虛擬持倉已不存在（停機期間已平倉）的點位持倉直接移除。港期每合約只報一個淨持倉，
+        故按合約比較虛擬持倉的帶方向淨數量（多為正、空為負）與券商淨數量，只移除無法解釋的差額：
+        淨多超出時從最新的多頭點位持倉開始移除，淨空超出時移除空頭。對應的虛擬持倉與觸發簿項一併移除
+        （差額小於該筆數量時只扣減差額），止盈止損監控不會為券商已平的持倉再提交反向平倉單。
+        已開索引與開倉次數保留，不會因此重新開倉。返回移除的持倉數。
+        """
+        dropped = 0
+        for point in self.points.values():
+            for pos in point.open_positions[:]:
+                order_id = pos.get('order_id')
+                if ORDER_STORE.get_virtual(order_id, open_only=False) is None and ORDER_STORE.find_pending(order_id) is None:
+                    point.drop_position(order_id)
+                    dropped += 1
+                    point.logger.warning(f"點位 {point.id} 持倉 {order_id} 已無對應虛擬持倉，對賬時移除")
+        ret, data = self.trd_ctx.position_list_query(trd_env=self.trd_env)
+        if ret != RET_OK:
+            logging.error(f"點位對賬查詢券商持倉失敗，只按虛擬持倉對賬：{data}")
+            return dropped
+        broker = {}
+        for _, row in data.iterrows():
+            sign = 1 if row['position_side'] == PositionSide.LONG else -1
+            broker[row['code']] = broker.get(row['code'], 0) + sign * int(row['qty'])
+        held = {}
+        for order in ORDER_STORE.virtual_orders():
+            sign = 1 if order.direction == 'long' else -1
+            held[order.code] = held.get(order.code, 0) + sign * order.quantity
+        positions = {}
+        for point in self.points.values():
+            for pos in point.open_positions:
+                order = ORDER_STORE.get_virtual(pos.get('order_id'))
+                if order is not None:  # 尚未成交的開倉單不計入
+                    positions.setdefault(order.code, []).append((point, pos, order))
+        for code, net in held.items():
+            residual = net - broker.get(code, 0)
+            if residual == 0:
+                continue
+            direction = 'long' if residual > 0 else 'short'
+            residual = abs(residual)
+            for point, pos, order in reversed(positions.get(code, ())):
+                if residual <= 0:
+                    break
+                if order.direction != direction:
+                    continue
+                if order.quantity > residual:
+                    # 只有部分數量無法解釋：扣減虛擬持倉，點位持倉保留
+                    order, remaining = ORDER_STORE.reduce_virtual(order.id, direction, residual)
+                    TRIGGER_BOOK.add(order)
+                    update_order_in_log(order.id, remaining)
+                    point.logger.warning(f"點位 {point.id} {direction} 持倉 {pos['order_id']} 超出券商 {code} 淨持倉 {broker.get(code, 0)}，對賬時扣減 {residual} 手")
+                    residual = 0
+                    break
+                point.drop_position(pos['order_id'])
+                ORDER_STORE.reduce_virtual(order.id, direction, order.quantity)
+                TRIGGER_BOOK.remove(order)
+                update_order_in_log(order.id, 0)
+                residual -= order.quantity
+                dropped += 1
+                point.logger.warning(f"點位 {point.id} {direction} 持倉 {pos['order_id']} 超出券商 {code} 淨持倉 {broker.get(code, 0)}，對賬時連同虛擬持倉移除")
+            if residual > 0:
+                logging.warning(f"{code} 虛擬淨持倉 {net} 與券商淨持倉 {broker.get(code, 0)} 仍相差 {residual if direction == 'long' else -residual}，非點位持倉需人工核對")
+        if dropped:
+            self.rebuild_index()
+        logging.info(f"點位持倉對賬完成：移除 {dropped} 筆")
+        return dropped
+
+    @staticmethod
+    def _file_stat(json_path):
+        stat = os.stat(json_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _create_point(self, point_id, point_data):
+        return Point(point_data, logging.getLogger(f'trade_{point_id}'), point_id)
+
+    def reload_points(self, base_dir=None):
+        """增量重新加載點位 JSON：只解析 mtime 或大小變化且內容雜湊不同的檔案，與現有點位逐個比對
+
+        定義未變的點位沿用原對象；定義變更的點位以新定義建立，並移交命中次數、開倉次數、持倉與交易記錄，
+        已開過的訂單索引只保留定義未變的訂單。從檔案中移除但仍有持倉的點位保留並停止開倉，持倉平倉後
+        下次重新加載時移除，重新加入檔案時按更新處理。新的點位表與開倉索引建好後整體替換，監控線程不會讀到半成品。
+        返回 (是否有變更, 摘要訊息)。
+        """
+        with self._reload_lock:
+            base_dir = base_dir or self.points_dir
+            if base_dir is None:
+                return False, "尚未加載點位，無法重新加載"
+            self.points_dir = base_dir
+            sources = {}
+            definitions = {}
+            changed_files = 0
+            stats = {}
+            for json_path in discover_point_files(base_dir, self.point_patterns, self.points_bundle):
                 try:
-                    with open(json_path, 'r', encoding='utf-8') as f:
-                        points_data = json.load(f)
-                    for point_data in points_data:
-                        point_id = point_data.get('point_id', folder)
-                        logger = logging.getLogger(f'trade_{point_id}')
-                        self.points[point_id] = Point(point_data, logger, point_id)
-                        logger.info(f"加載點位 {point_id} 從 {json_path}")
+                    stats[json_path] = self._file_stat(json_path)
+                except OSError:
+                    continue  # 檔案已刪除，其點位按移除處理
+            changed = [json_path for json_path, stat in stats.items()
+                       if json_path not in self._sources or self._sources[json_path][0] != stat]
+            results = read_point_sources(changed, self.default_code, self.points_bundle, self.load_workers, self.process_min)
+            for json_path in stats:
+                old = self._sources.get(json_path)
+                result = results.get(json_path)
+                if isinstance(result, Exception):
+                    # 可能正被寫入或格式錯誤，保留原點位，下次檢查時重試
+                    logging.error(f"重新加載 {json_path} 失敗，沿用現有點位：{result}")
+                    result = None
+                    if old is None:
+                        continue
+                if result is None or (old is not None and old[1] == result[1]):
+                    sources[json_path] = old if result is None else (result[0], result[1], old[2])
+                    definitions.update((point_id, self._definitions[point_id]) for point_id in old[2])
+                    continue
+                stat, digest, points_data = result
+                changed_files += 1
+                ids = []
+                for point_data in points_data:
+                    point_id = point_data['point_id']
+                    if point_id in definitions:
+                        logging.error(f"點位 {point_id} 在 {json_path} 重複定義，已忽略")
+                        continue
+                    definitions[point_id] = point_data
+                    ids.append(point_id)
+                sources[json_path] = (stat, digest, ids)
+
+            # 狀態移交與快照替換期間暫停開倉檢查，避免移交後舊點位再記錄已開索引
+            with self._trade_lock:
+                points = {}
+                added, updated, removed, retired = [], [], [], []
+                for point_id, point_data in definitions.items():
+                    current = self.points.get(point_id)
+                    if current is not None and point_id not in self._retired and self._definitions.get(point_id) == point_data:
+                        points[point_id] = current
+                        continue
+                    point = self._create_point(point_id, point_data)
+                    if current is None:
+                        added.append(point_id)
+                        point.logger.info(f"重新加載新增點位 {point_id}")
+                        if self.state_store is not None:
+                            self.state_store.restore(point)
+                    else:
+                        self._transfer_state(current, point)
+                        updated.append(point_id)
+                        point.logger.info(f"重新加載更新點位 {point_id}，沿用 {len(point.open_positions)} 筆持倉與已開索引 {sorted(point.opened_indices)}")
+                    points[point_id] = point
+                for point_id, point in self.points.items():
+                    if point_id in points:
+                        continue
+                    if point.open_positions:
+                        points[point_id] = point  # 仍有持倉，保留至平倉
+                        if point_id not in self._retired:
+                            point.allow_entry = False
+                            retired.append(point_id)
+                            point.logger.info(f"點位 {point_id} 已從點位檔移除，仍有 {len(point.open_positions)} 筆持倉，停止開倉至平倉")
+                    else:
+                        removed.append(point_id)
+                        point.logger.info(f"重新加載移除點位 {point_id}")
+
+                self._sources = sources
+                self._definitions = definitions
+                self._retired = {point_id for point_id in points if point_id not in definitions}
+                if not (added or updated or removed or retired):
+                    return False, f"點位無變更（檢查 {len(sources)} 個檔案）"
+                self._swap(points)
+            msg = (f"點位已重新加載：{changed_files} 個檔案變更，新增 {len(added)}，更新 {len(updated)}，"
+                   f"移除 {len(removed)}，停止開倉至平倉 {len(retired)}，共 {len(points)} 個點位")
+            logging.info(msg)
+            return True, msg
+
+    @staticmethod
+    def _transfer_state(old, new):
+        """把舊點位的運行狀態移交給以新定義建立的點位"""
+        new.hit_count = old.hit_count
+        new.trade_count = old.trade_count
+        new.total_quantity = old.total_quantity
+        new.total_pnl = old.total_pnl
+        new.open_positions = old.open_positions
+        new.book = old.book
+        new.trade_history = old.trade_history
+        new.quantity_limit_notified = old.quantity_limit_notified
+        new.opened_indices = {index for index in old.opened_indices
+                              if index < min(len(old.orders), len(new.orders)) and old.orders[index] == new.orders[index]}
+
+    def start_watcher(self, interval=None):
+        """啟動背景線程，每 interval 秒檢查點位檔並增量重新加載；interval <= 0 時不啟動"""
+        interval = float(load_config().get('points_reload_interval', 5) if interval is None else interval)
+        if interval <= 0 or self._watcher is not None:
+            return
+        self._watching = True
+
+        def watch():
+            while self._watching:
+                time.sleep(interval)
+                try:
+                    self.reload_points()
                 except Exception as e:
-                    logging.error(f"加載 {json_path} 失敗：{e}")
-            else:
-                logging.warning(f"JSON 文件 {json_path} 不存在，跳過")
+                    logging.error(f"點位重新加載異常：{e}")
+
+        self._watcher = threading.Thread(target=watch, daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._watching = False
+        self._watcher = None
+
+    def rebuild_index(self, points=None):
+        """點位載入或變更後重建開倉價格索引，指定 points 時同時替換點位表"""
+        with self._trade_lock:
+            self._swap(self.points if points is None else points)
+
+    def _swap(self, points):
+        """以 points 建立新的開倉價格索引與合約分組，建好後以一個 PointSet 快照替換"""
+        entry_index = EntryIndex(self.entry_index.tolerance)
+        entry_index.rebuild(points)
+        by_code = {}
+        for point in points.values():
+            by_code.setdefault(point.code, []).append(point)
+        self._snapshot = PointSet(points, entry_index, by_code)
+        logging.info(f"開倉價格索引已重建：{len(self.points)} 個點位，{len(self.entry_index)} 筆訂單，合約 {sorted(self.entry_index.codes())}")
+
+    def codes(self):
+        """返回所有點位涉及的合約"""
+        return {point.code for point in self.points.values()}
 
     def start_monitor(self):
         """啟動點位監控"""
         self.running = True
         while self.running:
-            current_price = self.get_market_price('HK.MHI2506')
-            if current_price:
-                for point_id, point in self.points.items():
-                    hit_price = point.hit_price
-                    for order in point.orders:
-                        order_index = order.get('order_index', 0)
-                        tolerance = 2.0
-                        entry_price = order.get('entry_price', 0.0)
-                        if (abs(current_price - entry_price) <= tolerance and
-                            point.can_open_position(order_index)):
-                            point.hit_limit += 1
-                            # point.logger.info(f"點位 {point_id} 觸發開倉，當前價格 {current_price}, hit_price {hit_price}, entry_price {entry_price}")
-                            self.open_position(point_id, order_index, entry_price, hit_price)
-                    point.update_pnl(current_price)
-                    for pos in point.open_positions:
-                        point.update_trailing_take_profit(pos.get('order_id'), current_price)
+            # 所有合約價格一次批量讀取
+            prices = self.quote_feed.get_prices(self.codes())
+            for code, current_price in prices.items():
+                if current_price:
+                    self.on_price(code, current_price)
             time.sleep(1)
 
+    def on_price(self, code, current_price):
+        """處理單個合約的最新價格：檢查開倉並更新該合約點位的盈虧與移動止盈"""
+        with self._trade_lock:
+            snapshot = self._snapshot  # 本筆行情只讀取一次快照
+            self._check_entries(snapshot, code, current_price)
+        for point in snapshot.by_code.get(code, ()):
+            if point.open_positions:
+                point.update_pnl(current_price)
+                point.update_trailing_take_profits(current_price)
+            else:
+                point.total_pnl = 0.0  # 無持倉時浮動盈虧為 0，略過方法調用
+
+    def check_entries(self, code, current_price):
+        """只檢查該合約開倉價格落在誤差範圍內的候選訂單"""
+        with self._trade_lock:
+            self._check_entries(self._snapshot, code, current_price)
+
+    def _check_entries(self, snapshot, code, current_price):
+        for point_id, order_index, entry_price in snapshot.entry_index.query(code, current_price):
+            point = snapshot.points.get(point_id)
+            if point is not None and point.can_open_position(order_index):
+                point.hit_limit += 1
+                LATENCY.trigger(code)
+                # point.logger.info(f"點位 {point_id} 觸發開倉，當前價格 {current_price}, hit_price {point.hit_price}, entry_price {entry_price}")
+                self._open_position(point, order_index, entry_price, point.hit_price)
+
     def open_position(self, point_id, order_index, entry_price, hit_price):
         """開倉指定點位的訂單"""
-        if point_id not in self.points:
-            logging.error(f"點位 {point_id} 不存在")
-            return False
-        point = self.points[point_id]
+        with self._trade_lock:
+            point = self.points.get(point_id)
+            if point is None:
+                logging.error("點位 %s 不存在", point_id)
+                return False
+            return self._open_position(point, order_index, entry_price, hit_price)
+
+    def _open_position(self, point, order_index, entry_price, hit_price):
+        point_id = point.id
         if not point.can_open_position(order_index):
             return False
         order = point.orders[order_index]
 
         use_trailing = (point.trade_count % 2 == 1)
-        if use_trailing:
-            point.logger.info(f"點位 {point_id} 觸發開倉，第 {point.trade_count + 1} 次開倉，開倉價 {entry_price}，使用移動止盈")
-        else:
-            point.logger.info(f"點位 {point_id} 觸發開倉，第 {point.trade_count + 1} 次開倉，開倉價 {entry_price}，使用固定止盈")
+        point.logger.info("點位 %s 觸發開倉，第 %s 次開倉，開倉價 %s，使用%s", point_id, point.trade_count + 1, entry_price,
+                          '移動止盈' if use_trailing else '固定止盈')
 
         success, msg = self.open_order.execute(
-            code='HK.MHI2506',
+            code=point.code,
             direction=order.get('direction'),
             qty=order.get('quantity', point.qty_each_time),
             price=order.get('entry_price', 0.0),
@@ -110,25 +415,25 @@ class PointManager:
     def close_position(self, point_id, order_id=None):
         """平倉指定點位或訂單"""
         if point_id not in self.points:
-            logging.error(f"點位 {point_id} 不存在")
+            logging.error("點位 %s 不存在", point_id)
             return False
         point = self.points[point_id]
         if order_id:
             for pos in point.open_positions:
                 if pos.get('order_id') == order_id:
-                    current_price = self.get_market_price('HK.MHI2505')
+                    current_price = self.get_market_price(point.code)
                     if current_price:
                         success, _, _, _, msg = self.close_order.execute(order_id, pos.get('quantity', 0), pos.get('direction', 'long'))
                         if success:
                             point.close_position(order_id, current_price)
-                            point.logger.info(f"點位 {point_id} 平倉訂單 {order_id}")
+                            point.logger.info("點位 %s 平倉訂單 %s", point_id, order_id)
                         return success
-            point.logger.error(f"點位 {point_id} 未找到訂單 {order_id}")
+            point.logger.error("點位 %s 未找到訂單 %s", point_id, order_id)
             return False
         else:
             success = True
             for pos in point.open_positions[:]:
-                current_price = self.get_market_price('HK.MHI2505')
+                current_price = self.get_market_price(point.code)
                 if current_price:
                     success &= self.close_order.execute(pos.get('order_id'), pos.get('quantity', 0), pos.get('direction', 'long'))[0]
                     if success:
@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import threading
+import time
+from ..utils import load_config
+
+class PointStateStore:
+    """點位運行狀態的快照與增量日誌
+
+    背景線程每 interval 秒比對各點位的狀態簽名，只為有變化的點位追加一行到 point_state.jsonl：
+    小型狀態整份寫入，交易記錄只寫上次保存後新增的部分。日誌累積 compact_every 筆後壓縮為
+    point_state.json 並清空。啟動時載入快照再重放日誌，供 PointManager.load_points 恢復點位。
+    壓縮時每個點位只在快照中保留最近 history_limit 筆交易記錄，更早的移到 point_state_archive.jsonl
+    （只追加、啟動時不讀取），啟動耗時不隨歷史增長。
+    """
+
+    def __init__(self, points_dir, interval=None, compact_every=None, history_limit=None):
+        config = load_config()
+        self.snapshot_path = os.path.join(points_dir, 'point_state.json')
+        self.journal_path = os.path.join(points_dir, 'point_state.jsonl')
+        self.archive_path = os.path.join(points_dir, 'point_state_archive.jsonl')
+        self.interval = float(config.get('point_state_interval', 1.0) if interval is None else interval)
+        self.compact_every = int(config.get('point_state_compact_every', 1000) if compact_every is None else compact_every)
+        self.history_limit = int(config.get('point_state_history_limit', 100) if history_limit is None else history_limit)
+        self.seq = 0
+        self._states = {}  # {point_id: {'state': 運行狀態, 'history': 最近的交易記錄}}
+        self._signatures = {}  # {point_id: 上次保存時的狀態簽名}
+        self._saved = {}  # {point_id: (交易記錄列表的 id, 已保存的長度)}
+        self._lock = threading.Lock()
+        self._file = None
+        self._since_snapshot = 0
+        self._thread = None
+        self._running = False
+        os.makedirs(points_dir, exist_ok=True)
+
+    def load(self):
+        """載入快照並重放日誌，返回 {point_id: {'state': ..., 'history': [...]}}"""
+        states = {}
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+                snapshot_seq = snapshot.get('seq', 0)
+                states = snapshot.get('points', {})
+            except (OSError, ValueError) as e:
+                logging.error(f"讀取 point_state.json 失敗：{e}")
+        self.seq = snapshot_seq
+        replayed = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        logging.warning("point_state.jsonl 末尾記錄不完整，停止重放")
+                        break
+                    if record.get('seq', 0) <= snapshot_seq:
+                        continue
+                    entry = states.setdefault(record['id'], {'state': {}, 'history': []})
+                    entry['state'] = record['state']
+                    entry['history'].extend(record.get('history', ()))
+                    self.seq = record['seq']
+                    replayed += 1
+        self._states = states
+        self._since_snapshot = replayed
+        logging.info(f"從快照（seq={snapshot_seq}）及 {replayed} 筆日誌恢復 {len(states)} 個點位的運行狀態")
+        return states
+
+    def restore(self, point):
+        """以保存的狀態恢復點位，返回是否有保存的狀態"""
+        entry = self._states.get(point.id)
+        if entry is None:
+            return False
+        point.restore_state(entry['state'], entry['history'])
+        self._signatures[point.id] = point.state_signature()
+        self._saved[point.id] = (id(point.trade_history), len(point.trade_history))
+        return True
+
+    def start(self, get_points):
+        """開啟日誌檔並啟動背景保存線程，get_points 返回當前的 {point_id: Point}"""
+        self._file = open(self.journal_path, 'a', encoding='utf-8')
+        self._running = True
+
+        def run():
+            while self._running:
+                time.sleep(self.interval)
+                try:
+                    self.flush(get_points())
+                except Exception as e:
+                    logging.error(f"保存點位運行狀態失敗：{e}")
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def flush(self, points):
+        """為狀態有變化的點位追加日誌記錄，返回寫入筆數"""
+        with self._lock:
+            if self._file is None:
+                return 0
+            written = 0
+            for point_id, point in list(points.items()):
+                signature = point.state_signature()
+                if self._signatures.get(point_id) == signature:
+                    continue
+                entry = self._states.setdefault(point_id, {'state': {}, 'history': []})
+                trades = point.trade_history
+                list_id, saved = self._saved.get(point_id, (None, 0))
+                history = trades[saved:] if list_id == id(trades) else list(trades)  # 點位重建為新對象時從頭計
+                self._saved[point_id] = (id(trades), len(trades))
+                entry['state'] = point.state()
+                entry['history'].extend(history)
+                self.seq += 1
+                record = {'seq': self.seq, 'id': point_id, 'state': entry['state']}
+                if history:
+                    record['history'] = history
+                self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+                self._signatures[point_id] = signature
+                written += 1
+            if written:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._since_snapshot += written
+            compact = self._since_snapshot >= self.compact_every
+        if compact:
+            self.compact()
+        return written
+
+    def compact(self):
+        """以全部點位的狀態寫入快照並清空日誌，超出 history_limit 的交易記錄移入歸檔"""
+        with self._lock:
+            archived = {}
+            for point_id, entry in self._states.items():
+                excess = len(entry['history']) - self.history_limit
+                if excess > 0:
+                    archived[point_id] = entry['history'][:excess]
+                    entry['history'] = entry['history'][excess:]
+            if archived:
+                with open(self.archive_path, 'a', encoding='utf-8') as f:
+                    for point_id, history in archived.items():
+                        f.write(json.dumps({'id': point_id, 'history': history}, ensure_ascii=False, separators=(',', ':')) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+            snapshot = {'seq': self.seq, 'points': self._states}
+            temp_path = self.snapshot_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.snapshot_path)
+            if self._file is not None:
+                self._file.close()
+                self._file = open(self.journal_path, 'w', encoding='utf-8')
+            self._since_snapshot = 0
+        logging.info(f"點位運行狀態已壓縮為快照：{len(snapshot['points'])} 個點位，seq={snapshot['seq']}")
+
+    def close(self, points=None):
+        """停止背景線程；提供 points 時先保存最後的變化並寫入快照"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+        if points is not None:
+            self.flush(points)
+            self.compact()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
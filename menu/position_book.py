@@ -0,0 +1,199 @@
+import math
+import numpy as np
+
+_FLOAT_COLUMNS = ('entry', 'qty', 'sign', 'stop', 'target', 'high', 'low', 'offset')
+
+class PositionBook:
+    """列式持倉表：開倉價、數量、方向符號、止損、止盈、最高/最低價與移動止盈偏移各存一個 NumPy 陣列
+
+    每行對應一筆持倉，以 key 索引並可附帶原始對象（VirtualOrder 或點位持倉字典）。刪除時以最後一行
+    填補空位，陣列前 len(self) 行始終連續。未設定的止損止盈為 NaN，與任何價格比較皆為 False。
+
+    每筆行情的計算盡量不觸及陣列：合計盈虧由 Σ(符號×數量) 與 Σ(符號×數量×開倉價) 兩個累計值得出；
+    極值與移動止盈記錄已套用到所有行的價格區間，價格仍在區間內時不可能有變化，直接返回。
+    """
+
+    def __init__(self, capacity=16):
+        self._capacity = capacity
+        for name in _FLOAT_COLUMNS:
+            setattr(self, '_' + name, np.full(capacity, np.nan))
+        self._trailing = np.zeros(capacity, dtype=bool)
+        self.keys = []
+        self.objects = []
+        self._rows = {}
+        self._changed()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def _changed(self):
+        """行或欄位變更後重算累計值並作廢價格區間"""
+        n = len(self.keys)
+        signed_qty = self._sign[:n] * self._qty[:n]
+        self._signed_qty = float(signed_qty.sum()) if n else 0.0
+        self._signed_cost = float(np.dot(signed_qty, self._entry[:n])) if n else 0.0
+        self._has_trailing = bool(self._trailing[:n].any()) if n else False
+        self._extreme_range = (math.inf, -math.inf)  # 已套用到所有行的 (最低價, 最高價)
+        self._target_range = (math.inf, -math.inf)
+        self._hit_bounds = None  # 移動止盈回撤觸發的 (多單觸發價上限, 空單觸發價下限, retrace)
+
+    def _grow(self):
+        self._capacity *= 2
+        for name in _FLOAT_COLUMNS:
+            column = getattr(self, '_' + name)
+            grown = np.full(self._capacity, np.nan)
+            grown[:len(column)] = column
+            setattr(self, '_' + name, grown)
+        trailing = np.zeros(self._capacity, dtype=bool)
+        trailing[:len(self._trailing)] = self._trailing
+        self._trailing = trailing
+
+    def add(self, key, direction, qty, entry, stop=None, target=None, trailing=False, high=None, low=None,
+            offset=None, obj=None):
+        """加入或覆蓋一行持倉"""
+        if key in self._rows:
+            self._remove(key)
+        if len(self.keys) == self._capacity:
+            self._grow()
+        row = len(self.keys)
+        self._entry[row] = entry
+        self._qty[row] = qty
+        self._sign[row] = 1.0 if direction == 'long' else -1.0
+        self._stop[row] = np.nan if stop is None else stop
+        self._target[row] = np.nan if target is None else target
+        self._high[row] = np.nan if high is None else high
+        self._low[row] = np.nan if low is None else low
+        self._offset[row] = np.nan if offset is None else offset
+        self._trailing[row] = trailing
+        self.keys.append(key)
+        self.objects.append(obj)
+        self._rows[key] = row
+        self._changed()
+        return row
+
+    def _remove(self, key):
+        row = self._rows.pop(key, None)
+        if row is None:
+            return None
+        obj = self.objects[row]
+        last = len(self.keys) - 1
+        if row != last:
+            for name in _FLOAT_COLUMNS:
+                column = getattr(self, '_' + name)
+                column[row] = column[last]
+            self._trailing[row] = self._trailing[last]
+            self.keys[row] = self.keys[last]
+            self.objects[row] = self.objects[last]
+            self._rows[self.keys[row]] = row
+        self.keys.pop()
+        self.objects.pop()
+        return obj
+
+    def remove(self, key):
+        """刪除一行，返回附帶的對象；最後一行移入空位"""
+        if key not in self._rows:
+            return None
+        obj = self._remove(key)
+        self._changed()
+        return obj
+
+    def clear(self):
+        self.keys.clear()
+        self.objects.clear()
+        self._rows.clear()
+        self._changed()
+
+    def set(self, key, **fields):
+        """更新一行的欄位（entry、qty、stop、target、high、low、offset）"""
+        row = self._rows[key]
+        for name, value in fields.items():
+            getattr(self, '_' + name)[row] = np.nan if value is None else value
+        self._changed()
+
+    def obj(self, key):
+        return self.objects[self._rows[key]]
+
+    def get(self, key, name):
+        return float(getattr(self, '_' + name)[self._rows[key]])
+
+    def column(self, name):
+        """返回有效行的欄位視圖（不複製）"""
+        return getattr(self, '_' + name)[:len(self.keys)]
+
+    def pnl(self, price):
+        """每行以 price 計算的浮動盈虧（未乘合約乘數）"""
+        n = len(self.keys)
+        return self._sign[:n] * (price - self._entry[:n]) * self._qty[:n]
+
+    def total_pnl(self, price):
+        """全部持倉的浮動盈虧合計，O(1)"""
+        return price * self._signed_qty - self._signed_cost
+
+    def update_extremes(self, price):
+        """移動止盈行：多單更新最高價，空單更新最低價；返回是否有行被更新"""
+        if not self._has_trailing:
+            return False
+        low, high = self._extreme_range
+        if low <= price <= high:
+            return False
+        n = len(self.keys)
+        trailing = self._trailing[:n]
+        sign = self._sign[:n]
+        if price > high:
+            np.fmax(self._high[:n], price, out=self._high[:n], where=trailing & (sign > 0))
+        if price < low:
+            np.fmin(self._low[:n], price, out=self._low[:n], where=trailing & (sign < 0))
+        self._extreme_range = (min(low, price), max(high, price))
+        self._hit_bounds = None
+        return True
+
+    def trailing_hits(self, price, retrace):
+        """返回自極值回撤達 retrace 的移動止盈行號；價格未越過任何一行的觸發價時不觸及陣列"""
+        if not self._has_trailing:
+            return ()
+        bounds = self._hit_bounds
+        if bounds is None or bounds[2] != retrace:
+            n = len(self.keys)
+            trailing = self._trailing[:n]
+            sign = self._sign[:n]
+            longs = self._high[:n][trailing & (sign > 0)]
+            shorts = self._low[:n][trailing & (sign < 0)]
+            long_bound = float(np.nanmax(longs)) - retrace if longs.size and not np.isnan(longs).all() else -math.inf
+            short_bound = float(np.nanmin(shorts)) + retrace if shorts.size and not np.isnan(shorts).all() else math.inf
+            bounds = self._hit_bounds = (long_bound, short_bound, retrace)
+        if bounds[0] < price < bounds[1]:
+            return ()
+        n = len(self.keys)
+        sign = self._sign[:n]
+        hit = np.where(sign > 0, price <= self._high[:n] - retrace, price >= self._low[:n] + retrace)
+        return (hit & self._trailing[:n]).nonzero()[0].tolist()
+
+    def stop_hits(self, price):
+        n = len(self.keys)
+        sign = self._sign[:n]
+        return np.where(sign > 0, price <= self._stop[:n], price >= self._stop[:n])
+
+    def target_hits(self, price):
+        n = len(self.keys)
+        sign = self._sign[:n]
+        return np.where(sign > 0, price >= self._target[:n], price <= self._target[:n])
+
+    def trail_targets(self, price):
+        """移動止盈行把止盈移至 price ∓ offset（只朝有利方向移動），返回被更新的行號"""
+        if not self._has_trailing:
+            return ()
+        low, high = self._target_range
+        if low <= price <= high:
+            return ()
+        n = len(self.keys)
+        sign = self._sign[:n]
+        candidate = price - sign * self._offset[:n]
+        improved = self._trailing[:n] & (sign * (candidate - self._target[:n]) > 0)
+        rows = improved.nonzero()[0]
+        if rows.size:
+            self._target[rows] = candidate[rows]
+        self._target_range = (min(low, price), max(high, price))
+        return rows.tolist()
@@ -0,0 +1,158 @@
+from futu import *
+from futu.common.constant import RET_OK
+import logging
+import threading
+import time
+from .utils import load_config
+from .latency import LATENCY
+
+class _QuotePushHandler(StockQuoteHandlerBase):
+    """接收報價推送並寫入共享價格快取"""
+
+    def __init__(self, feed):
+        super().__init__()
+        self.feed = feed
+
+    def on_recv_rsp(self, rsp_pb):
+        ret, data = super().on_recv_rsp(rsp_pb)
+        if ret != RET_OK:
+            logging.error(f"報價推送異常：{data}")
+            return ret, data
+        for code, price in zip(data['code'], data['last_price']):
+            self.feed.update_price(code, price)
+        return RET_OK, data
+
+class _TickerPushHandler(TickerHandlerBase):
+    """接收逐筆推送並寫入共享價格快取"""
+
+    def __init__(self, feed):
+        super().__init__()
+        self.feed = feed
+
+    def on_recv_rsp(self, rsp_pb):
+        ret, data = super().on_recv_rsp(rsp_pb)
+        if ret != RET_OK:
+            logging.error(f"逐筆推送異常：{data}")
+            return ret, data
+        # 逐筆按時間排序，最後一筆為最新成交價
+        for code, price in zip(data['code'], data['price']):
+            self.feed.update_price(code, price)
+        return RET_OK, data
+
+class QuoteFeed:
+    """共享報價源：每個合約只訂閱一次推送，所有元件從帶時間戳的價格快取讀價"""
+
+    def __init__(self, quote_ctx):
+        config = load_config()
+        self.quote_ctx = quote_ctx
+        self.max_age = float(config.get('quote_max_age', 5))  # 快取價格最長有效秒數，過期則回退快照
+        self._lock = threading.Lock()
+        self._prices = {}  # {code: (price, monotonic_timestamp)}
+        self._subscribed = set()
+        self._handlers_ready = False
+        self._listeners = []  # 價格更新回調 fn(code, price)
+        self.clock = time.monotonic  # 快取時間戳來源，回測時替換為虛擬時鐘
+
+    def subscribe(self, codes):
+        """訂閱合約報價與逐筆推送，已訂閱的合約不重複訂閱"""
+        with self._lock:
+            new_codes = [code for code in codes if code not in self._subscribed]
+            if not new_codes:
+                return True
+            self._subscribed.update(new_codes)
+            if not self._handlers_ready:
+                self.quote_ctx.set_handler(_QuotePushHandler(self))
+                self.quote_ctx.set_handler(_TickerPushHandler(self))
+                self._handlers_ready = True
+        try:
+            ret, data = self.quote_ctx.subscribe(new_codes, [SubType.QUOTE, SubType.TICKER])
+            if ret == RET_OK:
+                logging.info(f"已訂閱報價推送：{new_codes}")
+                return True
+            logging.error(f"訂閱 {new_codes} 報價失敗，改用快照：{data}")
+        except Exception as e:
+            logging.error(f"訂閱 {new_codes} 報價異常，改用快照：{e}")
+        with self._lock:
+            self._subscribed.difference_update(new_codes)
+        return False
+
+    def add_listener(self, callback):
+        """註冊價格更新回調 callback(code, price)，在推送線程中調用，應盡快返回"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """移除價格更新回調"""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def update_price(self, code, price, timestamp=None):
+        """寫入最新價格並通知回調"""
+        if price is None:
+            return
+        price = float(price)
+        with self._lock:
+            self._prices[code] = (price, timestamp if timestamp is not None else self.clock())
+        LATENCY.quote(code)
+        for callback in self._listeners:
+            try:
+                callback(code, price)
+            except Exception as e:
+                logging.error(f"價格回調異常：{e}")
+
+    def get_cached(self, code):
+        """返回 (價格, 時間戳)，無快取時返回 (None, None)"""
+        with self._lock:
+            return self._prices.get(code, (None, None))
+
+    def get_price(self, code):
+        """獲取合約最新價格，優先使用推送快取，過期或未推送時回退快照"""
+        return self.get_prices([code]).get(code)
+
+    def get_prices(self, codes):
+        """批量獲取多個合約價格，快取缺失的合約合併為一次快照請求"""
+        now = self.clock()
+        prices = {}
+        missing = []
+        with self._lock:
+            for code in codes:
+                entry = self._prices.get(code)
+                if entry and now - entry[1] <= self.max_age:
+                    prices[code] = entry[0]
+                else:
+                    missing.append(code)
+            unsubscribed = [code for code in missing if code not in self._subscribed]
+        if unsubscribed:
+            self.subscribe(unsubscribed)
+        if missing:
+            prices.update(self._fetch_snapshot(missing))
+        return prices
+
+    def _fetch_snapshot(self, codes):
+        """以單次 get_market_snapshot 請求獲取價格並更新快取"""
+        try:
+            ret, data = self.quote_ctx.get_market_snapshot(list(codes))
+            if ret == RET_OK and not data.empty:
+                prices = {}
+                for code, price in zip(data['code'], data['last_price']):
+                    self.update_price(code, price)
+                    prices[code] = float(price)
+                logging.debug("快照獲取 %s 市場價格：%s", codes, prices)
+                return prices
+            else:
+                logging.error(f"無法獲取 {list(codes)} 價格：{data}")
+                return {}
+        except Exception as e:
+            logging.error(f"獲取 {list(codes)} 價格異常：{e}")
+            return {}
+
+_FEEDS = {}
+_FEEDS_LOCK = threading.Lock()
+
+def get_quote_feed(quote_ctx):
+    """返回與 quote_ctx 綁定的共享報價源，同一連線的所有元件共用一個實例"""
+    with _FEEDS_LOCK:
+        feed = _FEEDS.get(id(quote_ctx))
+        if feed is None or feed.quote_ctx is not quote_ctx:
+            feed = QuoteFeed(quote_ctx)
+            _FEEDS[id(quote_ctx)] = feed
+        return feed
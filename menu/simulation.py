@@ -0,0 +1,157 @@
+from futu import *
+from futu.common.constant import RET_OK, RET_ERROR
+import heapq
+import itertools
+import pandas as pd
+
+class SimClock:
+    """虛擬時鐘，時間由回放的行情驅動"""
+
+    def __init__(self, start=0.0):
+        self.now = float(start)
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def advance_to(self, timestamp):
+        if timestamp > self.now:
+            self.now = float(timestamp)
+
+class SimExchange:
+    """模擬撮合：限價買單在價格 <= 限價時成交，限價賣單在價格 >= 限價時成交，成交價為限價
+
+    新訂單不在下單調用中成交，而是在下一次 match() 時撮合，保證調用方已登記待成交訂單。
+    成交或取消通過 on_status(order_id, status) 回調通知。
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.last_prices = {}  # {code: price}
+        self.orders = {}  # {order_id: 訂單字典}
+        self._buys = {}  # {code: [(-price, seq, order_id)]}
+        self._sells = {}  # {code: [(price, seq, order_id)]}
+        self._ids = itertools.count(1)
+        self.on_status = None
+        self.fill_count = 0
+
+    def place(self, code, trd_side, qty, price):
+        order_id = str(next(self._ids))
+        self.orders[order_id] = {
+            'order_id': order_id, 'code': code, 'trd_side': trd_side, 'qty': qty, 'price': float(price),
+            'order_status': OrderStatus.SUBMITTED, 'dealt_qty': 0, 'dealt_avg_price': 0.0,
+            'create_time': self.clock.time(), 'updated_time': self.clock.time()
+        }
+        seq = int(order_id)
+        if trd_side == TrdSide.BUY:
+            heapq.heappush(self._buys.setdefault(code, []), (-float(price), seq, order_id))
+        else:
+            heapq.heappush(self._sells.setdefault(code, []), (float(price), seq, order_id))
+        return order_id
+
+    def cancel(self, order_id):
+        order = self.orders.get(order_id)
+        if order is None or order['order_status'] != OrderStatus.SUBMITTED:
+            return False
+        self._set_status(order, OrderStatus.CANCELLED_ALL)
+        return True
+
+    def reject(self, order_id):
+        """交易所拒單：尚未成交的訂單標記為失敗"""
+        order = self.orders.get(order_id)
+        if order is None or order['order_status'] != OrderStatus.SUBMITTED:
+            return False
+        self._set_status(order, OrderStatus.FAILED)
+        return True
+
+    def _set_status(self, order, status):
+        order['order_status'] = status
+        order['updated_time'] = self.clock.time()
+        if status == OrderStatus.FILLED_ALL:
+            order['dealt_qty'] = order['qty']
+            order['dealt_avg_price'] = order['price']
+            self.fill_count += 1
+        if self.on_status is not None:
+            self.on_status(order['order_id'], status)
+
+    def match(self, code, price):
+        """以最新價撮合該合約的掛單"""
+        self.last_prices[code] = price
+        buys = self._buys.get(code)
+        while buys and -buys[0][0] >= price:
+            _, _, order_id = heapq.heappop(buys)
+            order = self.orders[order_id]
+            if order['order_status'] == OrderStatus.SUBMITTED:
+                self._set_status(order, OrderStatus.FILLED_ALL)
+        sells = self._sells.get(code)
+        while sells and sells[0][0] <= price:
+            _, _, order_id = heapq.heappop(sells)
+            order = self.orders[order_id]
+            if order['order_status'] == OrderStatus.SUBMITTED:
+                self._set_status(order, OrderStatus.FILLED_ALL)
+
+class SimQuoteContext:
+    """模擬 OpenQuoteContext：快照讀取撮合引擎的最新價，訂閱與推送由回放引擎直接寫入報價源"""
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self.handlers = []
+
+    def set_handler(self, handler):
+        self.handlers.append(handler)
+        return RET_OK
+
+    def subscribe(self, code_list, subtype_list, **kwargs):
+        return RET_OK, None
+
+    def get_market_snapshot(self, code_list):
+        codes = [code for code in code_list if code in self.exchange.last_prices]
+        if not codes:
+            return RET_ERROR, f"無 {list(code_list)} 的行情"
+        return RET_OK, pd.DataFrame({'code': codes, 'last_price': [self.exchange.last_prices[code] for code in codes]})
+
+    def close(self):
+        pass
+
+class SimTradeContext:
+    """模擬 OpenFutureTradeContext：下單、撤單與查詢均由 SimExchange 處理"""
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self.handlers = []
+
+    def set_handler(self, handler):
+        self.handlers.append(handler)
+        return RET_OK
+
+    def place_order(self, price, qty, code, trd_side, trd_env=TrdEnv.SIMULATE, order_type=OrderType.NORMAL, **kwargs):
+        order_id = self.exchange.place(code, trd_side, qty, price)
+        return RET_OK, pd.DataFrame({'order_id': [order_id], 'code': [code], 'qty': [qty], 'price': [price]})
+
+    def modify_order(self, modify_order_op, order_id, qty, price, trd_env=TrdEnv.SIMULATE, **kwargs):
+        if modify_order_op == ModifyOrderOp.CANCEL and self.exchange.cancel(order_id):
+            return RET_OK, pd.DataFrame({'order_id': [order_id]})
+        return RET_ERROR, f"無法修改訂單 {order_id}"
+
+    def order_list_query(self, order_id='', trd_env=TrdEnv.SIMULATE, **kwargs):
+        orders = [self.exchange.orders[order_id]] if order_id else list(self.exchange.orders.values())
+        orders = [order for order in orders if order is not None]
+        return RET_OK, pd.DataFrame(orders, columns=['order_id', 'code', 'trd_side', 'qty', 'price', 'order_status',
+                                                     'dealt_qty', 'dealt_avg_price', 'create_time', 'updated_time'])
+
+    def position_list_query(self, trd_env=TrdEnv.SIMULATE, **kwargs):
+        positions = {}
+        for order in self.exchange.orders.values():
+            if order['order_status'] == OrderStatus.FILLED_ALL:
+                sign = 1 if order['trd_side'] == TrdSide.BUY else -1
+                positions[order['code']] = positions.get(order['code'], 0) + sign * order['qty']
+        return RET_OK, pd.DataFrame({
+            'code': list(positions),
+            'qty': [abs(qty) for qty in positions.values()],
+            'position_side': [PositionSide.LONG if qty >= 0 else PositionSide.SHORT for qty in positions.values()]
+        })
+
+    def close(self):
+        pass
@@ -0,0 +1,142 @@
+import collections
+import logging
+import os
+import struct
+import threading
+import time
+import numpy as np
+from .utils import load_config
+
+TICK_DTYPE = np.dtype([('time', '<i8'), ('price', '<f8')])  # 接收時間（納秒 Unix 時間）、價格
+_MAGIC = b'FUTUTICK'
+_VERSION = 1
+HEADER_SIZE = 16  # 魔數 8 位元組 + 版本 + 記錄長度，與記錄同為 16 位元組對齊
+
+def default_tick_dir():
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    while base_dir.endswith('menu'):
+        base_dir = os.path.dirname(base_dir)
+    return os.path.join(base_dir, load_config().get('tick_record_dir', 'ticks'))
+
+def tick_path(root, code, day):
+    """錄製檔路徑：<root>/<合約>/<YYYYMMDD>.ticks"""
+    return os.path.join(root, code, f'{day}.ticks')
+
+def list_tick_files(root, code=None):
+    """返回錄製檔路徑，按合約與日期排序"""
+    if not os.path.isdir(root):
+        return []
+    codes = [code] if code else sorted(os.listdir(root))
+    paths = []
+    for name in codes:
+        code_dir = os.path.join(root, name)
+        if os.path.isdir(code_dir):
+            paths.extend(os.path.join(code_dir, f) for f in sorted(os.listdir(code_dir)) if f.endswith('.ticks'))
+    return paths
+
+def read_ticks(path):
+    """以唯讀 memmap 打開錄製檔，返回 TICK_DTYPE 結構化陣列（不複製）；寫入中斷留下的不完整記錄忽略"""
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE or header[:8] != _MAGIC:
+        raise ValueError(f"{path} 不是逐筆錄製檔")
+    version, itemsize = struct.unpack('<II', header[8:])
+    if version != _VERSION or itemsize != TICK_DTYPE.itemsize:
+        raise ValueError(f"{path} 版本 {version} 或記錄長度 {itemsize} 不受支持")
+    count = (os.path.getsize(path) - HEADER_SIZE) // TICK_DTYPE.itemsize
+    if count <= 0:
+        return np.empty(0, dtype=TICK_DTYPE)
+    return np.memmap(path, dtype=TICK_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+
+class TickRecorder:
+    """逐筆錄製：記錄報價源實際看到的每個價格，按合約與日期追加寫入定長二進制檔
+
+    作為 QuoteFeed 的價格回調，推送線程中只做一次 deque 追加；背景線程每 flush_interval 秒
+    把緩衝按合約轉為 NumPy 結構化陣列整塊寫入。每筆 16 位元組（納秒時間 + 價格），
+    以 read_ticks() 記憶體映射讀取。
+    """
+
+    def __init__(self, root=None, flush_interval=None, max_buffer=1_000_000):
+        config = load_config()
+        self.root = root or default_tick_dir()
+        self.flush_interval = float(config.get('tick_flush_interval', 1.0) if flush_interval is None else flush_interval)
+        self.max_buffer = max_buffer
+        self.recorded = 0
+        self.dropped = 0
+        self._buffer = collections.deque()
+        self._files = {}  # {(code, day): 檔案}
+        self._day = (0, 0, None)  # (當日開始納秒, 次日開始納秒, YYYYMMDD)
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, code, price):
+        """QuoteFeed 回調：以接收時間記錄一筆價格"""
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1  # 寫入跟不上時丟棄，不阻塞推送線程
+            return
+        self._buffer.append((code, time.time_ns(), price))
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止背景線程，寫完緩衝並關閉檔案"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+        with self._flush_lock:
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"寫入逐筆錄製檔失敗：{e}")
+
+    def _day_of(self, ns):
+        start, end, day = self._day
+        if not start <= ns < end:
+            local = time.localtime(ns / 1e9)
+            day = time.strftime('%Y%m%d', local)
+            midnight = time.mktime((local.tm_year, local.tm_mon, local.tm_mday, 0, 0, 0, 0, 0, -1))
+            start = int(midnight * 1e9)
+            end = int(time.mktime((local.tm_year, local.tm_mon, local.tm_mday + 1, 0, 0, 0, 0, 0, -1)) * 1e9)
+            self._day = (start, end, day)
+        return day
+
+    def _file(self, code, day):
+        f = self._files.get((code, day))
+        if f is None:
+            for key in [key for key in self._files if key[0] == code]:
+                self._files.pop(key).close()  # 跨日後關閉前一日的檔案
+            path = tick_path(self.root, code, day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            f = open(path, 'ab')
+            if f.tell() == 0:
+                f.write(_MAGIC + struct.pack('<II', _VERSION, TICK_DTYPE.itemsize))
+            self._files[(code, day)] = f
+        return f
+
+    def flush(self):
+        """把緩衝中的記錄寫入檔案"""
+        with self._flush_lock:
+            batches = {}
+            buffer = self._buffer
+            for _ in range(len(buffer)):
+                code, ns, price = buffer.popleft()
+                batches.setdefault((code, self._day_of(ns)), []).append((ns, price))
+            for (code, day), rows in batches.items():
+                f = self._file(code, day)
+                f.write(np.array(rows, dtype=TICK_DTYPE).tobytes())
+                f.flush()
+                self.recorded += len(rows)
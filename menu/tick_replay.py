@@ -0,0 +1,196 @@
+import logging
+import os
+from datetime import datetime
+import numpy as np
+from .tick_recorder import default_tick_dir, list_tick_files, read_ticks
+
+_CHUNK = 65536  # 轉為 Python 浮點數時每批的筆數，限制臨時記憶體
+
+def to_ns(value):
+    """時間參數轉為納秒 Unix 時間：數字視為秒，字串按本地時間 ISO 格式解析"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        value = value.timestamp()
+    return int(round(float(value) * 1e9))
+
+class _Contract:
+    """單一合約的錄製檔：按日期排序的 memmap 段、各段在合約內的起始行號與稀疏時間索引"""
+
+    __slots__ = ('code', 'segments', 'offsets', 'index_times', 'index_rows')
+
+    def __init__(self, code, segments, index_step):
+        self.code = code
+        self.segments = segments
+        lengths = [len(segment) for segment in segments]
+        self.offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        # 每段自第 0 行起每 index_step 行取一個時間，索引塊不跨段；步進讀取只觸及對應頁面
+        times, rows = [], []
+        for segment, offset in zip(segments, self.offsets):
+            local = np.arange(0, len(segment), index_step, dtype=np.int64)
+            times.append(np.asarray(segment['time'][::index_step], dtype=np.int64))
+            rows.append(local + offset)
+        self.index_times = np.concatenate(times) if times else np.empty(0, dtype=np.int64)
+        self.index_rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+
+    @property
+    def total(self):
+        return int(self.offsets[-1])
+
+    def segment_of(self, row):
+        return int(np.searchsorted(self.offsets, row, 'right')) - 1
+
+class TickStore:
+    """逐筆錄製檔的記憶體映射讀取器
+
+    打開 tick_recorder 錄製的目錄（<root>/<合約>/<YYYYMMDD>.ticks），每個檔案以唯讀 memmap 映射，
+    不載入內容。每合約記錄各檔在合約內的起始行號，並每 index_step 筆取一個時間作稀疏索引：
+    按時間定位時先在記憶體中的索引二分，再只在一個索引塊內二分，只觸及少量頁面。
+    views() 返回 memmap 的切片，不複製數據。時間參數可為秒數、datetime 或 ISO 字串。
+    """
+
+    def __init__(self, root=None, index_step=4096):
+        self.root = root or default_tick_dir()
+        self.index_step = index_step
+        self._contracts = {}
+        files = {}
+        for path in list_tick_files(self.root):
+            files.setdefault(os.path.basename(os.path.dirname(path)), []).append(path)
+        for code, paths in files.items():
+            segments = []
+            for path in paths:
+                try:
+                    ticks = read_ticks(path)
+                except (OSError, ValueError) as e:
+                    logging.warning(f"略過無法讀取的錄製檔 {path}：{e}")
+                    continue
+                if len(ticks):
+                    segments.append(ticks)
+            if segments:
+                self._contracts[code] = _Contract(code, segments, index_step)
+
+    def codes(self):
+        return sorted(self._contracts)
+
+    def __contains__(self, code):
+        return code in self._contracts
+
+    def __len__(self):
+        return sum(contract.total for contract in self._contracts.values())
+
+    def _contract(self, code):
+        contract = self._contracts.get(code)
+        if contract is None:
+            raise KeyError(f"{self.root} 沒有 {code} 的錄製檔")
+        return contract
+
+    def span(self, code=None):
+        """返回合約（未指定時為全部合約）首筆與末筆的時間（秒）"""
+        contracts = [self._contract(code)] if code else list(self._contracts.values())
+        if not contracts:
+            return None, None
+        first = min(int(contract.segments[0]['time'][0]) for contract in contracts)
+        last = max(int(contract.segments[-1]['time'][-1]) for contract in contracts)
+        return first / 1e9, last / 1e9
+
+    def _search(self, contract, ns, side='left'):
+        """返回合約內第一筆時間 >= ns（side='right' 時 > ns）的行號"""
+        k = int(np.searchsorted(contract.index_times, ns, side))
+        if k == 0:
+            return 0
+        lo = int(contract.index_rows[k - 1])
+        segment = contract.segment_of(lo)
+        base = int(contract.offsets[segment])
+        end = min(lo + self.index_step, int(contract.offsets[segment + 1]))
+        times = contract.segments[segment]['time'][lo - base:end - base]
+        return lo + int(np.searchsorted(times, ns, side))
+
+    def rows(self, code, start=None, end=None):
+        """返回時間窗口 [start, end) 在合約內的行號範圍"""
+        contract = self._contract(code)
+        first = 0 if start is None else self._search(contract, to_ns(start))
+        last = contract.total if end is None else self._search(contract, to_ns(end))
+        return first, max(first, last)
+
+    def views(self, code, start=None, end=None):
+        """按時間順序返回窗口 [start, end) 內各錄製檔的 TICK_DTYPE 視圖（不複製）"""
+        contract = self._contract(code)
+        first, last = self.rows(code, start, end)
+        views = []
+        for segment, offset in zip(contract.segments, contract.offsets.tolist()):
+            lo = max(first - offset, 0)
+            hi = min(last - offset, len(segment))
+            if lo < hi:
+                views.append(segment[lo:hi])
+        return views
+
+    def count(self, code, start=None, end=None):
+        first, last = self.rows(code, start, end)
+        return last - first
+
+    def price_at(self, code, when):
+        """返回 when 當時（含）最後一筆價格，之前沒有記錄時返回 None"""
+        contract = self._contract(code)
+        row = self._search(contract, to_ns(when), 'right') - 1
+        if row < 0:
+            return None
+        segment = contract.segment_of(row)
+        return float(contract.segments[segment]['price'][row - int(contract.offsets[segment])])
+
+    def load(self, codes=None, start=None, end=None):
+        """合併多個合約窗口內的記錄，返回與 backtest.load_ticks 相同的 (時間戳秒數組, 合約列表, 價格數組)"""
+        codes = codes or self.codes()
+        times, names, prices = [], [], []
+        for code in codes:
+            for view in self.views(code, start, end):
+                times.append(view['time'])
+                prices.append(view['price'])
+                names.append(np.full(len(view), code, dtype=object))
+        if not times:
+            return np.empty(0), np.empty(0, dtype=object), np.empty(0)
+        times = np.concatenate(times)
+        order = np.argsort(times, kind='stable')
+        return times[order] / 1e9, np.concatenate(names)[order], np.concatenate(prices)[order]
+
+    def path(self, code, start=None, end=None, step=None):
+        """返回合約價格的迭代器，可直接作為 MockOpenD.set_path 的價格路徑
+
+        未指定 step 時逐筆返回每個錄製價格；指定 step（秒）時按錄製時間每 step 秒取樣一次，
+        模擬 OpenD 每個 tick_interval 推進一步即以 step / tick_interval 倍速回放。
+        取樣格點自 start（預設為首筆時間）起每 step 一個，每個格點返回該格點之前一個 step 內的最後價格；
+        格點內沒有記錄（休市、午休等長於 step 的空檔）時不輸出，直接跳到下一筆記錄所在的格點。
+        """
+        views = self.views(code, start, end)
+        if not views:
+            return iter(())
+        if step is None:
+            return self._iter_prices(views)
+        origin = to_ns(start) if start is not None else int(views[0]['time'][0])
+        return self._iter_sampled(views, origin, max(int(step * 1e9), 1))
+
+    @staticmethod
+    def _iter_prices(views):
+        for view in views:
+            for i in range(0, len(view), _CHUNK):
+                yield from view['price'][i:i + _CHUNK].tolist()
+
+    @staticmethod
+    def _iter_sampled(views, origin, step_ns):
+        # 每筆記錄歸入第一個 >= 其時間的格點，每個格點取最後一筆；格點可能跨越分塊或錄製檔，
+        # 各分塊的最後一個格點暫存，下一塊首個格點不同時才輸出
+        last_bucket, last_price = None, None
+        for view in views:
+            for i in range(0, len(view), _CHUNK):
+                chunk = view[i:i + _CHUNK]
+                buckets = -((origin - np.asarray(chunk['time'], dtype=np.int64)) // step_ns)
+                ends = np.append(np.flatnonzero(np.diff(buckets)), len(buckets) - 1)
+                groups = buckets[ends].tolist()
+                prices = chunk['price'][ends].tolist()
+                if last_bucket is not None and last_bucket != groups[0]:
+                    yield last_price
+                yield from prices[:-1]
+                last_bucket, last_price = groups[-1], prices[-1]
+        if last_bucket is not None:
+            yield last_price
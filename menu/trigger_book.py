@@ -0,0 +1,154 @@
+import heapq
+import threading
+from .position_book import PositionBook
+
+TRAILING_RETRACE = 100  # 移動止盈回撤點數
+
+class TriggerBook:
+    """按合約分組的止盈止損觸發簿
+
+    每個合約維護四個堆：多單止損、多單止盈、空單止損、空單止盈，堆頂為最先觸發的價格，
+    每次價格更新只彈出已被穿越的訂單，複雜度 O(k log n)。移除採用延遲刪除：
+    訂單重新加入或移除時序號失效，舊堆項在彈出時丟棄。移動止盈訂單的極值每筆行情都要更新，
+    按合約存於列式的 PositionBook，以陣列運算更新極值並判斷回撤；極值在觸發、移除或 sync_extremes() 時回寫到訂單。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._books = {}  # {code: {'long_sl': [], 'long_tp': [], 'short_sl': [], 'short_tp': []}}
+        self._trailing = {}  # {code: PositionBook} 移動止盈訂單的極值
+        self._live = {}  # {key: (seq, order)}
+        self._seq = 0
+
+    @staticmethod
+    def _key(order):
+        return order.id, order.direction
+
+    def add(self, order):
+        """加入或重新加入訂單，舊的堆項自動失效"""
+        key = self._key(order)
+        code = order.code
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            self._live[key] = (seq, order)
+            book = self._books.setdefault(code, {'long_sl': [], 'long_tp': [], 'short_sl': [], 'short_tp': []})
+            stop_loss = order.stop_loss
+            take_profit = order.take_profit
+            # 堆頂為最接近觸發的價格：多單止損取最高、多單止盈取最低，空單相反
+            if order.direction == 'long':
+                if stop_loss is not None:
+                    heapq.heappush(book['long_sl'], (-stop_loss, seq, key))
+                if take_profit is not None:
+                    heapq.heappush(book['long_tp'], (take_profit, seq, key))
+            else:
+                if stop_loss is not None:
+                    heapq.heappush(book['short_sl'], (stop_loss, seq, key))
+                if take_profit is not None:
+                    heapq.heappush(book['short_tp'], (-take_profit, seq, key))
+            self._drop_trailing(code, key)  # 重新加入前先回寫舊行的極值
+            trailing = self._trailing.setdefault(code, PositionBook())
+            if order.use_trailing:
+                trailing.add(key, order.direction, order.quantity, order.entry_price, trailing=True,
+                             high=order.highest_price, low=order.lowest_price, obj=order)
+            if sum(len(heap) for heap in book.values()) > 4 * len(self._live) + 64:
+                self._compact(book)
+
+    def _compact(self, book):
+        """清除堆中已失效的項，避免延遲刪除的殘留無限增長"""
+        for name, heap in book.items():
+            heap[:] = [entry for entry in heap if self._live.get(entry[2], (None,))[0] == entry[1]]
+            heapq.heapify(heap)
+
+    def clear(self):
+        """清空觸發簿"""
+        with self._lock:
+            self._books.clear()
+            self._trailing.clear()
+            self._live.clear()
+
+    def _drop_trailing(self, code, key):
+        """從移動止盈表移除並把極值回寫到訂單"""
+        trailing = self._trailing.get(code)
+        if trailing is None or key not in trailing:
+            return
+        self._write_back(trailing, key)
+        trailing.remove(key)
+
+    @staticmethod
+    def _write_back(trailing, key):
+        order = trailing.obj(key)
+        high, low = trailing.get(key, 'high'), trailing.get(key, 'low')
+        if high == high:
+            order.highest_price = high
+        if low == low:
+            order.lowest_price = low
+
+    def sync_extremes(self):
+        """把所有移動止盈訂單的最新極值回寫到訂單（保存持倉前調用）"""
+        with self._lock:
+            for trailing in self._trailing.values():
+                for key in trailing.keys:
+                    self._write_back(trailing, key)
+
+    def remove(self, order):
+        """移除訂單，堆中殘留項延遲丟棄"""
+        key = self._key(order)
+        with self._lock:
+            if self._live.pop(key, None) is not None:
+                self._drop_trailing(order.code, key)
+
+    def codes(self):
+        """返回有在監控訂單的合約"""
+        with self._lock:
+            return {order.code for _, order in self._live.values()}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._live)
+
+    def _pop_crossed(self, heap, limit, triggered, kind):
+        """彈出堆頂鍵值不大於 limit 的有效訂單"""
+        while heap and heap[0][0] <= limit:
+            _, seq, key = heapq.heappop(heap)
+            live = self._live.get(key)
+            if live is None or live[0] != seq:
+                continue
+            del self._live[key]
+            self._drop_trailing(live[1].code, key)
+            triggered.append((live[1], kind))
+
+    def pop_triggered(self, code, current_price):
+        """返回並移除在 current_price 觸發的訂單列表 [(order, kind)]
+
+        kind 為 'trailing'、'stop_loss' 或 'take_profit'。移動止盈訂單同時在此更新價格極值。
+        """
+        triggered = []
+        with self._lock:
+            trailing = self._trailing.get(code)
+            if trailing is not None and trailing.keys:
+                trailing.update_extremes(current_price)
+                for key in [trailing.keys[row] for row in trailing.trailing_hits(current_price, TRAILING_RETRACE)]:
+                    order = trailing.obj(key)
+                    self._drop_trailing(code, key)
+                    del self._live[key]
+                    triggered.append((order, 'trailing'))
+
+            book = self._books.get(code)
+            if book:
+                # 先比較堆頂，多數行情沒有穿越任何觸發價，不進入 _pop_crossed
+                heap = book['long_sl']
+                if heap and heap[0][0] <= -current_price:
+                    self._pop_crossed(heap, -current_price, triggered, 'stop_loss')
+                heap = book['short_sl']
+                if heap and heap[0][0] <= current_price:
+                    self._pop_crossed(heap, current_price, triggered, 'stop_loss')
+                heap = book['long_tp']
+                if heap and heap[0][0] <= current_price:
+                    self._pop_crossed(heap, current_price, triggered, 'take_profit')
+                heap = book['short_tp']
+                if heap and heap[0][0] <= -current_price:
+                    self._pop_crossed(heap, -current_price, triggered, 'take_profit')
+        return triggered
+
+TRIGGER_BOOK = TriggerBook()  # 全局觸發簿，與 ORDER_STORE 的虛擬持倉同步
@@ -1,17 +1,14 @@
 import json
 import logging
 import os
-import shutil
-import re
-import retrying
 import csv
-from datetime import datetime
 from futu import *
+from .order_store import ORDER_STORE, VirtualOrder
+from .trigger_book import TRIGGER_BOOK
+from .order_ledger import ORDER_LEDGER
+from .log_pipeline import LogPipeline, BatchingFileHandler, PointLogRouter, POINT_LOGGER_PREFIX, exclude_point_logs
 
-# 全局變數
-PENDING_ORDERS = {}  # 待成交訂單：{futu_order_id: order_info}
-VIRTUAL_ORDERS = []  # 開倉記錄：[{order_info}]
-CLOSING_ORDERS = set()  # 正在平倉的訂單 ID
+# 全局變數（訂單狀態見 order_store.ORDER_STORE）
 TRAILING_THRESHOLD = 100  # 預設移動止盈閾值
 FIXED_THRESHOLD = 100  # 預設固定止盈止損閾值
 
@@ -22,7 +19,50 @@ def load_config():
         'port': 11111,
         'trd_env': TrdEnv.SIMULATE,
         'trailing_threshold': 100,
-        'fixed_threshold': 100
+        'fixed_threshold': 100,
+        'quote_max_age': 5,
+        'reconcile_interval': 5,
+        'point_code': 'HK.MHI2506',
+        'run_mode': 'thread',
+        'async_workers': 4,
+        'journal_fsync_batch': 32,
+        'journal_fsync_interval': 0.5,
+        'journal_compact_every': 1000,
+        'async_logging': True,
+        'log_batch_size': 64,
+        'log_flush_interval': 1.0,
+        'mock_start_price': 23000,
+        'mock_tick_interval': 0.5,
+        'mock_fill_latency': 0.05,
+        'mock_reject_rate': 0.0,
+        'latency_enabled': True,
+        'latency_dump_interval': 60,
+        'close_all_netting': False,
+        'close_all_workers': 4,
+        'aggregate_closes': True,
+        'gateway_enabled': True,
+        'gateway_place_limit': 15,
+        'gateway_entry_reserve': 5,
+        'gateway_modify_limit': 20,
+        'gateway_window': 30,
+        'gateway_min_interval': 0.02,
+        'gateway_max_retries': 3,
+        'gateway_retry_backoff': 0.5,
+        'gateway_timeout': 60,
+        'tick_record_enabled': True,
+        'tick_record_dir': 'ticks',
+        'tick_flush_interval': 1.0,
+        'replay_speed': 1.0,
+        'points_reload_interval': 5,
+        'point_state_enabled': True,
+        'point_state_interval': 1.0,
+        'point_state_compact_every': 1000,
+        'point_state_history_limit': 100,
+        'point_patterns': ['*/*.json'],
+        'points_bundle': 'points_bundle.json',
+        'points_load_workers': 8,
+        'points_process_min_files': 1000,
+        'point_history_closed_limit': 1000
     }
     try:
         base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -51,61 +91,96 @@ def load_config():
         logging.error(f"載入 config.json 失敗：{e}，使用預設配置")
         return default_config
 
+_LOG_PIPELINE = None
+
 def setup_logging():
-    """設置日誌，輸出到 trade.log 和控制台"""
+    """設置日誌，輸出到 trade.log 和控制台；async_logging 啟用時經隊列由背景線程寫入"""
+    global _LOG_PIPELINE
+    config = load_config()
     base_dir = os.path.dirname(os.path.abspath(__file__))
     while base_dir.endswith('menu'):
         base_dir = os.path.dirname(base_dir)
     log_path = os.path.join(base_dir, 'trade.log')
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_path, encoding='utf-8'),
-            logging.StreamHandler()
-        ]
-    )
+    formatter = logging.Formatter('%(asctime)s - %(message)s')
+    batch_size = int(config.get('log_batch_size', 64))
+    flush_interval = float(config.get('log_flush_interval', 1.0))
+    if config.get('async_logging', True):
+        file_handler = BatchingFileHandler(log_path, batch_size, flush_interval)
+    else:
+        file_handler = logging.FileHandler(log_path, encoding='utf-8')
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+        exclude_point_logs(handler)
+    point_router = PointLogRouter(os.path.join(base_dir, 'points'), batch_size, flush_interval)
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    point_logger = logging.getLogger(POINT_LOGGER_PREFIX.rstrip('.'))
+    point_logger.propagate = False
+    if config.get('async_logging', True):
+        _LOG_PIPELINE = LogPipeline([file_handler, stream_handler, point_router], flush_interval)
+        root.handlers = [_LOG_PIPELINE.queue_handler]
+        point_logger.handlers = [_LOG_PIPELINE.queue_handler]
+        _LOG_PIPELINE.start()
+    else:
+        root.handlers = [file_handler, stream_handler]
+        point_logger.handlers = [point_router]
 
-def save_virtual_orders_to_csv():
-    """將尚未平倉的虛擬訂單保存到 virtual_orders.csv"""
+def shutdown_logging():
+    """寫完日誌隊列中的記錄並關閉輸出"""
+    global _LOG_PIPELINE
+    if _LOG_PIPELINE is not None:
+        logging.getLogger().handlers = []
+        logging.getLogger(POINT_LOGGER_PREFIX.rstrip('.')).handlers = []
+        _LOG_PIPELINE.stop()
+        _LOG_PIPELINE = None
+    else:
+        logging.shutdown()
+
+def save_virtual_orders_to_csv(csv_file=None):
+    """將尚未平倉的虛擬訂單保存到 virtual_orders.csv（可指定其他路徑）"""
     try:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        while base_dir.endswith('menu'):
-            base_dir = os.path.dirname(base_dir)
-        csv_file = os.path.join(base_dir, 'virtual_orders.csv')
+        if csv_file is None:
+            base_dir = os.path.dirname(os.path.abspath(__file__))
+            while base_dir.endswith('menu'):
+                base_dir = os.path.dirname(base_dir)
+            csv_file = os.path.join(base_dir, 'virtual_orders.csv')
         if not os.access(os.path.dirname(csv_file) or '.', os.W_OK):
             logging.error("沒有寫入 virtual_orders.csv 的權限，請檢查目錄權限或以管理員身份運行")
             return
+        TRIGGER_BOOK.sync_extremes()
         with open(csv_file, 'w', newline='', encoding='utf-8') as f:
             fieldnames = ['id', 'code', 'direction', 'quantity', 'entry_price', 'is_open', 'stop_loss', 'take_profit', 'highest_price', 'lowest_price', 'is_closing']
             writer = csv.DictWriter(f, fieldnames=fieldnames)
             writer.writeheader()
-            for order in VIRTUAL_ORDERS:
-                if order['is_open'] and order['quantity'] > 0:
-                    writer.writerow({
-                        'id': order['id'],
-                        'code': order['code'],
-                        'direction': order['direction'],
-                        'quantity': order['quantity'],
-                        'entry_price': order['entry_price'],
-                        'is_open': order['is_open'],
-                        'stop_loss': order.get('stop_loss', ''),
-                        'take_profit': order.get('take_profit', ''),
-                        'highest_price': order.get('highest_price', ''),
-                        'lowest_price': order.get('lowest_price', ''),
-                        'is_closing': order.get('is_closing', False)
-                    })
-        logging.info(f"成功保存 {sum(1 for o in VIRTUAL_ORDERS if o['is_open'] and o['quantity'] > 0)} 筆虛擬訂單到 virtual_orders.csv")
+            orders = ORDER_STORE.virtual_orders()
+            for order in orders:
+                writer.writerow({
+                    'id': order.id,
+                    'code': order.code,
+                    'direction': order.direction,
+                    'quantity': order.quantity,
+                    'entry_price': order.entry_price,
+                    'is_open': order.is_open,
+                    'stop_loss': order.stop_loss if order.stop_loss is not None else '',
+                    'take_profit': order.take_profit if order.take_profit is not None else '',
+                    'highest_price': order.highest_price if order.highest_price is not None else '',
+                    'lowest_price': order.lowest_price if order.lowest_price is not None else '',
+                    'is_closing': order.is_closing
+                })
+        logging.info(f"成功保存 {len(orders)} 筆虛擬訂單到 virtual_orders.csv")
     except Exception as e:
         logging.error(f"保存 virtual_orders.csv 失敗：{e}")
 
-def load_virtual_orders_from_csv():
-    """從 virtual_orders.csv 載入虛擬訂單到 VIRTUAL_ORDERS"""
+def load_virtual_orders_from_csv(csv_file=None):
+    """從 virtual_orders.csv（可指定其他路徑）載入虛擬訂單，返回 VirtualOrder 列表"""
     try:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        while base_dir.endswith('menu'):
-            base_dir = os.path.dirname(base_dir)
-        csv_file = os.path.join(base_dir, 'virtual_orders.csv')
+        if csv_file is None:
+            base_dir = os.path.dirname(os.path.abspath(__file__))
+            while base_dir.endswith('menu'):
+                base_dir = os.path.dirname(base_dir)
+            csv_file = os.path.join(base_dir, 'virtual_orders.csv')
         if not os.path.exists(csv_file):
             logging.info("virtual_orders.csv 不存在，啟動時無虛擬訂單")
             return []
@@ -114,19 +189,19 @@ def load_virtual_orders_from_csv():
             reader = csv.DictReader(f)
             for row in reader:
                 try:
-                    order = {
-                        'id': row['id'],
-                        'code': row['code'],
-                        'direction': row['direction'],
-                        'quantity': int(row['quantity']),
-                        'entry_price': float(row['entry_price']),
-                        'is_open': row['is_open'].lower() == 'true',
-                        'stop_loss': float(row['stop_loss']) if row.get('stop_loss') and row['stop_loss'] else None,
-                        'take_profit': float(row['take_profit']) if row.get('take_profit') and row['take_profit'] else None,
-                        'highest_price': float(row['highest_price']) if row.get('highest_price') and row['highest_price'] else None,
-                        'lowest_price': float(row['lowest_price']) if row.get('lowest_price') and row['lowest_price'] else None,
-                        'is_closing': row.get('is_closing', 'false').lower() == 'true'
-                    }
+                    order = VirtualOrder(
+                        id=row['id'],
+                        code=row['code'],
+                        direction=row['direction'],
+                        quantity=int(row['quantity']),
+                        entry_price=float(row['entry_price']),
+                        is_open=row['is_open'].lower() == 'true',
+                        stop_loss=float(row['stop_loss']) if row.get('stop_loss') and row['stop_loss'] else None,
+                        take_profit=float(row['take_profit']) if row.get('take_profit') and row['take_profit'] else None,
+                        highest_price=float(row['highest_price']) if row.get('highest_price') and row['highest_price'] else None,
+                        lowest_price=float(row['lowest_price']) if row.get('lowest_price') and row['lowest_price'] else None,
+                        is_closing=row.get('is_closing', 'false').lower() == 'true'
+                    )
                     orders.append(order)
                 except (KeyError, ValueError) as e:
                     logging.error(f"解析 virtual_orders.csv 行失敗，跳過：{row}，錯誤：{e}")
@@ -137,50 +212,15 @@ def load_virtual_orders_from_csv():
         return []
 
 def append_open_order_to_log(order_id, code, direction, qty, price):
-    """將開倉訂單成交記錄追加到 open_orders.log"""
+    """將開倉訂單成交記錄寫入開倉台帳（open_orders.db），退出時匯出為 open_orders.log"""
     try:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        while base_dir.endswith('menu'):
-            base_dir = os.path.dirname(base_dir)
-        log_path = os.path.join(base_dir, 'open_orders.log')
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]
-        direction_text = '多' if direction.lower() == 'long' else '空'
-        log_line = f"{timestamp} ID: {order_id} 提交訂單：合約={code}, 方向={direction_text}, 數量={qty}, 價格={price}\n"
-        with open(log_path, 'a', encoding='utf-8') as f:
-            f.write(log_line)
+        ORDER_LEDGER.record_open(order_id, code, direction, qty, price)
     except Exception as e:
-        logging.error(f"寫入 open_orders.log 失敗，訂單ID={order_id}：{e}")
+        logging.error(f"寫入開倉台帳失敗，訂單ID={order_id}：{e}")
 
-@retrying.retry(stop_max_attempt_number=3, wait_fixed=1000)
 def update_order_in_log(order_id, remaining_qty):
-    """更新或移除 open_orders.log 中指定訂單的數量"""
+    """按訂單 ID 更新或移除開倉台帳中的數量，僅入隊，不阻塞調用線程"""
     try:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        while base_dir.endswith('menu'):
-            base_dir = os.path.dirname(base_dir)
-        log_path = os.path.join(base_dir, 'open_orders.log')
-        temp_file = os.path.join(base_dir, 'open_orders_temp.log')
-        log_updated = False
-        if not os.path.exists(log_path):
-            logging.warning(f"open_orders.log 不存在，無需更新訂單 {order_id}")
-            return
-        with open(log_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        with open(temp_file, 'w', encoding='utf-8') as f:
-            for line in lines:
-                if f"ID: {order_id} " in line:
-                    if remaining_qty > 0:
-                        updated_line = re.sub(r'數量=\d+', f'數量={remaining_qty}', line)
-                        f.write(updated_line)
-                    log_updated = True
-                else:
-                    f.write(line)
-        if not log_updated:
-            logging.warning(f"open_orders.log 中未找到訂單 {order_id} 的記錄")
-        if not os.access(os.path.dirname(temp_file) or '.', os.W_OK):
-            logging.error("沒有寫入 open_orders.log 的權限，請檢查目錄權限或以管理員身份運行")
-            raise PermissionError("沒有寫入 open_orders.log 的權限")
-        shutil.move(temp_file, log_path)
+        ORDER_LEDGER.record_close(order_id, remaining_qty)
     except Exception as e:
-        logging.error(f"更新 open_orders.log 中訂單 {order_id} 失敗：{e}")
-        raise
\ No newline at end of file
+        logging.error(f"更新開倉台帳中訂單 {order_id} 失敗：{e}")
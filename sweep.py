@@ -0,0 +1,48 @@
+import argparse
+import logging
+import numpy as np
+from menu.backtest import load_ticks
+from menu.param_sweep import PARAM_NAMES, load_levels, make_grid, sweep
+
+'''
+參數掃描：python sweep.py HSI_2024.csv HSI_json/HSI_Prediction_20250606.json \
+            --tolerance 5:40:5 --decay 0.5,0.6,0.7,0.8 --tp-fixed 20:120:10 --qty 1,2 --limits 4,6,10 --workers 4
+候選值可寫成逗號列表或 起:止:步長（不含終點）。
+'''
+
+def parse_values(text):
+    """解析 "1,2,3" 或 "start:stop:step" 形式的候選值"""
+    if ':' in text:
+        start, stop, step = (float(part) for part in text.split(':'))
+        return np.arange(start, stop, step).round(10).tolist()
+    return [float(part) for part in text.split(',')]
+
+def main():
+    parser = argparse.ArgumentParser(description='以歷史價格向量化掃描點位階梯參數')
+    parser.add_argument('ticks', help='逐筆或 K 線數據檔（.csv 或 .parquet）')
+    parser.add_argument('prediction', help='generate_point_jsons.py 使用的預測 JSON')
+    parser.add_argument('--code', default=None, help='只使用指定合約的行情')
+    parser.add_argument('--tolerance', default='5,10,15,20')
+    parser.add_argument('--decay', default='0.7')
+    parser.add_argument('--tp-fixed', dest='tp_fixed', default='20,30,50,80')
+    parser.add_argument('--qty', default='1')
+    parser.add_argument('--limits', default='5,10')
+    parser.add_argument('--workers', type=int, default=1, help='並行進程數')
+    parser.add_argument('--top', type=int, default=20, help='顯示盈虧最高的組合數')
+    parser.add_argument('--out', default=None, help='輸出全部結果 CSV')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    _, codes, prices = load_ticks(args.ticks, args.code or 'UNKNOWN')
+    if args.code:
+        prices = prices[codes == args.code]
+    hits, sides = load_levels(args.prediction)
+    grid = make_grid(**{name: parse_values(getattr(args, name)) for name in PARAM_NAMES})
+    result = sweep(prices, grid, hits, sides, workers=args.workers)
+    print(result.head(args.top).to_string(index=False))
+    if args.out:
+        result.to_csv(args.out, index=False)
+        print(f"掃描結果已寫入 {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import json
+import numpy as np
+from menu.backtest import Backtester
+from menu.latency import LATENCY
+
+def test_run_restores_latency_setting(tmp_path):
+    point_dir = tmp_path / 'P1'
+    point_dir.mkdir()
+    orders = [{'entry_price': 20000.0, 'direction': 'long', 'quantity': 1, 'stop_loss': 19990.0, 'take_profit': 20010.0}]
+    (point_dir / 'P1.json').write_text(json.dumps([{'point_id': 'P1', 'code': 'HK.MHImain', 'orders': orders}]))
+    prices = np.array([20005.0, 20000.0, 20004.0, 20011.0])
+    previous = LATENCY.enabled
+    LATENCY.enabled = True
+    try:
+        result = Backtester(str(tmp_path), code='HK.MHImain').run(np.arange(len(prices), dtype=float),
+                                                                  np.full(len(prices), 'HK.MHImain', dtype=object), prices)
+        assert LATENCY.enabled
+        assert result.opens == 1 and len(result.trades) == 1
+    finally:
+        LATENCY.enabled = previous
@@ -0,0 +1,45 @@
+from futu import OrderStatus, TrdEnv
+from futu.common.constant import RET_OK
+from menu.cancel_order import CancelOrder
+from menu.order_gateway import get_order_gateway
+from menu.order_store import ORDER_STORE, PendingOrder, VirtualOrder
+from menu.order_tracker import OrderTracker
+from menu.simulation import SimClock, SimExchange, SimQuoteContext
+from menu.trigger_book import TRIGGER_BOOK
+
+CODE = 'HK.MHImain'
+
+class _CancelContext:
+    def __init__(self):
+        self.cancelled = []
+
+    def modify_order(self, modify_order_op, order_id, qty, price, trd_env=None, **kwargs):
+        self.cancelled.append(order_id)
+        return RET_OK, None
+
+def test_cancel_aggregated_close_restores_every_constituent():
+    ORDER_STORE.clear()
+    TRIGGER_BOOK.clear()
+    try:
+        orders = [VirtualOrder(f'HSI-00{i}', CODE, 'long', 1, 20000.0, stop_loss=19900.0) for i in (1, 2)]
+        for order in orders:
+            ORDER_STORE.add_virtual(order)
+            assert ORDER_STORE.mark_closing(order)
+        ORDER_STORE.add_pending(PendingOrder('F1', 'HSI-001', CODE, 'long', 2, 19900.0, order_type='close',
+                                             constituents=[('HSI-001', 1, 20000.0), ('HSI-002', 1, 20000.0)]))
+        trd_ctx = _CancelContext()
+        get_order_gateway(trd_ctx, enabled=False)
+        success, msg = CancelOrder(trd_ctx, TrdEnv.SIMULATE).execute('HSI-001')
+        assert success and 'HSI-002' in msg
+        assert trd_ctx.cancelled == ['F1']
+        assert ORDER_STORE.get_pending('F1') is not None  # 等待取消推送
+
+        tracker = OrderTracker(SimQuoteContext(SimExchange(SimClock())), trd_ctx, TrdEnv.SIMULATE, None, persist=False)
+        tracker.process_order('F1', OrderStatus.CANCELLED_ALL)
+        assert ORDER_STORE.get_pending('F1') is None
+        for order in orders:
+            assert not ORDER_STORE.is_closing(order.id) and not order.is_closing
+        assert len(TRIGGER_BOOK) == 2
+    finally:
+        ORDER_STORE.clear()
+        TRIGGER_BOOK.clear()
@@ -0,0 +1,32 @@
+import random
+from menu.points.entry_index import EntryIndex
+from menu.points.point import Point
+
+def _point(point_id, code, prices):
+    orders = [{'order_index': i, 'entry_price': price, 'direction': 'long', 'quantity': 1} for i, price in enumerate(prices)]
+    return Point({'point_id': point_id, 'code': code, 'orders': orders}, None, point_id)
+
+def _linear(points, code, price, tolerance):
+    return sorted((point_id, order['order_index'], float(order['entry_price']))
+                  for point_id, point in points.items() if point.code == code
+                  for order in point.orders if abs(float(order['entry_price']) - price) <= tolerance)
+
+def test_query_matches_linear_scan():
+    rng = random.Random(7)
+    points = {f'P{i}': _point(f'P{i}', rng.choice(['HK.A', 'HK.B']), [rng.randint(19900, 20100) + rng.choice([0, 0.5])
+                                                                    for _ in range(10)])
+              for i in range(30)}
+    index = EntryIndex(tolerance=2.0)
+    index.rebuild(points)
+    assert len(index) == 300 and index.codes() == {'HK.A', 'HK.B'}
+    for _ in range(500):
+        code = rng.choice(['HK.A', 'HK.B', 'HK.C'])
+        price = rng.randint(19890, 20110) + rng.choice([0, 0.5, 0.25])
+        assert sorted(index.query(code, price)) == _linear(points, code, price, 2.0)
+
+def test_range_bounds_are_inclusive():
+    index = EntryIndex(tolerance=2.0)
+    index.rebuild({'P': _point('P', 'HK.A', [100.0, 102.0, 104.5])})
+    assert [entry[2] for entry in index.query('HK.A', 102.0)] == [100.0, 102.0]
+    assert [entry[2] for entry in index.query('HK.A', 102.5)] == [102.0, 104.5]
+    assert index.query('HK.A', 97.9) == []
@@ -0,0 +1,33 @@
+import threading
+import time
+from futu.common.constant import RET_OK
+from menu.order_gateway import OrderGateway, PRIORITY_ENTRY, PRIORITY_STOP_LOSS
+
+class _FakeTradeContext:
+    def __init__(self):
+        self.sent = []
+
+    def place_order(self, **kwargs):
+        self.sent.append((time.monotonic(), kwargs['remark']))
+        return RET_OK, kwargs['remark']
+
+def test_stop_loss_not_starved_by_entry_burst():
+    ctx = _FakeTradeContext()
+    gateway = OrderGateway(ctx, enabled=True)
+    place_limit = gateway.limiters['place'].limit
+    entries = [threading.Thread(target=gateway.place_order, kwargs={'priority': PRIORITY_ENTRY, 'remark': f'entry-{i}'}, daemon=True)
+               for i in range(place_limit)]
+    for thread in entries:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while len(ctx.sent) < gateway.entry_limiter.limit and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.1)
+    assert len(ctx.sent) == gateway.entry_limiter.limit  # 開倉用完自己的額度後停住
+
+    started = time.monotonic()
+    ret, data = gateway.place_order(priority=PRIORITY_STOP_LOSS, remark='stop-loss')
+    assert ret == RET_OK and data == 'stop-loss'
+    assert time.monotonic() - started < 0.5
+    assert ctx.sent[-1][1] == 'stop-loss'
+    gateway.stop()
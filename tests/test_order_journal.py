@@ -0,0 +1,54 @@
+import os
+from menu.order_journal import OrderJournal
+from menu.order_store import OrderStore, VirtualOrder
+
+def _store(tmp_path, compact_every=1000):
+    journal = OrderJournal(str(tmp_path), fsync_interval=60, compact_every=compact_every)
+    journal.open()
+    store = OrderStore()
+    store.attach_journal(journal)
+    return store, journal
+
+def _state(orders):
+    return sorted((o.id, o.code, o.direction, o.quantity, o.entry_price, o.is_open) for o in orders)
+
+def _apply_events(store):
+    store.add_virtual(VirtualOrder('A', 'HK.MHImain', 'long', 3, 20000, stop_loss=19900))
+    store.add_virtual(VirtualOrder('B', 'HK.MHImain', 'short', 2, 20100, use_trailing=True))
+    store.add_virtual(VirtualOrder('C', 'HK.HHImain', 'long', 1, 7000))
+    store.reduce_virtual('A', 'long', 1)
+    store.reduce_virtual('C', 'long', 1)
+    store.get_virtual('B').is_open = False
+    store.restore_virtual('B', lowest_price=20050)
+
+def test_recover_without_files_returns_none(tmp_path):
+    assert OrderJournal(str(tmp_path)).recover() is None
+
+def test_recover_replays_journal(tmp_path):
+    store, journal = _store(tmp_path)
+    _apply_events(store)
+    journal.close()
+    recovered = OrderJournal(str(tmp_path)).recover()
+    assert _state(recovered) == _state(store.virtual_orders())
+    assert _state(recovered) == [('A', 'HK.MHImain', 'long', 2, 20000, True),
+                                 ('B', 'HK.MHImain', 'short', 2, 20100, True)]
+    assert next(o for o in recovered if o.id == 'B').lowest_price == 20050
+
+def test_compaction_round_trip(tmp_path):
+    store, journal = _store(tmp_path, compact_every=2)
+    _apply_events(store)
+    store.add_virtual(VirtualOrder('D', 'HK.MHImain', 'long', 4, 20200))  # 壓縮後寫入日誌的記錄
+    journal.close()
+    assert os.path.exists(journal.snapshot_path)
+    with open(journal.journal_path, encoding='utf-8') as f:
+        assert len(f.readlines()) < 8
+    recovered = OrderJournal(str(tmp_path)).recover()
+    assert _state(recovered) == _state(store.virtual_orders())
+
+def test_recover_ignores_truncated_tail(tmp_path):
+    store, journal = _store(tmp_path)
+    _apply_events(store)
+    journal.close()
+    with open(journal.journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"seq": 99, "event": "clo')
+    assert _state(OrderJournal(str(tmp_path)).recover()) == _state(store.virtual_orders())
@@ -0,0 +1,38 @@
+import os
+from menu.order_ledger import OrderLedger
+
+def _rows(ledger):
+    return [(order_id, code, direction, qty, price) for order_id, _, code, direction, qty, price in ledger.open_orders()]
+
+def test_open_close_persist_across_reopen(tmp_path):
+    ledger = OrderLedger(str(tmp_path))
+    ledger.start()
+    ledger.record_open('A', 'HK.MHImain', 'LONG', 3, 20000)
+    ledger.record_open('B', 'HK.MHImain', 'short', 2, 20100)
+    ledger.record_open('C', 'HK.HHImain', 'long', 1, 7000)
+    ledger.record_close('A', 1)
+    ledger.record_close('C', 0)
+    ledger.close()
+    assert os.path.exists(ledger.log_path)
+
+    reopened = OrderLedger(str(tmp_path))
+    reopened.start()
+    try:
+        assert _rows(reopened) == [('A', 'HK.MHImain', 'long', 1, 20000.0), ('B', 'HK.MHImain', 'short', 2, 20100.0)]
+        reopened.record_close('B', 0)
+        assert _rows(reopened) == [('A', 'HK.MHImain', 'long', 1, 20000.0)]
+    finally:
+        reopened.close()
+
+def test_imports_exported_log_into_empty_db(tmp_path):
+    ledger = OrderLedger(str(tmp_path))
+    ledger.record_open('A', 'HK.MHImain', 'long', 2, 20000)
+    ledger.close()
+    os.remove(ledger.db_path)
+
+    imported = OrderLedger(str(tmp_path))
+    imported.start()
+    try:
+        assert _rows(imported) == [('A', 'HK.MHImain', 'long', 2, 20000.0)]
+    finally:
+        imported.close()
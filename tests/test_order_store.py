@@ -0,0 +1,22 @@
+from menu.order_store import OrderStore, PendingOrder
+
+def test_status_before_add_pending_is_replayed():
+    store = OrderStore()
+    replayed = []
+    store.on_early_status = lambda order_id, status: replayed.append((order_id, status))
+    store.defer_status('F1', 'FILLED_ALL')
+    store.add_pending(PendingOrder('F1', 'HSI-001', 'HK.MHImain', 'BUY', 1, 20000))
+    store.add_pending(PendingOrder('F2', 'HSI-002', 'HK.MHImain', 'BUY', 1, 20000))
+    assert replayed == [('F1', 'FILLED_ALL')]
+    assert store.get_pending('F1') is not None
+
+def test_expired_status_is_dropped():
+    store = OrderStore()
+    store.early_ttl = -1
+    replayed = []
+    store.on_early_status = lambda order_id, status: replayed.append((order_id, status))
+    store.defer_status('F1', 'CANCELLED_ALL')
+    store.defer_status('F2', 'CANCELLED_ALL')
+    assert 'F1' not in store._early
+    store.add_pending(PendingOrder('F2', 'HSI-002', 'HK.MHImain', 'BUY', 1, 20000))
+    assert replayed == []
@@ -0,0 +1,58 @@
+import numpy as np
+from menu.param_sweep import CONTRACT_MULTIPLIER, ENTRY_TOLERANCE, PricePath, evaluate, make_grid
+
+def _first(prices, start, condition):
+    for i in range(start, len(prices)):
+        if condition(prices[i]):
+            return i
+    return None
+
+def _brute_force(prices, grid, hits, sides):
+    """逐筆掃描價格的參考實現"""
+    rows = []
+    for tolerance, decay, tp_fixed, qty, limits in grid:
+        touches = fills = closes = wins = 0
+        realized = unrealized = 0.0
+        closed = []
+        for hit, side in zip(hits, sides):
+            for step in range(int(np.floor(limits / qty))):
+                entry = np.round(hit + side * tolerance * decay ** step)
+                stop_loss, take_profit = np.round(hit - side * tp_fixed), np.round(hit + side * tp_fixed)
+                if (take_profit - entry) * side <= 0 or (entry - stop_loss) * side <= 0:
+                    continue
+                touched = _first(prices, 0, lambda p: abs(p - entry) <= ENTRY_TOLERANCE)
+                if touched is None:
+                    continue
+                touches += 1
+                filled = _first(prices, touched, lambda p: (p - entry) * side <= 0)
+                if filled is None:
+                    continue
+                fills += 1
+                exit_at = _first(prices, filled + 1, lambda p: (p - stop_loss) * side <= 0 or (p - take_profit) * side >= 0)
+                pnl = ((prices[-1] if exit_at is None else prices[exit_at]) - entry) * side * qty * CONTRACT_MULTIPLIER
+                if exit_at is None:
+                    unrealized += pnl
+                else:
+                    closes += 1
+                    wins += pnl > 0
+                    realized += pnl
+                    closed.append((exit_at, pnl))
+        equity = peak = drawdown = 0.0
+        for _, pnl in sorted(closed, key=lambda item: item[0]):
+            equity += pnl
+            peak = max(peak, equity)
+            drawdown = max(drawdown, peak - equity)
+        rows.append((touches, fills, closes, wins / closes if closes else 0.0, realized, unrealized, drawdown))
+    return np.array(rows)
+
+def test_evaluate_matches_brute_force():
+    rng = np.random.default_rng(7)
+    prices = 20000 + np.cumsum(rng.integers(-6, 7, size=800)).astype(np.float64)
+    hits = np.array([prices.min() + 15, prices.max() - 15, np.median(prices), prices.max() + 100])  # 最後一個點位從未命中
+    sides = np.array([-1, 1, -1, 1], dtype=np.int8)
+    grid = make_grid(tolerance=[4, 10], decay=[0.5, 1.0], tp_fixed=[20, 200], qty=[1, 2], limits=[2, 3])
+    frame = evaluate(PricePath(prices), grid, hits, sides)
+    columns = ['hits', 'fills', 'closes', 'win_rate', 'realized_pnl', 'unrealized_pnl', 'max_drawdown']
+    expected = _brute_force(prices, grid, hits, sides)
+    assert expected[:, 2].sum() > 0 and expected[:, 5].any()  # 同時覆蓋已平倉與期末浮動盈虧
+    np.testing.assert_allclose(frame[columns].to_numpy(dtype=np.float64), expected)
@@ -0,0 +1,26 @@
+from menu.points.point_history import PointHistory
+
+def test_partial_close_decrements_open_entry(tmp_path):
+    history = PointHistory(str(tmp_path))
+    history.record_open('HSI-001', 'HK.MHImain', 'long', 3, 20000.0)
+    history.record_close('HSI-001', 1, 20010.0, pnl=100.0)
+    assert history.open_entries['HSI-001']['quantity'] == 2
+    history.record_close('HSI-001', 2, 20020.0, pnl=400.0)
+    assert history.open_entries == {}
+    history.close()
+
+    reloaded = PointHistory(str(tmp_path))
+    assert reloaded.open_entries == {}
+    assert [(trade['quantity'], trade['entry_price'], trade['pnl']) for trade in reloaded.closed_trades()] == \
+        [(1, 20000.0, 100.0), (2, 20000.0, 400.0)]
+    reloaded.close()
+
+def test_closed_trades_capped_in_memory(tmp_path):
+    history = PointHistory(str(tmp_path), closed_limit=3)
+    for i in range(5):
+        history.record_open(f'HSI-00{i}', 'HK.MHImain', 'long', 1, 20000.0)
+        history.record_close(f'HSI-00{i}', 1, 20010.0, pnl=100.0)
+    assert [trade['order_id'] for trade in history.closed_trades()] == ['HSI-002', 'HSI-003', 'HSI-004']
+    history.close()
+    with open(history.path, encoding='utf-8') as f:
+        assert sum(1 for _ in f) == 10  # 檔案保留完整記錄
@@ -0,0 +1,66 @@
+import json
+import pytest
+from futu import TrdEnv
+from menu.order_gateway import get_order_gateway
+from menu.points.point_loader import discover_point_files, read_point_source, read_point_sources
+from menu.points.point_manager import PointManager
+from menu.simulation import SimClock, SimExchange, SimQuoteContext, SimTradeContext
+
+CODE = 'HK.MHImain'
+ORDER = {'entry_price': 20000.0, 'direction': 'long', 'quantity': 1}
+
+def _write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content if isinstance(content, str) else json.dumps(content))
+    return str(path)
+
+def _manager():
+    exchange = SimExchange(SimClock())
+    trd_ctx = SimTradeContext(exchange)
+    get_order_gateway(trd_ctx, enabled=False)
+    return PointManager(SimQuoteContext(exchange), trd_ctx, TrdEnv.SIMULATE, 1)
+
+def test_defaults_are_filled(tmp_path):
+    path = _write(tmp_path / 'P1' / 'P1.json', [{'orders': [dict(ORDER), dict(ORDER, entry_price=19990.0)]}])
+    _, _, points = read_point_source(path, CODE)
+    assert points[0]['point_id'] == 'P1' and points[0]['code'] == CODE
+    assert [order['order_index'] for order in points[0]['orders']] == [0, 1]
+
+@pytest.mark.parametrize('content', [
+    '[{"point_id": "P1", "orders": [',  # JSON 不完整
+    '{"point_id": "P1"}',  # 不是點位列表
+    [{'point_id': 'P1'}],  # 缺少 orders
+    [{'point_id': 'P1', 'hit_limit': -1, 'orders': []}],
+    [{'point_id': 'P1', 'allow_entry': 1, 'orders': []}],
+    [{'point_id': 'P1', 'orders': [dict(ORDER, direction='up')]}],
+    [{'point_id': 'P1', 'orders': [dict(ORDER, quantity=0)]}],
+    [{'point_id': 'P1', 'orders': [dict(ORDER, entry_price='20000')]}],
+    [{'point_id': 'P1', 'orders': [dict(ORDER, order_index=1)]}],
+])
+def test_malformed_file_raises_value_error(tmp_path, content):
+    path = _write(tmp_path / 'P1' / 'P1.json', content)
+    with pytest.raises(ValueError):
+        read_point_source(path, CODE)
+    assert isinstance(read_point_sources([path], CODE)[path], ValueError)
+
+def test_bundle_points_require_point_id(tmp_path):
+    path = _write(tmp_path / 'points_bundle.json', {'points': [{'orders': [ORDER]}]})
+    assert discover_point_files(str(tmp_path), bundle='points_bundle.json') == [path]
+    with pytest.raises(ValueError):
+        read_point_source(path, CODE, bundle='points_bundle.json')
+
+def test_load_points_rejects_duplicate_point_id(tmp_path):
+    _write(tmp_path / 'A' / 'A.json', [{'point_id': 'P1', 'orders': [ORDER]}])
+    _write(tmp_path / 'points_bundle.json', {'points': [{'point_id': 'P1', 'orders': [ORDER]}]})
+    manager = _manager()
+    with pytest.raises(ValueError, match='P1'):
+        manager.load_points(str(tmp_path))
+    assert manager.points == {}
+
+def test_load_points_rejects_malformed_file(tmp_path):
+    _write(tmp_path / 'A' / 'A.json', [{'point_id': 'A', 'orders': [ORDER]}])
+    _write(tmp_path / 'B' / 'B.json', '[{')
+    manager = _manager()
+    with pytest.raises(ValueError, match='B.json'):
+        manager.load_points(str(tmp_path))
+    assert manager.points == {}  # 不帶著部分點位啟動
@@ -0,0 +1,21 @@
+import json
+import os
+from menu.points import point_logger
+from menu.points.point_loader import discover_point_files
+
+def test_default_points_dir_is_project_root():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    assert point_logger.default_points_dir() == os.path.join(root, 'points')
+
+def test_history_written_next_to_point_json(tmp_path):
+    point_dir = tmp_path / 'T1'
+    point_dir.mkdir()
+    (point_dir / 'T1.json').write_text(json.dumps([{'point_id': 'T1', 'orders': []}]))
+    point_logger.update_point_history('T1', 'HSI-001', 'HK.MHImain', 'long', 1, 20000.0, points_dir=str(tmp_path))
+    point_logger.update_point_history('T1', 'HSI-001', 'HK.MHImain', 'long', 1, 20010.0, is_open=False, pnl=100.0,
+                                      points_dir=str(tmp_path))
+    json_path, = discover_point_files(str(tmp_path))
+    history_path = os.path.join(os.path.dirname(json_path), 'trade_history.jsonl')
+    with open(history_path, encoding='utf-8') as f:
+        assert [json.loads(line)['event'] for line in f] == ['open', 'close']
+    point_logger.get_point_history('T1', str(tmp_path)).close()
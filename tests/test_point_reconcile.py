@@ -0,0 +1,63 @@
+import json
+import pandas as pd
+from futu import PositionSide, TrdEnv
+from futu.common.constant import RET_OK
+from menu.order_gateway import get_order_gateway
+from menu.order_store import ORDER_STORE, VirtualOrder
+from menu.points import point_manager as point_manager_module
+from menu.points.point_manager import PointManager
+from menu.simulation import SimClock, SimExchange, SimQuoteContext, SimTradeContext
+from menu.trigger_book import TRIGGER_BOOK
+
+CODE = 'HK.MHImain'
+
+class _BrokerPositions:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def position_list_query(self, trd_env=None):
+        return RET_OK, pd.DataFrame(self.rows, columns=['code', 'position_side', 'qty'])
+
+def _manager(tmp_path):
+    exchange = SimExchange(SimClock())
+    trd_ctx = SimTradeContext(exchange)
+    get_order_gateway(trd_ctx, enabled=False)
+    manager = PointManager(SimQuoteContext(exchange), trd_ctx, TrdEnv.SIMULATE, 1)
+    point_dir = tmp_path / 'P1'
+    point_dir.mkdir()
+    orders = [{'entry_price': 20000.0 + i, 'direction': direction, 'quantity': 1}
+              for i, direction in enumerate(['long', 'long', 'short'])]
+    (point_dir / 'P1.json').write_text(json.dumps([{'point_id': 'P1', 'code': CODE, 'orders': orders}]))
+    manager.load_points(str(tmp_path))
+    point = manager.points['P1']
+    for index, order in enumerate(orders):
+        order_id = f'HSI-00{index + 1}'
+        point.add_position(order_id, index, order['entry_price'], order_id)
+        virtual = VirtualOrder(order_id, CODE, order['direction'], 1, order['entry_price'], stop_loss=19000.0 if order['direction'] == 'long' else 21000.0)
+        ORDER_STORE.add_virtual(virtual)
+        TRIGGER_BOOK.add(virtual)
+    return manager, point
+
+def test_reconcile_compares_net_position(tmp_path, monkeypatch):
+    ledger = []
+    monkeypatch.setattr(point_manager_module, 'update_order_in_log', lambda order_id, qty: ledger.append((order_id, qty)))
+    ORDER_STORE.clear()
+    TRIGGER_BOOK.clear()
+    try:
+        manager, point = _manager(tmp_path)
+        # 兩多一空的淨持倉 +1 與券商一致，不移除
+        manager.trd_ctx = _BrokerPositions([[CODE, PositionSide.LONG, 1]])
+        assert manager.reconcile_positions() == 0
+        assert len(point.open_positions) == 3
+        # 券商淨持倉為 0，只移除最新的一筆多頭
+        manager.trd_ctx = _BrokerPositions([])
+        assert manager.reconcile_positions() == 1
+        assert [pos['order_id'] for pos in point.open_positions] == ['HSI-001', 'HSI-003']
+        # 對應的虛擬持倉與觸發簿項一併移除，止盈止損不會再為其提交平倉單
+        assert sorted(order.id for order in ORDER_STORE.virtual_orders()) == ['HSI-001', 'HSI-003']
+        assert len(TRIGGER_BOOK) == 2
+        assert TRIGGER_BOOK.pop_triggered(CODE, 18000.0) == [(ORDER_STORE.get_virtual('HSI-001'), 'stop_loss')]
+        assert ledger == [('HSI-002', 0)]
+    finally:
+        ORDER_STORE.clear()
+        TRIGGER_BOOK.clear()
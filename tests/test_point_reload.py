@@ -0,0 +1,49 @@
+import json
+import threading
+from futu import TrdEnv
+from menu.order_gateway import get_order_gateway
+from menu.points.point_manager import PointManager
+from menu.simulation import SimClock, SimExchange, SimQuoteContext, SimTradeContext
+
+CODE = 'HK.MHImain'
+
+def _write_point(base_dir, hit_limit):
+    point_dir = base_dir / 'P1'
+    point_dir.mkdir(exist_ok=True)
+    point = {'point_id': 'P1', 'code': CODE, 'hit_price': 20000.0, 'hit_limit': hit_limit, 'qty_each_time': 1,
+             'orders': [{'entry_price': 20000.0, 'direction': 'long', 'quantity': 1}]}
+    (point_dir / 'P1.json').write_text(json.dumps([point]))
+
+def test_reload_during_open_keeps_opened_index(tmp_path):
+    exchange = SimExchange(SimClock())
+    trd_ctx = SimTradeContext(exchange)
+    get_order_gateway(trd_ctx, enabled=False)
+    manager = PointManager(SimQuoteContext(exchange), trd_ctx, TrdEnv.SIMULATE, 1)
+    _write_point(tmp_path, 10)
+    manager.load_points(str(tmp_path))
+
+    entered, release = threading.Event(), threading.Event()
+
+    def execute(**kwargs):
+        entered.set()
+        release.wait(5)  # 模擬在網關中阻塞
+        return True, '開倉訂單已提交：訂單ID=HSI-001 '
+
+    manager.open_order.execute = execute
+    monitor = threading.Thread(target=manager.on_price, args=(CODE, 20000.0))
+    monitor.start()
+    assert entered.wait(5)
+    _write_point(tmp_path, 20)
+    reload = threading.Thread(target=manager.reload_points)
+    reload.start()
+    reload.join(0.2)
+    assert reload.is_alive()  # 開倉完成前不移交狀態
+    release.set()
+    monitor.join(5)
+    reload.join(5)
+
+    point = manager.points['P1']
+    assert point.hit_limit == 20
+    assert point.opened_indices == {0}
+    assert [pos['order_id'] for pos in point.open_positions] == ['HSI-001']
+    assert manager.entry_index is not None and not point.can_open_position(0)
@@ -0,0 +1,67 @@
+import numpy as np
+from menu.position_book import PositionBook
+
+def test_add_remove_keeps_rows_compact():
+    book = PositionBook(capacity=2)
+    for i in range(5):
+        book.add(f'P{i}', 'long' if i % 2 == 0 else 'short', i + 1, 20000 + i * 10, obj={'id': i})
+    assert len(book) == 5
+    assert book.remove('P1') == {'id': 1}
+    assert book.remove('P1') is None
+    assert 'P1' not in book and book.keys[1] == 'P4'  # 最後一行移入空位
+    for key in book.keys:
+        assert book.obj(key)['id'] == int(key[1:])
+        assert book.get(key, 'entry') == 20000 + int(key[1:]) * 10
+    book.add('P0', 'short', 7, 19990)  # 覆蓋已存在的行
+    assert len(book) == 4 and book.get('P0', 'sign') == -1.0 and book.get('P0', 'qty') == 7
+
+def test_total_pnl_matches_rows():
+    book = PositionBook()
+    book.add('A', 'long', 2, 20000)
+    book.add('B', 'short', 3, 20050)
+    book.add('C', 'long', 1, 19900)
+    for price in (19800.0, 20000.0, 20123.0):
+        assert np.isclose(book.total_pnl(price), book.pnl(price).sum())
+    book.set('B', qty=1)
+    book.remove('C')
+    assert np.isclose(book.total_pnl(20100), 2 * 100 - 1 * 50)
+    book.clear()
+    assert len(book) == 0 and book.total_pnl(20100) == 0
+
+def test_stop_and_target_hits():
+    book = PositionBook()
+    book.add('L', 'long', 1, 20000, stop=19950, target=20100)
+    book.add('S', 'short', 1, 20000, stop=20050, target=19900)
+    book.add('N', 'long', 1, 20000)  # 未設止損止盈
+    assert book.stop_hits(19950).tolist() == [True, False, False]
+    assert book.stop_hits(20050).tolist() == [False, True, False]
+    assert book.target_hits(20100).tolist() == [True, False, False]
+    assert book.target_hits(19900).tolist() == [False, True, False]
+
+def test_extremes_and_trailing_hits():
+    book = PositionBook()
+    book.add('L', 'long', 1, 20000, trailing=True, high=20000)
+    book.add('S', 'short', 1, 20000, trailing=True, low=20000)
+    book.add('F', 'long', 1, 20000, high=20000)  # 非移動止盈行不更新極值
+    assert book.update_extremes(20300)
+    assert book.update_extremes(19800)
+    assert not book.update_extremes(20100)  # 仍在已套用區間內
+    assert book.get('L', 'high') == 20300 and book.get('F', 'high') == 20000
+    assert book.get('S', 'low') == 19800
+    # 多單在 20200 及以下觸發，空單在 19900 及以上觸發
+    assert book.trailing_hits(20250, 100) == [1]
+    assert book.trailing_hits(19850, 100) == [0]
+    assert book.trailing_hits(20000, 100) == [0, 1]
+    book.remove('L')
+    assert not book.trailing_hits(19850, 100)
+    assert book.trailing_hits(19900, 100) == [1]  # F 移入第 0 行，S 行號不變
+
+def test_trail_targets_only_improve():
+    book = PositionBook()
+    book.add('L', 'long', 1, 20000, target=20100, trailing=True, offset=50)
+    book.add('S', 'short', 1, 20000, target=19900, trailing=True, offset=50)
+    assert book.trail_targets(20200) == [0]
+    assert book.get('L', 'target') == 20150
+    assert not book.trail_targets(20180)
+    assert book.trail_targets(19800) == [1]
+    assert book.get('S', 'target') == 19850
@@ -0,0 +1,51 @@
+import os
+import time
+from menu import tick_recorder
+from menu.tick_recorder import TickRecorder, list_tick_files, read_ticks
+from menu.tick_replay import TickStore
+
+SECOND = 1_000_000_000
+DAY1 = int(time.mktime((2025, 6, 12, 9, 15, 0, 0, 0, -1))) * SECOND
+DAY2 = int(time.mktime((2025, 6, 13, 9, 15, 0, 0, 0, -1))) * SECOND
+
+def _record(root, monkeypatch, ticks):
+    recorder = TickRecorder(str(root), flush_interval=60)
+    for code, ns, price in ticks:
+        monkeypatch.setattr(tick_recorder.time, 'time_ns', lambda ns=ns: ns)
+        recorder.record(code, price)
+    monkeypatch.undo()
+    recorder.stop()
+    return recorder
+
+def test_write_read_round_trip(tmp_path, monkeypatch):
+    ticks = [('HK.MHImain', DAY1, 20000.0), ('HK.HHImain', DAY1 + SECOND, 7000.0),
+             ('HK.MHImain', DAY1 + 2 * SECOND, 20001.0), ('HK.MHImain', DAY2, 20100.0)]
+    recorder = _record(tmp_path, monkeypatch, ticks)
+    assert recorder.recorded == 4
+    # 按合約與日期分檔
+    assert [os.path.relpath(path, tmp_path) for path in list_tick_files(str(tmp_path))] == [
+        os.path.join('HK.HHImain', '20250612.ticks'),
+        os.path.join('HK.MHImain', '20250612.ticks'),
+        os.path.join('HK.MHImain', '20250613.ticks')]
+    assert read_ticks(tick_recorder.tick_path(str(tmp_path), 'HK.MHImain', '20250612'))['price'].tolist() == [20000.0, 20001.0]
+
+    store = TickStore(str(tmp_path))
+    assert store.codes() == ['HK.HHImain', 'HK.MHImain'] and len(store) == 4
+    assert list(store.path('HK.MHImain')) == [20000.0, 20001.0, 20100.0]
+    assert store.count('HK.MHImain', start=DAY1 / SECOND + 1, end=DAY2 / SECOND) == 1
+    assert store.price_at('HK.MHImain', DAY1 / SECOND - 1) is None
+    assert store.price_at('HK.MHImain', DAY1 / SECOND + 5) == 20001.0
+    assert store.price_at('HK.MHImain', DAY2 / SECOND) == 20100.0
+    times, codes, prices = store.load()
+    assert times.tolist() == [ns / SECOND for _, ns, _ in ticks]
+    assert codes.tolist() == [code for code, _, _ in ticks]
+    assert prices.tolist() == [price for _, _, price in ticks]
+
+def test_reopen_appends_and_ignores_partial_record(tmp_path, monkeypatch):
+    _record(tmp_path, monkeypatch, [('HK.MHImain', DAY1, 20000.0)])
+    _record(tmp_path, monkeypatch, [('HK.MHImain', DAY1 + SECOND, 20001.0)])
+    path = tick_recorder.tick_path(str(tmp_path), 'HK.MHImain', '20250612')
+    with open(path, 'ab') as f:
+        f.write(b'\x00' * 5)  # 寫入中斷留下的不完整記錄
+    assert read_ticks(path)['price'].tolist() == [20000.0, 20001.0]
+    assert list(TickStore(str(tmp_path)).path('HK.MHImain')) == [20000.0, 20001.0]
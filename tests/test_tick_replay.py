@@ -0,0 +1,30 @@
+import time
+from menu import tick_recorder, tick_replay
+from menu.tick_recorder import TickRecorder
+from menu.tick_replay import TickStore
+
+CODE = 'HK.MHImain'
+
+def _record(root, monkeypatch, ticks):
+    recorder = TickRecorder(str(root), flush_interval=60)
+    for ns, price in ticks:
+        monkeypatch.setattr(tick_recorder.time, 'time_ns', lambda ns=ns: ns)
+        recorder.record(CODE, price)
+    monkeypatch.undo()
+    recorder.stop()
+    return TickStore(str(root))
+
+def test_sampling_jumps_over_session_gaps(tmp_path, monkeypatch):
+    open_ns = int(time.mktime((2025, 6, 12, 9, 15, 0, 0, 0, -1)) * 1e9)
+    second = 1_000_000_000
+    ticks = [(open_ns, 1.0), (open_ns + second * 4 // 10, 2.0), (open_ns + second * 11 // 10, 3.0),
+             (open_ns + 3 * 3600 * second, 4.0), (open_ns + 3 * 3600 * second + second // 2, 5.0),  # 午休後
+             (open_ns + 24 * 3600 * second, 6.0)]  # 次日
+    store = _record(tmp_path, monkeypatch, ticks)
+    assert list(store.path(CODE, step=1.0)) == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+    # 格點內多筆時取最後一筆，空的格點不輸出
+    assert list(store.path(CODE, step=3600.0)) == [1.0, 3.0, 4.0, 5.0, 6.0]
+    # 格點跨越分塊時只輸出一次
+    monkeypatch.setattr(tick_replay, '_CHUNK', 2)
+    assert list(store.path(CODE, step=1.0)) == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+    assert list(store.path(CODE, step=3600.0)) == [1.0, 3.0, 4.0, 5.0, 6.0]
@@ -0,0 +1,51 @@
+from menu.order_store import VirtualOrder
+from menu.trigger_book import TRAILING_RETRACE, TriggerBook
+
+CODE = 'HK.MHImain'
+
+def _kinds(triggered):
+    return sorted((order.id, kind) for order, kind in triggered)
+
+def test_stop_loss_and_take_profit_trigger_once():
+    book = TriggerBook()
+    long_order = VirtualOrder('L', CODE, 'long', 1, 20000.0, stop_loss=19950.0, take_profit=20050.0)
+    short_order = VirtualOrder('S', CODE, 'short', 1, 20000.0, stop_loss=20050.0, take_profit=19950.0)
+    book.add(long_order)
+    book.add(short_order)
+    assert book.pop_triggered(CODE, 20000.0) == []
+    assert _kinds(book.pop_triggered(CODE, 20050.0)) == [('L', 'take_profit'), ('S', 'stop_loss')]
+    assert book.pop_triggered(CODE, 20100.0) == []  # 已觸發的訂單已移出
+    assert len(book) == 0
+
+    book.add(long_order)
+    book.add(short_order)
+    assert _kinds(book.pop_triggered(CODE, 19900.0)) == [('L', 'stop_loss'), ('S', 'take_profit')]
+
+def test_removed_and_readded_orders_use_latest_levels():
+    book = TriggerBook()
+    order = VirtualOrder('L', CODE, 'long', 1, 20000.0, stop_loss=19950.0)
+    book.add(order)
+    book.remove(order)
+    assert book.pop_triggered(CODE, 19900.0) == []  # 延遲刪除的舊堆項被丟棄
+    order.stop_loss = 19800.0
+    book.add(order)
+    book.add(order)  # 重複加入只保留最新一項
+    assert book.pop_triggered(CODE, 19900.0) == []
+    assert _kinds(book.pop_triggered(CODE, 19800.0)) == [('L', 'stop_loss')]
+    assert book.pop_triggered(CODE, 19700.0) == []
+
+def test_trailing_triggers_on_retrace_from_extreme():
+    book = TriggerBook()
+    long_order = VirtualOrder('L', CODE, 'long', 1, 20000.0, use_trailing=True)
+    book.add(long_order)
+    assert book.pop_triggered(CODE, 20300.0) == []
+    assert book.pop_triggered(CODE, 20300.0 - TRAILING_RETRACE + 1) == []
+    assert _kinds(book.pop_triggered(CODE, 20300.0 - TRAILING_RETRACE)) == [('L', 'trailing')]
+    assert long_order.highest_price == 20300.0  # 觸發時極值回寫到訂單
+
+    short_order = VirtualOrder('S', CODE, 'short', 1, 20000.0, use_trailing=True)
+    book.add(short_order)
+    assert book.pop_triggered(CODE, 19700.0) == []
+    assert _kinds(book.pop_triggered(CODE, 19700.0 + TRAILING_RETRACE)) == [('S', 'trailing')]
+    assert short_order.lowest_price == 19700.0
+    assert len(book) == 0